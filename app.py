@@ -26,9 +26,11 @@ def create_app(config_name='default'):
     
     # Cargar configuración
     app.config.from_object(config[config_name])
+    app.config['CONFIG_NAME'] = config_name  # Los procesos de exportación recrean la app con el mismo nombre
     
-    # Crear directorio de uploads si no existe
+    # Crear directorios de uploads y exportaciones si no existen
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['EXPORT_FOLDER'], exist_ok=True)
     
     # Inicializar extensiones (db, login_manager)
     init_extensions(app)
@@ -39,12 +41,16 @@ def create_app(config_name='default'):
     from routes.debtor import debtor_bp
     from routes.debt import debt_bp
     from routes.admin import admin_bp
+    from routes.export import export_bp
+    from routes.upload import upload_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(debtor_bp)
     app.register_blueprint(debt_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(export_bp)
+    app.register_blueprint(upload_bp)
     
     # Registrar filtros personalizados de Jinja2
     @app.template_filter('format_date')
@@ -75,8 +81,12 @@ def create_app(config_name='default'):
     # Crear tablas en la base de datos si no existen
     with app.app_context():
         from extensions import db
+        from search import init_search_index
         db.create_all()
         
+        # Crear índice de búsqueda de deudores (FTS5 en SQLite, pg_trgm en PostgreSQL)
+        init_search_index()
+        
         # Crear usuario admin por defecto si no existe
         admin_user = User.query.filter_by(username='admin').first()
         if not admin_user:
@@ -0,0 +1,338 @@
+"""
+CuentasClaras - Almacén de Adjuntos por Contenido
+Cada archivo subido se guarda una sola vez, con su SHA-256 como nombre
+(uploads/blobs/ab/abcdef...): volver a subir el mismo comprobante para otra deuda
+o después de editarla solo agrega una referencia, no otra copia en disco
+La tabla attachment asocia cada deuda a sus archivos (nombre, tipo, tamaño y MIME) y es la
+única fuente de los adjuntos; attachment_blob cuenta las referencias y el archivo se elimina
+cuando la última deuda que lo usa se elimina
+Autor: Fernando Poblete
+"""
+
+import hashlib
+import mimetypes
+import os
+import tempfile
+from datetime import datetime
+from flask import current_app, request
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import send_file
+from extensions import db
+from models import Attachment, AttachmentBlob, Debt, Debtor
+
+# Carpeta de contenidos dentro de UPLOAD_FOLDER
+BLOB_DIRNAME = 'blobs'
+
+# Bytes leídos por vez al guardar y calcular el hash
+CHUNK_SIZE = 1024 * 1024
+
+# Sufijo de la vista previa guardada junto al contenido (ver previews.py)
+PREVIEW_SUFFIX = '.preview.jpg'
+
+# Tipo MIME cuando la extensión no lo indica
+DEFAULT_MIME = 'application/octet-stream'
+
+
+def blob_root():
+    """Carpeta raíz del almacén de contenidos"""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], BLOB_DIRNAME)
+
+
+def blob_path(sha256):
+    """
+    Ruta en disco del contenido con el hash indicado
+
+    Args:
+        sha256 (str): Hash hexadecimal del contenido
+
+    Returns:
+        str: Ruta del archivo (dos niveles de carpetas para no acumular miles de archivos en una)
+    """
+    return os.path.join(blob_root(), sha256[:2], sha256)
+
+
+def preview_path(sha256):
+    """Ruta de la vista previa del contenido, junto al original (ver previews.py)"""
+    return blob_path(sha256) + PREVIEW_SUFFIX
+
+
+def write_blob(stream):
+    """
+    Guarda el contenido de un archivo en el almacén, calculando el hash mientras se copia
+    Si el contenido ya existe, la copia temporal se descarta
+
+    Args:
+        stream: Archivo binario de origen (ej: FileStorage.stream)
+
+    Returns:
+        tuple: (sha256, tamaño en bytes)
+    """
+    tmp_dir = os.path.join(blob_root(), 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                tmp_file.write(chunk)
+                size += len(chunk)
+
+        sha256 = digest.hexdigest()
+        store_blob_file(tmp_path, sha256)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return sha256, size
+
+
+def store_blob_file(path, sha256):
+    """
+    Mueve al almacén un archivo ya escrito en disco cuyo hash se calculó al escribirlo
+    Si el contenido ya existe, el archivo se descarta
+
+    Args:
+        path (str): Archivo de origen (en la misma unidad que UPLOAD_FOLDER)
+        sha256 (str): Hash hexadecimal del contenido
+    """
+    target = blob_path(sha256)
+    if os.path.exists(target):
+        os.remove(path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+
+def stored_filename(kind, original_filename):
+    """
+    Nombre con el que se guarda un adjunto: tipo_fecha_hora_nombre original
+    (Attachment.display_name recupera el nombre original)
+
+    Args:
+        kind (str): 'debt' o 'payment'
+        original_filename (str): Nombre ya pasado por secure_filename
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"{kind}_{timestamp}_{original_filename}"
+
+
+def _add_reference(sha256, size):
+    """Suma una referencia al contenido, creando su registro si es nuevo"""
+    updated = db.session.query(AttachmentBlob).filter_by(sha256=sha256).update(
+        {AttachmentBlob.ref_count: AttachmentBlob.ref_count + 1}, synchronize_session=False
+    )
+    if updated:
+        return
+
+    try:
+        # Otra subida simultánea del mismo contenido puede crear el registro primero
+        with db.session.begin_nested():
+            db.session.add(AttachmentBlob(sha256=sha256, size=size, ref_count=1))
+    except IntegrityError:
+        db.session.query(AttachmentBlob).filter_by(sha256=sha256).update(
+            {AttachmentBlob.ref_count: AttachmentBlob.ref_count + 1}, synchronize_session=False
+        )
+
+
+def add_attachment(debt_id, kind, filename, stream):
+    """
+    Guarda un archivo y lo asocia a una deuda (no hace commit)
+
+    Args:
+        debt_id (int): ID de la deuda
+        kind (str): 'debt' o 'payment'
+        filename (str): Nombre con el que se lista y descarga
+        stream: Archivo binario
+
+    Returns:
+        Attachment: Registro del adjunto
+    """
+    sha256, size = write_blob(stream)
+    return attach_blob(debt_id, kind, filename, sha256, size)
+
+
+def guess_mime(filename):
+    """Tipo MIME según la extensión del nombre"""
+    return mimetypes.guess_type(filename)[0] or DEFAULT_MIME
+
+
+def attach_blob(debt_id, kind, filename, sha256, size):
+    """
+    Asocia a una deuda un contenido que ya está en el almacén (no hace commit)
+    Actualiza updated_at de la deuda, así la caché de reportes ve el nuevo adjunto,
+    y encarga su vista previa para cuando se confirme la transacción
+    (previews.schedule_preview_on_commit)
+
+    Args:
+        debt_id (int): ID de la deuda
+        kind (str): 'debt' o 'payment'
+        filename (str): Nombre con el que se lista y descarga
+        sha256 (str): Hash del contenido (ver write_blob)
+        size (int): Tamaño en bytes
+
+    Returns:
+        Attachment: Registro del adjunto
+    """
+    from previews import schedule_preview_on_commit
+    _add_reference(sha256, size)
+
+    now = datetime.utcnow()
+    attachment = Attachment(
+        debt_id=debt_id, kind=kind, filename=filename, sha256=sha256,
+        size=size, mime=guess_mime(filename), created_at=now
+    )
+    db.session.add(attachment)
+    db.session.query(Debt).filter_by(id=debt_id).update({Debt.updated_at: now}, synchronize_session=False)
+
+    # Miniatura en segundo plano al confirmar (el contenido ya está en el almacén)
+    schedule_preview_on_commit(sha256, attachment.mime)
+    return attachment
+
+
+def find_attachment(debt_id, filename, user_id=None):
+    """
+    Adjunto de una deuda por nombre (índice ix_attachment_debt_filename)
+    Es la autorización de las descargas: solo se sirven archivos registrados para la deuda
+
+    Args:
+        debt_id (int): ID de la deuda
+        filename (str): Nombre guardado del adjunto
+        user_id (int): Exigir que la deuda sea de este usuario (opcional, en la misma consulta)
+
+    Returns:
+        Attachment: Registro encontrado (None si la deuda no tiene ese archivo)
+    """
+    query = Attachment.query.filter_by(debt_id=debt_id, filename=filename)
+    if user_id is not None:
+        query = query.join(Debt, Debt.id == Attachment.debt_id).join(
+            Debtor, Debtor.id == Debt.debtor_id
+        ).filter(Debtor.user_id == user_id)
+    return query.first()
+
+
+def attachment_response(attachment, as_attachment=True):
+    """
+    Respuesta de descarga de un adjunto
+    El ETag es el SHA-256 del contenido (fuerte: el mismo ETag es el mismo archivo byte a byte),
+    así If-None-Match responde 304 sin leer el archivo; las peticiones Range (y If-Range)
+    reciben 206 con la parte pedida. Con ATTACHMENT_SENDFILE el servidor web envía los bytes
+    (X-Sendfile o X-Accel-Redirect) y el worker solo responde los encabezados
+
+    Args:
+        attachment (Attachment): Adjunto autorizado
+        as_attachment (bool): Descargar (True) o mostrar en el navegador (False)
+
+    Returns:
+        Response: 200, 206 o 304
+    """
+    mode = current_app.config['ATTACHMENT_SENDFILE']
+    response = send_file(
+        blob_path(attachment.sha256), request.environ,
+        mimetype=attachment.mime or guess_mime(attachment.filename),
+        as_attachment=as_attachment, download_name=attachment.display_name,
+        conditional=not mode, etag=attachment.sha256, use_x_sendfile=bool(mode)
+    )
+
+    if mode:
+        # El servidor web atiende Range sobre el archivo; aquí solo If-None-Match
+        response = response.make_conditional(request.environ)
+        if response.status_code == 304:
+            response.headers.pop('X-Sendfile', None)
+        elif mode == 'x-accel-redirect':
+            response.headers.pop('X-Sendfile', None)
+            prefix = current_app.config['ATTACHMENT_ACCEL_PREFIX'].rstrip('/')
+            response.headers['X-Accel-Redirect'] = f"{prefix}/{attachment.sha256[:2]}/{attachment.sha256}"
+    else:
+        # Anuncia Range también en respuestas completas (visores de PDF piden por partes)
+        response.headers.setdefault('Accept-Ranges', 'bytes')
+
+    # Adjuntos de un usuario: caché solo en el navegador, revalidando con el ETag
+    response.cache_control.private = True
+    return response
+
+
+def release_attachments(debt_ids):
+    """
+    Elimina los adjuntos de las deudas indicadas y descuenta sus referencias (no hace commit)
+    Los contenidos que quedan sin referencias se eliminan de la tabla; sus archivos se
+    borran con remove_blob_files después del commit, así un rollback no deja registros sin archivo
+
+    Args:
+        debt_ids (list): IDs de las deudas que se eliminan
+
+    Returns:
+        list: Hashes de los contenidos que quedaron sin referencias
+    """
+    if not debt_ids:
+        return []
+
+    released = db.session.query(Attachment.sha256, func.count(Attachment.id)).filter(
+        Attachment.debt_id.in_(debt_ids)
+    ).group_by(Attachment.sha256).all()
+    if not released:
+        return []
+
+    Attachment.query.filter(Attachment.debt_id.in_(debt_ids)).delete(synchronize_session=False)
+    for sha256, count in released:
+        db.session.query(AttachmentBlob).filter_by(sha256=sha256).update(
+            {AttachmentBlob.ref_count: AttachmentBlob.ref_count - count}, synchronize_session=False
+        )
+
+    hashes = [sha256 for sha256, _ in released]
+    orphaned = [
+        sha256 for (sha256,) in db.session.query(AttachmentBlob.sha256).filter(
+            AttachmentBlob.sha256.in_(hashes), AttachmentBlob.ref_count <= 0
+        )
+    ]
+    if orphaned:
+        AttachmentBlob.query.filter(AttachmentBlob.sha256.in_(orphaned)).delete(synchronize_session=False)
+    return orphaned
+
+
+def remove_blob_files(hashes):
+    """
+    Borra del disco los contenidos sin referencias (llamar después del commit)
+    Un contenido que otra subida volvió a registrar mientras tanto se conserva
+
+    Args:
+        hashes (list): Hashes retornados por release_attachments
+    """
+    if not hashes:
+        return
+
+    still_used = {
+        sha256 for (sha256,) in
+        db.session.query(AttachmentBlob.sha256).filter(AttachmentBlob.sha256.in_(hashes))
+    }
+    for sha256 in hashes:
+        if sha256 in still_used:
+            continue
+        for path in (blob_path(sha256), preview_path(sha256)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def storage_usage():
+    """
+    Uso del almacén: bytes referenciados por los adjuntos y bytes realmente guardados
+
+    Returns:
+        dict: attachments, blobs, referenced_bytes y stored_bytes
+    """
+    attachments, referenced = db.session.query(
+        func.count(Attachment.id), func.coalesce(func.sum(AttachmentBlob.size), 0)
+    ).join(AttachmentBlob, AttachmentBlob.sha256 == Attachment.sha256).one()
+    blobs, stored = db.session.query(
+        func.count(AttachmentBlob.sha256), func.coalesce(func.sum(AttachmentBlob.size), 0)
+    ).one()
+    return {
+        'attachments': attachments,
+        'blobs': blobs,
+        'referenced_bytes': referenced,
+        'stored_bytes': stored
+    }
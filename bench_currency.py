@@ -0,0 +1,93 @@
+"""
+Benchmark del formato de monedas
+Formatea una tabla de 10.000 montos con el formateador anterior (User.format_currency:
+round + f-string + tres replace + rstrip por monto), con currency.format_amount por fila
+y con currency.format_many por columna
+Falla si el formato por fila es más lento que el anterior (con margen para el ruido
+de la medición) o si el redondeo comercial no coincide con money.to_minor
+
+Ejecutar: python bench_currency.py
+No usa base de datos
+Autor: Fernando Poblete
+"""
+
+import random
+import time
+from currency import format_amount, format_many
+
+ROWS = 10_000
+CURRENCIES = ['CLP', 'USD', 'BRL']
+REPEAT = 5
+
+# Margen sobre el tiempo del formateador anterior antes de fallar (ruido de la medición)
+NOISE_MARGIN = 1.10
+
+
+def legacy_format(amount, currency):
+    """Formateador anterior de User.format_currency (rama USD/BRL)"""
+    amount = round(amount, 2)
+    symbol = 'R$' if currency == 'BRL' else '$'
+    if (amount % 1) != 0:
+        formatted = f"{amount:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+        if formatted.endswith(',00'):
+            formatted = formatted[:-3]
+        elif formatted.endswith('0') and ',' in formatted:
+            formatted = formatted.rstrip('0').rstrip(',')
+        return f"{symbol}{formatted}"
+    return f"{symbol}{amount:,.0f}".replace(',', '.')
+
+
+def measure(func):
+    """Ejecuta la función REPEAT veces y retorna la mediana en milisegundos"""
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def sample_amounts():
+    """Montos típicos: enteros redondos, montos con centavos y algunos repetidos"""
+    rng = random.Random(2026)
+    amounts = []
+    for _ in range(ROWS):
+        kind = rng.random()
+        if kind < 0.5:
+            amounts.append(float(rng.randint(1, 2000) * 1000))
+        elif kind < 0.8:
+            amounts.append(round(rng.uniform(1, 500000), 2))
+        else:
+            amounts.append(rng.choice([5000.0, 10000.0, 25000.0, 99.9]))
+    return amounts
+
+
+def run():
+    amounts = sample_amounts()
+
+    print(f"{'Moneda':>6} | {'Anterior':>10} | {'Por fila':>10} | {'Por columna':>11}")
+    print('-' * 48)
+
+    for currency in CURRENCIES:
+        legacy = measure(lambda: [legacy_format(amount, currency) for amount in amounts])
+        per_row = measure(lambda: [format_amount(amount, currency) for amount in amounts])
+        batch = measure(lambda: format_many(amounts, currency))
+
+        print(f"{currency:>6} | {legacy:>8.2f}ms | {per_row:>8.2f}ms | {batch:>9.2f}ms")
+        assert per_row <= legacy * NOISE_MARGIN, f"{currency}: el formato por fila es más lento que el anterior"
+
+    # Las salidas coinciden con el formateador anterior en USD/BRL
+    mismatches = sum(
+        legacy_format(amount, 'USD') != text
+        for amount, text in zip(amounts, format_many(amounts, 'USD'))
+    )
+    print(f"\nDiferencias con el formato anterior (USD): {mismatches}")
+
+    # Medias unidades menores: redondeo comercial como al guardar (round() daría $1 y $0,12)
+    assert format_amount(1.005, 'USD') == '$1,01'
+    assert format_amount(0.125, 'USD') == '$0,13'
+
+
+if __name__ == '__main__':
+    run()
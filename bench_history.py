@@ -0,0 +1,106 @@
+"""
+Benchmark del historial paginado
+Mide la latencia de summary.history_page() a medida que crece el historial,
+comparándola con la consulta anterior (join debt_history -> debt -> debtor + .all())
+
+Ejecutar: python bench_history.py
+Usa una base de datos SQLite temporal; no toca la base de datos real
+Autor: Fernando Poblete
+"""
+
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Base de datos temporal (debe configurarse antes de importar la app)
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_history.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from sqlalchemy import insert
+from app import create_app
+from extensions import db
+from models import User, Debtor, Debt, DebtHistory
+from summary import history_page
+
+HISTORY_SIZES = [1_000, 10_000, 100_000]
+DEBTS = 50
+REPEAT = 5
+
+
+def measure(func):
+    """Ejecuta la función REPEAT veces y retorna la mediana en milisegundos"""
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+        db.session.expire_all()
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def grow_history(user_id, debt_ids, current, target):
+    """Inserta movimientos hasta alcanzar el tamaño objetivo"""
+    base = datetime(2025, 1, 1)
+    rows = [
+        {
+            'debt_id': debt_ids[i % len(debt_ids)],
+            'user_id': user_id,
+            'action_type': 'edited',
+            'description': f'Movimiento {i}',
+            'created_at': base + timedelta(seconds=i)
+        }
+        for i in range(current, target)
+    ]
+    db.session.execute(insert(DebtHistory), rows)
+    db.session.commit()
+
+
+def legacy_history(user_id):
+    """Consulta previa: join de tres tablas sin límite"""
+    return DebtHistory.query.join(Debt).join(Debtor).filter(
+        Debtor.user_id == user_id
+    ).order_by(DebtHistory.created_at.desc()).all()
+
+
+def run():
+    app = create_app('production')
+
+    with app.app_context():
+        user = User(username='bench', email='bench@cuentasclaras.com')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.flush()
+
+        debtor = Debtor(user_id=user.id, name='Deudor Benchmark')
+        db.session.add(debtor)
+        db.session.flush()
+
+        debts = [Debt(debtor_id=debtor.id, amount=1000) for _ in range(DEBTS)]
+        db.session.add_all(debts)
+        db.session.commit()
+        debt_ids = [debt.id for debt in debts]
+
+        print(f"{'Movimientos':>12} | {'1ª página':>10} | {'Página 20':>10} | {'Anterior (.all())':>18}")
+        print('-' * 60)
+
+        current = 0
+        for size in HISTORY_SIZES:
+            grow_history(user.id, debt_ids, current, size)
+            current = size
+
+            # Cursor de la página 20 para medir una página profunda
+            cursor = None
+            for _ in range(19):
+                cursor = history_page(user.id, after=cursor)['next_cursor']
+
+            first = measure(lambda: history_page(user.id))
+            deep = measure(lambda: history_page(user.id, after=cursor))
+            legacy = measure(lambda: legacy_history(user.id))
+
+            print(f"{size:>12,} | {first:>8.2f}ms | {deep:>8.2f}ms | {legacy:>16.2f}ms")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,68 @@
+"""
+Benchmark de la importación masiva
+Importa una planilla CSV generada (100.000 deudas de 10.000 deudores) con bulk_import
+y mide el tiempo total: lectura, validación, inserciones por lotes, saldos e índice de búsqueda
+Objetivo: menos de un minuto en SQLite
+
+Ejecutar: python bench_import.py [filas]
+Usa una base de datos SQLite temporal; no toca la base de datos real
+Autor: Fernando Poblete
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+# Base de datos temporal (debe configurarse antes de importar la app)
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_import.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from app import create_app
+from extensions import db
+from models import User, Debt, DebtHistory, DebtorBalance
+from bulk_import import import_debts
+
+ROWS = 100_000
+DEBTS_PER_DEBTOR = 10
+
+
+def build_sheet(rows):
+    """Planilla CSV en memoria con montos y fechas en formato local"""
+    lines = ['Deudor;Telefono;Monto;Fecha;Cuotas;Notas']
+    for i in range(rows):
+        debtor = i // DEBTS_PER_DEBTOR
+        installments = (i % 12) + 1 if i % 3 == 0 else ''
+        lines.append(f"Deudor {debtor};+569{debtor:08d};{(i % 500 + 1) * 1000:,};"
+                     f"{i % 28 + 1}/{i % 12 + 1}/2026;{installments};Importada {i}".replace(',', '.'))
+    return '\n'.join(lines).encode('utf-8')
+
+
+def run(rows):
+    app = create_app('production')
+
+    with app.app_context():
+        user = User(username='bench', email='bench@cuentasclaras.com')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+
+        sheet = build_sheet(rows)
+        print(f"Planilla: {rows:,} filas, {len(sheet) / 1024 / 1024:.1f} MB")
+
+        start = time.perf_counter()
+        report = import_debts(user, 'bench.csv', io.BytesIO(sheet))
+        db.session.commit()
+        elapsed = time.perf_counter() - start
+
+        print(f"Deudores creados: {report['debtors_created']:,}")
+        print(f"Deudas creadas:   {report['debts_created']:,} (errores: {report['error_count']})")
+        print(f"Historial:        {DebtHistory.query.count():,} movimientos")
+        print(f"Saldos:           {DebtorBalance.query.count():,} deudores")
+        print(f"Tiempo total:     {elapsed:.1f}s ({rows / elapsed:,.0f} filas/s)")
+        assert Debt.query.count() == rows
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS)
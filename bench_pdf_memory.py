@@ -0,0 +1,94 @@
+"""
+Benchmark de memoria de la numeración de páginas en PDFs
+Compara el pico de memoria (RSS) al generar un reporte de 500 páginas con:
+- NumberedCanvas: guarda el estado de cada página y las dibuja al final
+- LowMemoryNumberedCanvas: entrega cada página de inmediato y define el footer al final
+
+Cada variante se ejecuta en un proceso separado para medir su pico de RSS de forma aislada
+No usa la base de datos: el contenido imita las tablas de deudas del reporte general
+
+Ejecutar: python bench_pdf_memory.py
+Autor: Fernando Poblete
+"""
+
+import resource
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+PAGES = 500
+ROWS_PER_PAGE = 28
+CANVASES = ['NumberedCanvas', 'LowMemoryNumberedCanvas']
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso actual en MB (ru_maxrss está en KB en Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_report(canvas_name):
+    """Genera un PDF de PAGES páginas con el canvas indicado y retorna (páginas, bytes)"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, PageBreak
+    import pdf_generator
+
+    canvasmaker = getattr(pdf_generator, canvas_name)
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+
+    def pages():
+        for page in range(PAGES):
+            data = [['Monto', 'Fecha', 'Días', 'Cuotas', 'Archivos', 'Estado']]
+            data += [
+                [f"${1000 + page * ROWS_PER_PAGE + row:,}".replace(',', '.'), '9/1/2026', str(row), '1/3', '-', 'Pendiente']
+                for row in range(ROWS_PER_PAGE)
+            ]
+            table = Table(data, colWidths=[1.1*inch, 1*inch, 0.6*inch, 0.7*inch, 0.6*inch, 1.5*inch])
+            table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6b7280')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db'))
+            ]))
+            yield table
+            if page < PAGES - 1:
+                yield PageBreak()
+
+    doc.build(pdf_generator.LazyFlowables(pages()), canvasmaker=canvasmaker)
+    data = buffer.getvalue()
+    return data.count(b'/Type /Page\n'), len(data)
+
+
+def run_single(canvas_name):
+    """Ejecuta una variante e imprime 'páginas bytes segundos rss_base rss_pico'"""
+    import pdf_generator  # noqa: F401 (importar antes de medir la base)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    page_count, size = build_report(canvas_name)
+    elapsed = time.perf_counter() - start
+    print(page_count, size, f"{elapsed:.3f}", f"{baseline:.1f}", f"{peak_rss_mb():.1f}")
+
+
+def run():
+    print(f"Reporte de {PAGES} páginas ({ROWS_PER_PAGE} filas por página)\n")
+    print(f"{'Canvas':>24} | {'Páginas':>7} | {'Tamaño':>9} | {'Tiempo':>8} | {'RSS pico':>9} | {'RSS del PDF':>11}")
+    print('-' * 84)
+
+    for canvas_name in CANVASES:
+        output = subprocess.run(
+            [sys.executable, __file__, '--single', canvas_name],
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        page_count, size, elapsed, baseline, peak = output
+        print(f"{canvas_name:>24} | {page_count:>7} | {int(size) / 1024:>7.0f}KB | {float(elapsed):>7.2f}s | "
+              f"{float(peak):>7.1f}MB | {float(peak) - float(baseline):>9.1f}MB")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--single':
+        run_single(sys.argv[2])
+    else:
+        run()
@@ -0,0 +1,91 @@
+"""
+Benchmark del reporte general en paralelo
+Compara el tiempo de generar el reporte completo en un solo proceso con la generación
+por rangos de deudores en un pool de procesos (export_jobs.render_export)
+
+Ejecutar: python bench_report_shards.py
+Usa una base de datos SQLite temporal; no toca la base de datos real
+El tiempo por fragmento incluye crear la app en cada proceso (solo la primera vez)
+Autor: Fernando Poblete
+"""
+
+import os
+import tempfile
+import time
+
+# Base de datos temporal (debe configurarse antes de importar la app)
+# Los procesos del pool reimportan este módulo: heredan la ruta por la variable de entorno
+os.environ.setdefault('BENCH_SHARDS_DB', os.path.join(tempfile.mkdtemp(), 'bench_shards.db'))
+os.environ['DATABASE_URL'] = f"sqlite:///{os.environ['BENCH_SHARDS_DB']}"
+
+DEBTORS = 2_000
+DEBTS_PER_DEBTOR = 5
+WORKERS = [2, 4]
+
+
+def seed(user_id):
+    """Crea DEBTORS deudores con DEBTS_PER_DEBTOR deudas cada uno"""
+    from sqlalchemy import insert
+    from extensions import db
+    from models import Debtor, Debt
+    from summary import refresh_debtor_balance
+
+    db.session.execute(insert(Debtor), [
+        {'user_id': user_id, 'name': f'Deudor {i:05d}'} for i in range(DEBTORS)
+    ])
+    debtor_ids = db.session.query(Debtor.id).filter_by(user_id=user_id).order_by(Debtor.id).all()
+    db.session.execute(insert(Debt), [
+        {'debtor_id': debtor_id, 'amount': 1000 + i, 'description': f'Deuda {i}'}
+        for (debtor_id,) in debtor_ids for i in range(DEBTS_PER_DEBTOR)
+    ])
+    for (debtor_id,) in debtor_ids:
+        refresh_debtor_balance(debtor_id)
+    db.session.commit()
+
+
+def run():
+    from app import create_app
+    from extensions import db
+    from models import User, ExportJob
+    import export_jobs
+
+    app = create_app('production')
+
+    with app.app_context():
+        user = User(username='bench', email='bench@cuentasclaras.com')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+        seed(user.id)
+
+        job = ExportJob(user_id=user.id, kind='all_debtors', download_name='bench.pdf')
+        db.session.add(job)
+        db.session.commit()
+
+        print(f"Reporte de {DEBTORS:,} deudores y {DEBTORS * DEBTS_PER_DEBTOR:,} deudas "
+              f"({os.cpu_count()} CPU disponibles)\n")
+        print(f"{'Modo':>18} | {'Tiempo':>8} | {'Tamaño':>9}")
+        print('-' * 42)
+
+        for workers in [0] + WORKERS:
+            app.config['REPORT_SHARD_WORKERS'] = workers
+            app.config['REPORT_SHARD_MIN_DEBTS'] = 0
+            export_jobs._shard_executor = None
+
+            if workers:
+                # Calentar el pool: crear los procesos y su app fuera de la medición
+                export_jobs.render_export(job)
+
+            start = time.perf_counter()
+            size = export_jobs.render_export(job).getbuffer().nbytes
+            elapsed = time.perf_counter() - start
+
+            if export_jobs._shard_executor is not None:
+                export_jobs._shard_executor.shutdown()
+
+            label = f"{workers} procesos" if workers else 'Un solo proceso'
+            print(f"{label:>18} | {elapsed:>7.2f}s | {size / 1024:>7.0f}KB")
+
+
+if __name__ == '__main__':
+    run()
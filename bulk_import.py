@@ -0,0 +1,257 @@
+"""
+CuentasClaras - Importación Masiva de Deudores y Deudas
+Carga una planilla (CSV o XLSX) con una fila por deuda, validada con las mismas reglas que
+el formulario de deudas (routes/debt.py::add): monto mayor a cero, fecha válida y cuotas
+mayores a cero. Las filas se leen en streaming y se escriben por lotes con INSERT ... RETURNING
+(deudores nuevos, deudas e historial 'created'); al final se recalculan los saldos de los
+deudores afectados y se indexan los nuevos en la búsqueda, todo en una transacción
+
+Columnas reconocidas (encabezados sin tildes ni mayúsculas):
+deudor/nombre (obligatoria), telefono, email, monto, fecha, cuotas, notas
+Una fila sin monto solo crea el deudor. Los deudores se asocian por nombre a los existentes
+Autor: Fernando Poblete
+"""
+
+from datetime import datetime
+from sqlalchemy import insert
+from extensions import db
+from models import Debtor, Debt, DebtHistory
+from currency import format_amount
+from data_import import iter_upload_rows, normalize_text, parse_amount, parse_date, pick
+from search import index_debtors
+from summary import refresh_debtor_balances
+
+# Nombres de columna aceptados (encabezados normalizados, ver data_import.normalize_header)
+NAME_COLUMNS = ['deudor', 'nombre', 'name', 'debtor', 'debtor_name', 'nombre_deudor']
+PHONE_COLUMNS = ['telefono', 'phone', 'celular', 'fono']
+EMAIL_COLUMNS = ['email', 'correo', 'e-mail', 'correo_electronico']
+AMOUNT_COLUMNS = ['monto', 'amount', 'valor', 'importe', 'deuda']
+DATE_COLUMNS = ['fecha', 'fecha_inicial', 'initial_date', 'date']
+INSTALLMENTS_COLUMNS = ['cuotas', 'installments', 'installments_total', 'n_cuotas', 'numero_de_cuotas']
+NOTES_COLUMNS = ['notas', 'notes', 'nota', 'comentario', 'descripcion', 'detalle']
+
+# Filas por lote de escritura
+IMPORT_BATCH_SIZE = 5000
+
+# Errores por fila que se conservan para mostrar (el total se cuenta siempre)
+MAX_REPORTED_ERRORS = 200
+
+
+def validate_row(row):
+    """
+    Valida una fila de la planilla con las reglas del formulario de deudas
+
+    Args:
+        row (dict): Fila con encabezados normalizados
+
+    Returns:
+        tuple: (datos del deudor, datos de la deuda o None si la fila no tiene monto)
+
+    Raises:
+        ValueError: Con el mensaje de la primera regla que no se cumple
+    """
+    name = str(pick(row, NAME_COLUMNS)).strip()
+    if not name:
+        raise ValueError('El nombre es obligatorio')
+    if len(name) > 100:
+        raise ValueError('El nombre no puede superar los 100 caracteres')
+
+    debtor = {
+        'name': name,
+        'phone': str(pick(row, PHONE_COLUMNS)),
+        'email': str(pick(row, EMAIL_COLUMNS))
+    }
+    if len(debtor['phone']) > 20:
+        raise ValueError('El teléfono no puede superar los 20 caracteres')
+    if len(debtor['email']) > 120:
+        raise ValueError('El email no puede superar los 120 caracteres')
+
+    amount_value = pick(row, AMOUNT_COLUMNS)
+    if amount_value == '':
+        return debtor, None
+
+    amount = parse_amount(amount_value)
+    if amount <= 0:
+        raise ValueError('El monto debe ser mayor a cero')
+
+    try:
+        initial_date = parse_date(pick(row, DATE_COLUMNS))
+    except ValueError:
+        raise ValueError('Fecha inválida')
+
+    installments_value = pick(row, INSTALLMENTS_COLUMNS)
+    installments_total = 0
+    if installments_value != '':
+        try:
+            installments_number = float(installments_value)
+        except ValueError:
+            raise ValueError('El número de cuotas debe ser mayor a cero')
+        # Igual que /debt/add (type=int): '2.7', 'inf' o 'nan' se rechazan en vez de truncarse;
+        # 3.0 se acepta porque XLSX entrega los enteros como float
+        if not installments_number.is_integer() or installments_number <= 0:
+            raise ValueError('El número de cuotas debe ser mayor a cero')
+        installments_total = int(installments_number)
+
+    debt = {
+        'amount': amount,
+        'initial_date': initial_date,
+        'has_installments': installments_total > 0,
+        'installments_total': installments_total,
+        'notes': str(pick(row, NOTES_COLUMNS))
+    }
+    return debtor, debt
+
+
+class DebtImporter:
+    """
+    Importación en curso de una planilla para un usuario
+    Acumula filas válidas y las escribe por lotes de IMPORT_BATCH_SIZE
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.now = datetime.utcnow()
+        self.report = {
+            'rows': 0, 'debtors_created': 0, 'debts_created': 0,
+            'error_count': 0, 'errors': []
+        }
+        self.pending = []
+        self.touched_debtors = set()
+        # Deudores existentes del usuario por nombre normalizado
+        self.debtor_ids = {
+            normalize_text(name): debtor_id
+            for debtor_id, name in db.session.query(Debtor.id, Debtor.name).filter(Debtor.user_id == user.id)
+        }
+
+    def add_row(self, line_number, row):
+        """Valida una fila y la deja en el lote pendiente (o registra su error)"""
+        self.report['rows'] += 1
+        try:
+            debtor, debt = validate_row(row)
+        except ValueError as e:
+            self.report['error_count'] += 1
+            if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+                self.report['errors'].append({'line': line_number, 'message': str(e)})
+            return
+
+        self.pending.append((debtor, debt))
+        if len(self.pending) >= IMPORT_BATCH_SIZE:
+            self.flush()
+
+    def _create_debtors(self):
+        """Crea con un INSERT ... RETURNING los deudores del lote que aún no existen"""
+        new_debtors = {}
+        for debtor, _ in self.pending:
+            key = normalize_text(debtor['name'])
+            if key not in self.debtor_ids and key not in new_debtors:
+                new_debtors[key] = {
+                    'user_id': self.user.id,
+                    'name': debtor['name'],
+                    'phone': debtor['phone'],
+                    'email': debtor['email'],
+                    'created_at': self.now,
+                    'updated_at': self.now
+                }
+
+        if not new_debtors:
+            return
+
+        rows = list(new_debtors.values())
+        created = db.session.execute(
+            insert(Debtor).returning(Debtor.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+        for key, debtor_id in zip(new_debtors, created):
+            self.debtor_ids[key] = debtor_id
+        index_debtors([
+            {'id': debtor_id, 'name': row['name'], 'user_id': self.user.id}
+            for debtor_id, row in zip(created, rows)
+        ])
+        self.touched_debtors.update(created)
+        self.report['debtors_created'] += len(created)
+
+    def flush(self):
+        """Escribe el lote pendiente: deudores nuevos, deudas e historial 'created'"""
+        if not self.pending:
+            return
+
+        self._create_debtors()
+
+        debt_rows = []
+        for debtor, debt in self.pending:
+            if debt is None:
+                continue
+            debt_rows.append({
+                'debtor_id': self.debtor_ids[normalize_text(debtor['name'])],
+                'amount': debt['amount'],
+                'amount_minor': debt['amount'],  # El tipo Money lo guarda en unidades menores
+                'initial_date': debt['initial_date'],
+                'has_installments': debt['has_installments'],
+                'installments_total': debt['installments_total'],
+                'installments_paid': 0,
+                'partial_payment': 0,
+                'partial_payment_minor': 0,
+                'paid': False,
+                'notes': debt['notes'],
+                'created_at': self.now,
+                'updated_at': self.now
+            })
+
+        if debt_rows:
+            debt_ids = db.session.execute(
+                insert(Debt).returning(Debt.id, sort_by_parameter_order=True), debt_rows
+            ).scalars().all()
+
+            db.session.execute(insert(DebtHistory), [
+                {
+                    'debt_id': debt_id,
+                    'user_id': self.user.id,
+                    'action_type': 'created',
+                    'description': f"Deuda creada por {format_amount(row['amount'], self.user.currency)}" +
+                                   (f" en {row['installments_total']} cuotas" if row['has_installments'] else ''),
+                    'created_at': self.now
+                }
+                for debt_id, row in zip(debt_ids, debt_rows)
+            ])
+            self.touched_debtors.update(row['debtor_id'] for row in debt_rows)
+            self.report['debts_created'] += len(debt_ids)
+
+        self.pending = []
+
+    def finish(self):
+        """Escribe el último lote y recalcula los saldos de los deudores afectados"""
+        self.flush()
+        refresh_debtor_balances(self.touched_debtors)
+        return self.report
+
+
+def import_debts(user, filename, stream, max_rows=None):
+    """
+    Importa una planilla de deudores y deudas (el commit queda a cargo de quien llama)
+
+    Args:
+        user (User): Usuario dueño de los deudores importados
+        filename (str): Nombre original del archivo (define CSV o XLSX)
+        stream: Archivo binario
+        max_rows (int): Máximo de filas a leer (opcional)
+
+    Returns:
+        dict: rows, debtors_created, debts_created, error_count, errors (línea y mensaje,
+        hasta MAX_REPORTED_ERRORS) y truncated
+
+    Raises:
+        ValueError: Si el tipo de archivo no es soportado
+        RuntimeError: Si es XLSX y openpyxl no está instalado
+    """
+    importer = DebtImporter(user)
+    truncated = False
+
+    for line_number, row in iter_upload_rows(filename, stream):
+        if max_rows is not None and importer.report['rows'] >= max_rows:
+            truncated = True
+            break
+        importer.add_row(line_number, row)
+
+    report = importer.finish()
+    report['truncated'] = truncated
+    return report
@@ -0,0 +1,183 @@
+"""
+CuentasClaras - Exportación Columnar (Parquet / Arrow)
+Exporta deudores, deudas e historial como archivos columnares con tipos reales:
+montos como decimal exacto con dos decimales (desde las unidades menores, sin error de float),
+fechas como date/timestamp y banderas como booleanos
+Las filas se leen con los mismos cursores por lotes que data_export y se escriben en
+record batches, así la memoria queda acotada al tamaño de un lote
+Requiere pyarrow (dependencia opcional: pip install pyarrow)
+Autor: Fernando Poblete
+"""
+
+import os
+import tempfile
+import zipfile
+from decimal import Decimal
+from money import to_minor
+from data_export import debtor_rows, debt_rows, history_rows, DEBTOR_FIELDS, DEBT_FIELDS, HISTORY_FIELDS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Formatos soportados y extensión de cada archivo dentro del ZIP
+COLUMNAR_FORMATS = {
+    'parquet': 'parquet',
+    'arrow': 'arrow'
+}
+
+# Filas por record batch
+RECORD_BATCH_SIZE = 10000
+
+# Columnas de montos (decimal con dos decimales, igual que las unidades menores de money.py)
+MONEY_FIELDS = {
+    'total_amount', 'amount_paid', 'pending_amount', 'amount',
+    'installment_amount', 'partial_payment', 'remaining_amount'
+}
+MONEY_PRECISION = 18
+MONEY_DECIMALS = 2
+
+
+def columnar_available():
+    """Indica si pyarrow está instalado"""
+    return pa is not None
+
+
+def _schemas():
+    """
+    Esquemas tipados de cada conjunto de datos (mismas columnas que data_export + user_id)
+
+    Returns:
+        dict: nombre del conjunto -> (pa.Schema, generador de filas)
+    """
+    types = {
+        'user_id': pa.int64(),
+        'id': pa.int64(),
+        'debtor_id': pa.int64(),
+        'debt_id': pa.int64(),
+        'name': pa.string(),
+        'debtor_name': pa.string(),
+        'phone': pa.string(),
+        'email': pa.string(),
+        'notes': pa.string(),
+        'action_type': pa.string(),
+        'description': pa.string(),
+        'debt_count': pa.int32(),
+        'open_debt_count': pa.int32(),
+        'installments_total': pa.int32(),
+        'installments_paid': pa.int32(),
+        'has_installments': pa.bool_(),
+        'paid': pa.bool_(),
+        'initial_date': pa.date32(),
+        'created_at': pa.timestamp('us'),
+        'updated_at': pa.timestamp('us')
+    }
+    money_type = pa.decimal128(MONEY_PRECISION, MONEY_DECIMALS)
+    types.update({field: money_type for field in MONEY_FIELDS})
+
+    def schema(fields):
+        return pa.schema([(field, types[field]) for field in ['user_id'] + fields])
+
+    return {
+        'debtors': (schema(DEBTOR_FIELDS), debtor_rows),
+        'debts': (schema(DEBT_FIELDS), debt_rows),
+        'history': (schema(HISTORY_FIELDS), history_rows)
+    }
+
+
+def _to_decimal(amount):
+    """Monto en unidades mayores como Decimal exacto de dos decimales (None se mantiene)"""
+    if amount is None:
+        return None
+    return Decimal(to_minor(amount)).scaleb(-MONEY_DECIMALS)
+
+
+def money_rows(rows):
+    """Convierte las columnas de MONEY_FIELDS de cada fila a Decimal"""
+    for row in rows:
+        for field in MONEY_FIELDS.intersection(row):
+            row[field] = _to_decimal(row[field])
+        yield row
+
+
+def iter_record_batches(schema, rows, batch_size=RECORD_BATCH_SIZE):
+    """
+    Agrupa filas (dict) en record batches de Arrow con el esquema indicado
+
+    Args:
+        schema (pa.Schema): Esquema de destino
+        rows (iterable): Filas como dict
+        batch_size (int): Filas por batch
+
+    Yields:
+        pa.RecordBatch: Lotes de hasta batch_size filas
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield pa.RecordBatch.from_pylist(batch, schema=schema)
+            batch = []
+
+    if batch:
+        yield pa.RecordBatch.from_pylist(batch, schema=schema)
+
+
+def write_dataset(path, fmt, schema, rows):
+    """
+    Escribe un conjunto de datos en disco por record batches
+
+    Args:
+        path (str): Archivo de destino
+        fmt (str): 'parquet' o 'arrow' (formato de archivo IPC)
+        schema (pa.Schema): Esquema de las columnas
+        rows (iterable): Filas como dict
+
+    Returns:
+        int: Cantidad de filas escritas
+    """
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(path, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(path, schema)
+
+    count = 0
+    with writer:
+        for batch in iter_record_batches(schema, rows):
+            writer.write_batch(batch)
+            count += batch.num_rows
+
+    return count
+
+
+def build_columnar_archive(fmt, user_id=None):
+    """
+    Genera un ZIP con debtors, debts e history en formato columnar
+
+    Args:
+        fmt (str): 'parquet' o 'arrow'
+        user_id (int): Usuario a exportar (None: todos los usuarios, exportación de administración)
+
+    Returns:
+        file: Archivo temporal con el ZIP, posicionado al inicio (se elimina al cerrarlo)
+    """
+    if not columnar_available():
+        raise RuntimeError('La exportación Parquet/Arrow requiere pyarrow (pip install pyarrow)')
+    if fmt not in COLUMNAR_FORMATS:
+        raise ValueError(f"Formato columnar no soportado: {fmt}")
+
+    archive_file = tempfile.TemporaryFile()
+
+    with tempfile.TemporaryDirectory() as work_dir, \
+            zipfile.ZipFile(archive_file, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, (schema, row_source) in _schemas().items():
+            file_name = f"{name}.{COLUMNAR_FORMATS[fmt]}"
+            path = os.path.join(work_dir, file_name)
+            write_dataset(path, fmt, schema, money_rows(row_source(user_id)))
+            archive.write(path, file_name)
+            os.remove(path)
+
+    archive_file.seek(0)
+    return archive_file
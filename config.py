@@ -28,9 +28,59 @@ class Config:
     
     # Configuración de uploads
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-    MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5 MB máximo por archivo
+    MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5 MB máximo por request (archivos mayores se suben por partes)
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}  # Solo imágenes y PDF
     
+    # Subidas de adjuntos por partes, reanudables (ver uploads.py)
+    UPLOAD_MAX_FILE_MB = int(os.environ.get('UPLOAD_MAX_FILE_MB', 16))  # Tamaño máximo por archivo
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes por parte (cada parte es un request)
+    UPLOAD_SESSION_TTL_HOURS = 24  # Subidas sin avance más antiguas se descartan
+    
+    # Descarga de adjuntos: '' (la aplicación envía el archivo), 'x-sendfile' (Apache, lighttpd)
+    # o 'x-accel-redirect' (nginx, con una location internal que apunte a uploads/blobs/)
+    ATTACHMENT_SENDFILE = os.environ.get('ATTACHMENT_SENDFILE', '').lower()
+    ATTACHMENT_ACCEL_PREFIX = os.environ.get('ATTACHMENT_ACCEL_PREFIX', '/_blobs/')
+    
+    # Exportaciones PDF en segundo plano (EXPORT_WORKERS=0: se generan dentro del request)
+    EXPORT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports')
+    EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+    EXPORT_TTL_HOURS = int(os.environ.get('EXPORT_TTL_HOURS', 24))  # Horas disponibles para descargar
+    EXPORT_JOB_TIMEOUT_MINUTES = 30  # Trabajos 'running' o 'pending' más antiguos se marcan como fallidos
+    
+    # Caché de reportes PDF (LRU por tamaño total)
+    REPORT_CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports', 'cache')
+    REPORT_CACHE_MAX_MB = int(os.environ.get('REPORT_CACHE_MAX_MB', 200))
+    
+    # Reporte general en paralelo por rangos de deudores (REPORT_SHARD_WORKERS=0: en un solo proceso)
+    # El pool de fragmentos se crea en cada proceso de exportación que lo usa (reporte general
+    # y volúmenes ZIP; con EXPORT_WORKERS=0, en el proceso web). Procesos por proceso web:
+    #   EXPORT_WORKERS * (1 + REPORT_SHARD_WORKERS)
+    # Con los valores por defecto (2 y 2) son 6, multiplicados por los workers de gunicorn;
+    # por eso el valor es fijo y pequeño en vez de os.cpu_count()
+    REPORT_SHARD_WORKERS = int(os.environ.get('REPORT_SHARD_WORKERS', 2))
+    REPORT_SHARD_MIN_DEBTS = int(os.environ.get('REPORT_SHARD_MIN_DEBTS', 2000))  # Deudas mínimas por fragmento
+    
+    # Vistas previas de adjuntos en un pool propio (PREVIEW_WORKERS=0: se generan en el proceso web)
+    # Suma PREVIEW_WORKERS procesos por proceso web a la cuenta anterior
+    PREVIEW_WORKERS = int(os.environ.get('PREVIEW_WORKERS', 1))
+    
+    # Reporte general por volúmenes (ZIP): tamaño por defecto y máximo de cada volumen
+    EXPORT_VOLUME_DEBTORS = 500  # Deudores por volumen
+    EXPORT_VOLUME_PAGES = 200  # Páginas estimadas por volumen
+    EXPORT_VOLUME_MAX_SIZE = 5000
+    
+    # Conciliación de abonos desde cartolas bancarias (CSV)
+    RECONCILE_MAX_ROWS = int(os.environ.get('RECONCILE_MAX_ROWS', 5000))  # Filas por archivo
+    
+    # Importación masiva de deudores y deudas (CSV / XLSX)
+    IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', 100000))  # Filas por planilla
+    # Una planilla de IMPORT_MAX_ROWS filas supera MAX_CONTENT_LENGTH: las mayores se suben por partes
+    IMPORT_MAX_FILE_MB = int(os.environ.get('IMPORT_MAX_FILE_MB', 64))
+    
+    # Búsqueda de deudores (autocompletado)
+    SEARCH_LATENCY_BUDGET_MS = int(os.environ.get('SEARCH_LATENCY_BUDGET_MS', 150))
+    SEARCH_TYPEAHEAD_LIMIT = 10
+    
     # Configuración del servidor
     PORT = int(os.environ.get('PORT', 5001))
     DEBUG = os.environ.get('FLASK_ENV') != 'production'
@@ -48,9 +98,21 @@ class ProductionConfig(Config):
     SQLALCHEMY_ECHO = False
 
 
+class TestingConfig(Config):
+    """Configuración para pruebas automatizadas (base de datos en memoria)"""
+    TESTING = True
+    DEBUG = False
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ECHO = False
+    EXPORT_WORKERS = 0  # La base en memoria no se comparte con otros procesos
+    REPORT_SHARD_WORKERS = 0
+    PREVIEW_WORKERS = 0  # Miniaturas en el mismo proceso, al confirmar (resultado inmediato)
+
+
 # Diccionario de configuraciones disponibles
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
@@ -0,0 +1,146 @@
+"""
+CuentasClaras - Formato de Monedas
+Registro único de reglas de formato por moneda, usado por la web, el historial y los PDFs
+Cada regla se prepara una sola vez (símbolo, separadores y tabla de fracciones
+precalculada), así formatear un monto es una división entera y un reemplazo
+Formato: punto para miles, coma para decimales, decimales solo cuando existen (máximo 2)
+Ejemplos: $1.000 · $1.000,5 · R$1.234,56 · -$999
+Autor: Fernando Poblete
+"""
+
+from decimal import Decimal
+from money import MONEY_SCALE, to_minor
+
+# Moneda usada cuando el código no está registrado
+DEFAULT_CURRENCY = 'CLP'
+
+# Redondeo rápido en float: fuera de esta banda alrededor de media unidad menor el error
+# binario del producto (menor a 1e-6 bajo FAST_ROUND_LIMIT) no cambia el resultado;
+# dentro de ella (1.005 * 100 = 100.4999...) se decide con to_minor, exacto pero más lento
+TIE_BAND = 0.5 - 1e-5
+FAST_ROUND_LIMIT = 2 ** 32
+
+
+class CurrencyFormat:
+    """
+    Regla de formato de una moneda
+
+    Args:
+        symbol (str): Símbolo antepuesto al monto
+        thousands (str): Separador de miles
+        decimal (str): Separador decimal
+    """
+
+    def __init__(self, symbol, thousands='.', decimal=','):
+        self.symbol = symbol
+        self.thousands = thousands
+        self.decimal = decimal
+        # Parte decimal de cada valor 0..99 sin ceros a la derecha ('' para 0, ',5' para 50)
+        self._fractions = [''] + [
+            f"{decimal}{cents:02d}".rstrip('0') for cents in range(1, MONEY_SCALE)
+        ]
+
+    def format(self, amount):
+        """
+        Formatea un monto
+
+        Args:
+            amount (float): Monto en unidades mayores
+
+        Returns:
+            str: Monto con símbolo y separadores
+        """
+        # Mismo redondeo comercial que al guardar (1.005 -> 1,01; round() daría 1,00)
+        if isinstance(amount, Decimal):
+            minor = to_minor(amount)
+            sign, minor = ('-', -minor) if minor < 0 else ('', minor)
+        else:
+            scaled = amount * MONEY_SCALE
+            sign, scaled = ('-', -scaled) if scaled < 0 else ('', scaled)
+            minor = int(scaled + 0.5)
+            if abs(scaled - minor) > TIE_BAND or scaled >= FAST_ROUND_LIMIT:
+                minor = abs(to_minor(amount))
+            if not minor:
+                sign = ''
+        whole, cents = divmod(minor, MONEY_SCALE)
+        # El separador de miles de Python (',') se reemplaza por el de la moneda
+        return sign + self.symbol + f"{whole:,}".replace(',', self.thousands) + self._fractions[cents]
+
+    def format_many(self, amounts):
+        """
+        Formatea una columna de montos
+        Los valores repetidos (frecuentes en tablas de deudas) se formatean una sola vez
+
+        Args:
+            amounts (iterable): Montos en unidades mayores
+
+        Returns:
+            list: Montos formateados en el mismo orden
+        """
+        cache = {}
+        formatted = []
+        append = formatted.append
+        fmt = self.format
+        for amount in amounts:
+            text = cache.get(amount)
+            if text is None:
+                text = cache[amount] = fmt(amount)
+            append(text)
+        return formatted
+
+
+# Registro de monedas soportadas
+CURRENCIES = {
+    'CLP': CurrencyFormat('$'),
+    'USD': CurrencyFormat('$'),
+    'BRL': CurrencyFormat('R$')
+}
+
+# Números sin símbolo (mensajes de abonos y cuotas)
+PLAIN = CurrencyFormat('')
+
+
+def get_format(currency):
+    """Regla de formato de una moneda (DEFAULT_CURRENCY si no está registrada)"""
+    return CURRENCIES.get(currency) or CURRENCIES[DEFAULT_CURRENCY]
+
+
+def format_amount(amount, currency):
+    """
+    Formatea un monto según la moneda
+
+    Args:
+        amount (float): Monto a formatear
+        currency (str): Código de moneda (CLP, USD, BRL)
+
+    Returns:
+        str: Monto formateado con símbolo de moneda
+    """
+    return get_format(currency).format(amount)
+
+
+def format_many(amounts, currency):
+    """
+    Formatea una columna completa de montos con la misma moneda
+
+    Args:
+        amounts (iterable): Montos a formatear
+        currency (str): Código de moneda (CLP, USD, BRL)
+
+    Returns:
+        list: Montos formateados en el mismo orden
+    """
+    return get_format(currency).format_many(amounts)
+
+
+def format_number(amount):
+    """
+    Formatea un monto sin símbolo de moneda (ej: 1.000 o 1.000,5)
+
+    Args:
+        amount (float): Monto a formatear
+
+    Returns:
+        str: Monto formateado
+    """
+    return PLAIN.format(amount)
@@ -0,0 +1,267 @@
+"""
+CuentasClaras - Exportación de Datos (CSV / NDJSON)
+Exporta deudores, deudas (con el monto restante calculado) e historial de movimientos
+Las filas se leen con un cursor por lotes (yield_per) y se transmiten a medida que se
+codifican, así la memoria no crece con el total y el primer byte sale de inmediato
+Autor: Fernando Poblete
+"""
+
+import csv
+import io
+import json
+import unicodedata
+from datetime import date, datetime
+from urllib.parse import quote
+from flask import Response, stream_with_context
+from sqlalchemy import func
+from extensions import db
+from models import Debtor, DebtorBalance, Debt, DebtHistory
+
+# Formatos soportados y su tipo MIME
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+# Filas leídas por lote y codificadas por cada parte de la respuesta
+EXPORT_BATCH_SIZE = 1000
+
+# Columnas de cada conjunto de datos (orden del CSV)
+DEBTOR_FIELDS = [
+    'id', 'name', 'phone', 'email', 'debt_count', 'open_debt_count',
+    'total_amount', 'amount_paid', 'pending_amount', 'created_at'
+]
+
+DEBT_FIELDS = [
+    'id', 'debtor_id', 'debtor_name', 'amount', 'initial_date', 'has_installments',
+    'installments_total', 'installments_paid', 'installment_amount', 'partial_payment',
+    'paid', 'remaining_amount', 'notes', 'created_at', 'updated_at'
+]
+
+HISTORY_FIELDS = [
+    'id', 'debt_id', 'debtor_id', 'debtor_name', 'action_type', 'description', 'created_at'
+]
+
+
+def debtor_rows(user_id):
+    """
+    Recorre los deudores del usuario con sus saldos
+
+    Args:
+        user_id (int): ID del usuario (None: todos los usuarios, exportación de administración)
+
+    Yields:
+        dict: Fila con las columnas de DEBTOR_FIELDS y user_id
+    """
+    query = db.select(
+        Debtor.id, Debtor.name, Debtor.phone, Debtor.email,
+        func.coalesce(DebtorBalance.debt_count, 0),
+        func.coalesce(DebtorBalance.open_debt_count, 0),
+        func.coalesce(DebtorBalance.total_amount, 0),
+        func.coalesce(DebtorBalance.amount_paid, 0),
+        func.coalesce(DebtorBalance.pending_amount, 0),
+        Debtor.created_at,
+        Debtor.user_id
+    ).outerjoin(
+        DebtorBalance, DebtorBalance.debtor_id == Debtor.id
+    )
+
+    if user_id is not None:
+        query = query.where(Debtor.user_id == user_id)
+
+    rows = db.session.execute(
+        query.order_by(Debtor.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    for row in rows:
+        yield dict(zip(DEBTOR_FIELDS + ['user_id'], row))
+
+
+def debt_rows(user_id, debtor_id=None):
+    """
+    Recorre las deudas del usuario con el monto por cuota y el restante calculados
+
+    Args:
+        user_id (int): ID del usuario (None: todos los usuarios, exportación de administración)
+        debtor_id (int): Limitar a un deudor (opcional)
+
+    Yields:
+        dict: Fila con las columnas de DEBT_FIELDS y user_id
+    """
+    query = db.select(Debt, Debtor.name, Debtor.user_id).join(
+        Debtor, Debt.debtor_id == Debtor.id
+    )
+
+    if user_id is not None:
+        query = query.where(Debtor.user_id == user_id)
+
+    if debtor_id is not None:
+        query = query.where(Debt.debtor_id == debtor_id)
+
+    rows = db.session.execute(
+        query.order_by(Debt.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    for debt, debtor_name, owner_id in rows:
+        yield {
+            'user_id': owner_id,
+            'id': debt.id,
+            'debtor_id': debt.debtor_id,
+            'debtor_name': debtor_name,
+            'amount': debt.amount,
+            'initial_date': debt.initial_date,
+            'has_installments': bool(debt.has_installments),
+            'installments_total': debt.installments_total,
+            'installments_paid': debt.installments_paid,
+            'installment_amount': round(debt.installment_amount(), 2),
+            'partial_payment': debt.partial_payment or 0,
+            'paid': bool(debt.paid),
+            'remaining_amount': round(debt.remaining_amount(), 2),
+            'notes': debt.notes,
+            'created_at': debt.created_at,
+            'updated_at': debt.updated_at
+        }
+
+
+def history_rows(user_id, debtor_id=None):
+    """
+    Recorre los movimientos del historial del usuario en orden cronológico
+
+    Args:
+        user_id (int): ID del usuario (None: todos los usuarios, exportación de administración)
+        debtor_id (int): Limitar a un deudor (opcional)
+
+    Yields:
+        dict: Fila con las columnas de HISTORY_FIELDS y user_id
+    """
+    query = db.select(
+        DebtHistory.id, DebtHistory.debt_id, Debt.debtor_id, Debtor.name,
+        DebtHistory.action_type, DebtHistory.description, DebtHistory.created_at,
+        DebtHistory.user_id
+    ).join(
+        Debt, DebtHistory.debt_id == Debt.id
+    ).join(
+        Debtor, Debt.debtor_id == Debtor.id
+    )
+
+    if user_id is not None:
+        query = query.where(DebtHistory.user_id == user_id)
+
+    if debtor_id is not None:
+        query = query.where(Debt.debtor_id == debtor_id)
+
+    rows = db.session.execute(
+        query.order_by(DebtHistory.created_at, DebtHistory.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    for row in rows:
+        yield dict(zip(HISTORY_FIELDS + ['user_id'], row))
+
+
+# Conjuntos de datos exportables: columnas y generador de filas
+DATASETS = {
+    'debtors': (DEBTOR_FIELDS, debtor_rows),
+    'debts': (DEBT_FIELDS, debt_rows),
+    'history': (HISTORY_FIELDS, history_rows)
+}
+
+
+def _plain_value(value):
+    """Convierte fechas a ISO 8601 (CSV y JSON comparten el mismo formato)"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(fields, rows):
+    """
+    Codifica filas como CSV por partes (encabezado primero)
+
+    Args:
+        fields (list): Columnas en orden
+        rows (iterable): Filas como dict
+
+    Yields:
+        str: Partes del CSV de hasta EXPORT_BATCH_SIZE filas
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield buffer.getvalue()
+
+    buffer.seek(0)
+    buffer.truncate()
+    count = 0
+    for row in rows:
+        writer.writerow([_plain_value(row[field]) for field in fields])
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def encode_ndjson(fields, rows):
+    """
+    Codifica filas como JSON delimitado por líneas (un objeto por fila)
+
+    Args:
+        fields (list): Columnas en orden
+        rows (iterable): Filas como dict
+
+    Yields:
+        str: Partes del archivo de hasta EXPORT_BATCH_SIZE líneas
+    """
+    lines = []
+    for count, row in enumerate(rows, start=1):
+        lines.append(json.dumps({field: _plain_value(row[field]) for field in fields}, ensure_ascii=False))
+        # La primera fila sale sola para que el cliente reciba datos de inmediato
+        if count == 1 or len(lines) == EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'ndjson': encode_ndjson
+}
+
+
+def export_response(dataset, fmt, user_id, download_name, debtor_id=None):
+    """
+    Respuesta HTTP que transmite un conjunto de datos mientras se lee de la base de datos
+
+    Args:
+        dataset (str): 'debtors', 'debts' o 'history'
+        fmt (str): 'csv' o 'ndjson'
+        user_id (int): Usuario dueño de los datos
+        download_name (str): Nombre del archivo sin extensión
+        debtor_id (int): Limitar a un deudor (solo deudas e historial)
+
+    Returns:
+        Response: Respuesta transmitida por partes
+    """
+    fields, row_source = DATASETS[dataset]
+    rows = row_source(user_id) if debtor_id is None else row_source(user_id, debtor_id)
+
+    return Response(
+        stream_with_context(ENCODERS[fmt](fields, rows)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': _content_disposition(f"{download_name}.{fmt}")}
+    )
+
+
+def _content_disposition(filename):
+    """Encabezado de descarga; los nombres no ASCII van también en filename* (RFC 5987)"""
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return f"attachment; filename=\"{simple}\"; filename*=UTF-8''{quote(filename)}"
@@ -0,0 +1,239 @@
+"""
+CuentasClaras - Lectura de Archivos Importados
+Lee planillas CSV o XLSX subidas por el usuario fila a fila, sin cargarlas completas en memoria:
+detecta el separador (coma, punto y coma o tabulador), normaliza los encabezados y
+convierte montos y fechas escritos con formatos locales (1.234,56 · 15.000 · 31/12/2025)
+XLSX requiere openpyxl (dependencia opcional: pip install openpyxl)
+Autor: Fernando Poblete
+"""
+
+import csv
+import io
+import math
+import os
+import re
+import unicodedata
+from datetime import date, datetime
+from itertools import chain
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Extensiones de planilla aceptadas
+IMPORT_EXTENSIONS = {'.csv', '.txt', '.xlsx'}
+
+# Separadores aceptados en archivos CSV
+CSV_DELIMITERS = ',;\t'
+
+# Formatos de fecha aceptados
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%Y/%m/%d']
+
+# Símbolos de moneda y espacios que se ignoran al leer montos
+_AMOUNT_NOISE = re.compile(r'[\s$]|R\$|CLP|USD|BRL', re.IGNORECASE)
+
+
+def xlsx_available():
+    """Indica si openpyxl está instalado"""
+    return openpyxl is not None
+
+
+def normalize_text(value):
+    """
+    Normaliza un texto para comparar: sin tildes, minúsculas y espacios simples
+
+    Args:
+        value (str): Texto original
+
+    Returns:
+        str: Texto normalizado ('' si value es None)
+    """
+    if not value:
+        return ''
+    simple = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(simple.casefold().split())
+
+
+def normalize_header(value):
+    """Encabezado normalizado como identificador ('Fecha Inicial' -> 'fecha_inicial')"""
+    return normalize_text(str(value) if value is not None else '').replace(' ', '_')
+
+
+def parse_amount(value):
+    """
+    Convierte un monto escrito en formato local a float
+
+    Acepta separador de miles y decimales en cualquiera de las dos convenciones:
+    '1.234,56', '1,234.56', '15.000' (miles), '99,9' (decimales), '$ 5.000'
+    Los números de una celda XLSX se usan tal cual
+
+    Args:
+        value (str|int|float): Monto como texto o número
+
+    Returns:
+        float: Monto
+
+    Raises:
+        ValueError: Si el texto no es un monto válido o no es finito ('nan', 'inf', '1e999')
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return _finite_amount(float(value))
+
+    text = _AMOUNT_NOISE.sub('', value or '')
+    if not text:
+        raise ValueError('Monto vacío')
+
+    if '.' in text and ',' in text:
+        # El último separador es el decimal
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        # Una coma seguida de 1 o 2 dígitos es decimal; si no, separa miles
+        whole, _, fraction = text.rpartition(',')
+        text = f"{whole.replace(',', '')}.{fraction}" if len(fraction) <= 2 else text.replace(',', '')
+    elif text.count('.') > 1 or re.search(r'\.\d{3}$', text):
+        # Puntos como separador de miles (15.000, 1.250.000)
+        text = text.replace('.', '')
+
+    try:
+        return _finite_amount(float(text))
+    except ValueError:
+        raise ValueError(f"Monto inválido: {value}")
+
+
+def _finite_amount(amount):
+    """Rechaza montos no finitos (float() acepta 'nan' e 'inf', y '1e999' desborda a inf)"""
+    if not math.isfinite(amount):
+        raise ValueError('Monto inválido')
+    return amount
+
+
+def parse_date(value):
+    """
+    Convierte una fecha en alguno de los formatos de DATE_FORMATS
+    Las fechas de una celda XLSX se usan tal cual
+
+    Args:
+        value (str|date|datetime): Fecha como texto o fecha
+
+    Returns:
+        date: Fecha
+
+    Raises:
+        ValueError: Si el texto no es una fecha válida
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+
+    text = (value or '').strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha inválida: {value}")
+
+
+def iter_csv_rows(stream, encoding='utf-8-sig'):
+    """
+    Recorre un CSV subido fila a fila
+
+    Args:
+        stream: Archivo binario (ej: request.files['file'].stream)
+        encoding (str): Codificación del archivo (utf-8-sig ignora el BOM de Excel)
+
+    Yields:
+        tuple: (número de línea, dict encabezado normalizado -> valor sin espacios)
+    """
+    text_stream = io.TextIOWrapper(stream, encoding=encoding, errors='replace', newline='')
+    header_line = text_stream.readline()
+    if not header_line.strip():
+        return
+
+    try:
+        dialect = csv.Sniffer().sniff(header_line, delimiters=CSV_DELIMITERS)
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.reader(chain([header_line], text_stream), dialect)
+    headers = [normalize_header(header) for header in next(reader)]
+
+    for line_number, values in enumerate(reader, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        yield line_number, {
+            header: value.strip() for header, value in zip(headers, values) if header
+        }
+
+
+def iter_xlsx_rows(stream):
+    """
+    Recorre la primera hoja de un XLSX subido fila a fila (modo de solo lectura de openpyxl)
+
+    Args:
+        stream: Archivo binario con el libro
+
+    Yields:
+        tuple: (número de fila, dict encabezado normalizado -> valor de la celda)
+    """
+    if not xlsx_available():
+        raise RuntimeError('La importación de XLSX requiere openpyxl (pip install openpyxl)')
+
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = [normalize_header(header) for header in next(rows, ())]
+
+        for line_number, values in enumerate(rows, start=2):
+            row = {}
+            for header, value in zip(headers, values):
+                if isinstance(value, str):
+                    value = value.strip()
+                if header and value not in (None, ''):
+                    row[header] = value
+            if row:
+                yield line_number, row
+    finally:
+        workbook.close()
+
+
+def iter_upload_rows(filename, stream):
+    """
+    Recorre una planilla subida (CSV o XLSX según la extensión)
+
+    Args:
+        filename (str): Nombre original del archivo
+        stream: Archivo binario
+
+    Yields:
+        tuple: (número de línea, dict encabezado normalizado -> valor)
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension not in IMPORT_EXTENSIONS:
+        raise ValueError('La planilla debe ser un archivo CSV o XLSX')
+    if extension == '.xlsx':
+        return iter_xlsx_rows(stream)
+    return iter_csv_rows(stream)
+
+
+def pick(row, aliases):
+    """
+    Primer valor no vacío de la fila entre varios nombres posibles de columna
+
+    Args:
+        row (dict): Fila con encabezados normalizados
+        aliases (list): Nombres de columna aceptados, en orden de preferencia
+
+    Returns:
+        str: Valor encontrado ('' si ninguna columna tiene valor)
+    """
+    for alias in aliases:
+        value = row.get(alias)
+        if value not in (None, ''):
+            return value
+    return ''
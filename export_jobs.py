@@ -0,0 +1,431 @@
+"""
+CuentasClaras - Exportaciones en Segundo Plano
+Cola local de trabajos de exportación PDF respaldada por la tabla export_job
+Los PDFs se generan en un pool de procesos fuera del request (sin broker externo)
+y se guardan en disco con fecha de expiración
+Si los datos no cambiaron desde la última exportación se reutiliza el PDF de la caché de reportes
+El reporte general de usuarios con muchas deudas se genera por rangos de deudores en paralelo
+El reporte por volúmenes (kind='volumes') se genera como ZIP en el mismo pool, escrito a disco
+volumen a volumen (ver volume_export.stream_volumes_zip)
+Autor: Fernando Poblete
+"""
+
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.orm import undefer
+from extensions import db
+from models import User, Debtor, Debt, ExportJob
+from report_cache import report_fingerprint, get_cached_report, store_report, copy_file
+from summary import debtor_shards
+
+# Tipos de exportación soportados
+EXPORT_KINDS = ('all_debtors', 'debtor', 'volumes')
+
+# Tipos que se guardan en la caché de reportes (el ZIP por volúmenes depende de la división)
+CACHED_KINDS = ('all_debtors', 'debtor')
+
+# Pool de procesos del proceso web actual (se crea al primer uso)
+_executor = None
+
+# Pool de procesos para los fragmentos del reporte general (se crea al primer uso)
+_shard_executor = None
+
+# Aplicación Flask del proceso de trabajo (una por proceso)
+_worker_app = None
+
+
+def get_executor():
+    """
+    Retorna el pool de procesos de exportación, creándolo si no existe
+    Usa el contexto 'spawn' para que los procesos no hereden conexiones abiertas
+
+    Returns:
+        ProcessPoolExecutor: Pool compartido por todas las exportaciones del proceso
+        (None si EXPORT_WORKERS es 0)
+    """
+    global _executor
+
+    workers = current_app.config.get('EXPORT_WORKERS', 0)
+    if workers <= 0:
+        return None
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+
+    return _executor
+
+
+def get_shard_executor():
+    """
+    Retorna el pool de procesos que genera los fragmentos del reporte general
+    Es independiente del pool de exportaciones: un trabajo espera a sus fragmentos
+
+    Returns:
+        ProcessPoolExecutor: Pool de fragmentos (None si REPORT_SHARD_WORKERS es 0)
+    """
+    global _shard_executor
+
+    workers = current_app.config.get('REPORT_SHARD_WORKERS', 0)
+    if workers <= 0:
+        return None
+
+    if _shard_executor is None:
+        _shard_executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        atexit.register(_shard_executor.shutdown, wait=False, cancel_futures=True)
+
+    return _shard_executor
+
+
+def enqueue_export(user, kind, debtor=None, split=None, size=None):
+    """
+    Registra un trabajo de exportación y lo envía al pool de procesos
+    Con EXPORT_WORKERS=0 el PDF se genera de inmediato en el proceso actual
+
+    Args:
+        user (User): Usuario que solicita la exportación
+        kind (str): 'all_debtors', 'debtor' o 'volumes'
+        debtor (Debtor): Deudor a exportar (solo para kind='debtor')
+        split (str): Criterio de división, 'debtors' o 'pages' (solo para kind='volumes')
+        size (int): Deudores o páginas por volumen (solo para kind='volumes', opcional)
+
+    Returns:
+        ExportJob: Trabajo creado
+    """
+    from volume_export import VOLUME_SPLITS
+
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Tipo de exportación no soportado: {kind}")
+    if kind == 'volumes' and split not in VOLUME_SPLITS:
+        raise ValueError(f"Criterio de división no soportado: {split}")
+
+    # Limpiar archivos vencidos antes de agregar trabajo nuevo
+    cleanup_expired_exports()
+
+    if kind == 'debtor':
+        download_name = f"deudas_{debtor.name.replace(' ', '_')}.pdf"
+    elif kind == 'volumes':
+        download_name = f"reporte_completo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    else:
+        download_name = f"reporte_completo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+    job = ExportJob(
+        user_id=user.id,
+        kind=kind,
+        debtor_id=debtor.id if debtor else None,
+        volume_split=split if kind == 'volumes' else None,
+        volume_size=size if kind == 'volumes' else None,
+        download_name=download_name
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    # Datos sin cambios: entregar el PDF de la caché sin volver a generarlo
+    if kind in CACHED_KINDS:
+        fingerprint = report_fingerprint(user, kind, job.debtor_id)
+        cached_path = get_cached_report(fingerprint)
+        if cached_path:
+            job.fingerprint = fingerprint
+            _save_job_file(job, cached_path)
+            _finish_job(job, 'done')
+            return job
+
+    executor = get_executor()
+    if executor is None:
+        claimed = claim_job(job.id)
+        if claimed:
+            process_job(claimed)
+    else:
+        # Cada envío procesa el siguiente trabajo pendiente de la cola (no necesariamente este)
+        executor.submit(run_next_job, current_app.config['CONFIG_NAME'])
+
+    return job
+
+
+def claim_job(job_id=None):
+    """
+    Toma un trabajo pendiente de la cola marcándolo como 'running'
+    El UPDATE condicional garantiza que un trabajo lo procese un solo proceso
+
+    Args:
+        job_id (int): Trabajo específico a tomar (None: el pendiente más antiguo)
+
+    Returns:
+        ExportJob: Trabajo tomado, o None si no hay trabajos pendientes
+    """
+    while True:
+        if job_id is None:
+            candidate = db.session.query(ExportJob.id).filter(
+                ExportJob.status == 'pending'
+            ).order_by(ExportJob.created_at, ExportJob.id).limit(1).scalar()
+        else:
+            candidate = job_id
+
+        if candidate is None:
+            return None
+
+        claimed = ExportJob.query.filter(
+            ExportJob.id == candidate,
+            ExportJob.status == 'pending'
+        ).update({'status': 'running', 'started_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+
+        if claimed:
+            return db.session.get(ExportJob, candidate)
+
+        # Otro proceso lo tomó primero
+        if job_id is not None:
+            return None
+
+
+def render_export(job):
+    """
+    Genera el PDF de un trabajo usando los generadores de pdf_generator
+
+    Args:
+        job (ExportJob): Trabajo a generar
+
+    Returns:
+        BytesIO: Buffer con el PDF generado
+    """
+    from pdf_generator import generate_debtor_pdf, generate_all_debtors_pdf, merge_report_shards
+
+    user = db.session.get(User, job.user_id)
+
+    if job.kind == 'debtor':
+        debtor = db.session.get(Debtor, job.debtor_id) if job.debtor_id else None
+        if debtor is None or debtor.user_id != job.user_id:
+            raise LookupError('El deudor ya no existe')
+        debts = Debt.query.filter_by(debtor_id=debtor.id).options(undefer(Debt.attachment_count)).all()
+        return generate_debtor_pdf(debtor, debts, user)
+
+    # Reporte grande: un fragmento por rango de deudores, generados en paralelo y unidos en orden
+    executor = get_shard_executor()
+    if executor is not None:
+        workers = current_app.config['REPORT_SHARD_WORKERS']
+        shards = debtor_shards(user.id, workers, current_app.config['REPORT_SHARD_MIN_DEBTS'])
+        if len(shards) > 1:
+            now = datetime.now()
+            config_name = current_app.config['CONFIG_NAME']
+            futures = [
+                executor.submit(
+                    render_report_shard, config_name, user.id, first_id, last_id,
+                    idx == 0, idx == len(shards) - 1, now
+                )
+                for idx, (first_id, last_id) in enumerate(shards)
+            ]
+            return merge_report_shards([future.result() for future in futures])
+
+    return generate_all_debtors_pdf(user)
+
+
+def render_report_shard(config_name, user_id, first_id, last_id, include_header, include_closing, now):
+    """
+    Punto de entrada en el proceso de fragmentos: genera un rango del reporte general
+
+    Args:
+        config_name (str): Configuración con la que se creó la app web
+        user_id (int): Usuario dueño del reporte
+        first_id (int): Primer ID de deudor del rango
+        last_id (int): Último ID de deudor del rango
+        include_header (bool): El fragmento lleva el título y resumen (primero)
+        include_closing (bool): El fragmento lleva la nota de autenticidad (último)
+        now (datetime): Momento de exportación compartido por todos los fragmentos
+
+    Returns:
+        bytes: PDF del fragmento sin números de página
+    """
+    from pdf_generator import generate_all_debtors_shard
+
+    with _get_worker_app(config_name).app_context():
+        user = db.session.get(User, user_id)
+        return generate_all_debtors_shard(user, now, first_id, last_id, include_header, include_closing)
+
+
+def render_report_volume(config_name, user_id, volume, volume_count, now):
+    """
+    Punto de entrada en el proceso de fragmentos: genera un volumen del reporte general
+
+    Args:
+        config_name (str): Configuración con la que se creó la app web
+        user_id (int): Usuario dueño del reporte
+        volume (dict): Volumen de summary.report_volumes
+        volume_count (int): Total de volúmenes de la exportación
+        now (datetime): Momento de exportación compartido por todos los volúmenes
+
+    Returns:
+        bytes: PDF del volumen
+    """
+    from pdf_generator import generate_all_debtors_volume
+
+    with _get_worker_app(config_name).app_context():
+        user = db.session.get(User, user_id)
+        return generate_all_debtors_volume(user, now, volume, volume_count).getvalue()
+
+
+def render_export_chunks(job):
+    """
+    Genera el archivo de un trabajo por partes
+    El ZIP por volúmenes se entrega volumen a volumen (la memoria no crece con el total);
+    los demás reportes, como un solo PDF
+
+    Args:
+        job (ExportJob): Trabajo a generar
+
+    Yields:
+        bytes: Partes consecutivas del archivo
+    """
+    if job.kind != 'volumes':
+        yield render_export(job).getbuffer()
+        return
+
+    from volume_export import plan_volumes, stream_volumes_zip
+
+    user = db.session.get(User, job.user_id)
+    now = datetime.now()
+    volumes = plan_volumes(user, job.volume_split, job.volume_size)
+    yield from stream_volumes_zip(user, volumes, now)
+
+
+def process_job(job):
+    """
+    Genera el archivo de un trabajo tomado y lo guarda en EXPORT_FOLDER
+    El archivo se escribe en un temporal y se renombra para no exponer archivos incompletos
+
+    Args:
+        job (ExportJob): Trabajo en estado 'running'
+    """
+    try:
+        # Huella calculada antes de leer los datos: si cambian durante la generación,
+        # la próxima exportación tendrá otra huella y no usará este PDF
+        if job.kind in CACHED_KINDS:
+            user = db.session.get(User, job.user_id)
+            job.fingerprint = report_fingerprint(user, job.kind, job.debtor_id)
+
+        temp_path = f"{_job_file_path(job)}.tmp"
+        with open(temp_path, 'wb') as f:
+            for chunk in render_export_chunks(job):
+                f.write(chunk)
+        os.replace(temp_path, _job_file_path(job))
+        job.file_path = _job_file_path(job)
+
+        if job.fingerprint:
+            store_report(job.fingerprint, job.file_path)
+        _finish_job(job, 'done')
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception(f"Error al generar exportación {job.id}")
+        job.error = str(e)
+        _finish_job(job, 'failed')
+
+
+def _job_file_path(job):
+    """Ruta del archivo de un trabajo dentro de EXPORT_FOLDER (<id>.pdf o <id>.zip)"""
+    export_folder = current_app.config['EXPORT_FOLDER']
+    os.makedirs(export_folder, exist_ok=True)
+    return os.path.join(export_folder, f"{job.id}.{job.file_extension}")
+
+
+def _save_job_file(job, source_path):
+    """Asocia al trabajo una copia del PDF (independiente de la caché, que puede expulsarlo)"""
+    file_path = _job_file_path(job)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    copy_file(source_path, file_path)
+    job.file_path = file_path
+
+
+def _finish_job(job, status):
+    """
+    Marca el trabajo como terminado y fija su expiración
+    Los trabajos fallidos también expiran para que la limpieza los elimine
+    """
+    job.status = status
+    job.finished_at = datetime.utcnow()
+    job.expires_at = job.finished_at + timedelta(hours=current_app.config['EXPORT_TTL_HOURS'])
+    db.session.commit()
+
+
+def run_next_job(config_name):
+    """
+    Punto de entrada en el proceso de trabajo: toma y genera el siguiente trabajo pendiente
+    La aplicación Flask se crea una sola vez por proceso
+
+    Args:
+        config_name (str): Configuración con la que se creó la app web
+    """
+    with _get_worker_app(config_name).app_context():
+        job = claim_job()
+        if job:
+            process_job(job)
+
+
+def _get_worker_app(config_name):
+    """Aplicación Flask del proceso de trabajo, creada una sola vez por proceso"""
+    global _worker_app
+
+    if _worker_app is None:
+        from app import create_app
+        _worker_app = create_app(config_name)
+
+    return _worker_app
+
+
+def cleanup_expired_exports():
+    """
+    Elimina los archivos y registros de exportaciones vencidas
+    y marca como fallidos los trabajos atascados más de EXPORT_JOB_TIMEOUT_MINUTES:
+    'running' (proceso caído, se borra su archivo temporal) o 'pending' (envío al pool perdido)
+    Los fallidos reciben expiración para que una limpieza posterior los elimine
+
+    Returns:
+        int: Cantidad de exportaciones eliminadas
+    """
+    now = datetime.utcnow()
+
+    expired = ExportJob.query.filter(ExportJob.expires_at <= now).all()
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        db.session.delete(job)
+
+    stale_before = now - timedelta(minutes=current_app.config['EXPORT_JOB_TIMEOUT_MINUTES'])
+    failed = {
+        'status': 'failed',
+        'finished_at': now,
+        'expires_at': now + timedelta(hours=current_app.config['EXPORT_TTL_HOURS'])
+    }
+
+    stuck = ExportJob.query.filter(
+        ExportJob.status == 'running',
+        ExportJob.started_at < stale_before
+    )
+    stuck_jobs = stuck.all()
+    stuck.update(
+        dict(failed, error='La exportación excedió el tiempo máximo'), synchronize_session=False
+    )
+    for job in stuck_jobs:
+        temp_path = f"{_job_file_path(job)}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    ExportJob.query.filter(
+        ExportJob.status == 'pending',
+        ExportJob.created_at < stale_before
+    ).update(
+        dict(failed, error='La exportación no se alcanzó a procesar, vuelve a solicitarla'),
+        synchronize_session=False
+    )
+
+    db.session.commit()
+    return len(expired)
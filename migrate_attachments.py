@@ -0,0 +1,303 @@
+"""
+Script de migración de adjuntos a la tabla attachment
+Los adjuntos se guardaban como listas JSON en debt.debt_attachments y
+debt.payment_attachments, con los archivos en uploads/<usuario>/<deuda>/. Este script:
+- crea las tablas attachment y attachment_blob si no existen, y agrega size, mime y los
+  índices compuestos a una tabla attachment anterior
+- copia cada archivo antiguo al almacén por hash (attachments.py) y crea su fila en
+  attachment, por lotes cortos; los adjuntos que ya tienen fila se omiten (se puede reejecutar)
+- completa size y mime de las filas creadas antes de estas columnas
+- borra los archivos antiguos después del commit (salvo con --keep-files)
+
+Las columnas JSON no se modifican: ya no se leen ni se escriben y sirven de respaldo
+
+Ejecutar:
+    python migrate_attachments.py               # Migra y verifica
+    python migrate_attachments.py --keep-files  # Migra sin borrar los archivos antiguos
+    python migrate_attachments.py --verify      # Solo reporta, sin modificar
+Autor: Fernando Poblete
+"""
+
+import json
+import os
+import sys
+import time
+from flask import current_app
+from sqlalchemy import text, or_
+from app import create_app
+from extensions import db
+from models import Debt, Debtor, Attachment, AttachmentBlob
+from attachments import write_blob, attach_blob, guess_mime
+
+# Columnas nuevas de la tabla attachment
+COLUMNS = [
+    ('size', 'BIGINT'),
+    ('mime', 'VARCHAR(100)'),
+]
+
+# (columna JSON de la deuda, tipo de adjunto)
+LEGACY_COLUMNS = [
+    ('debt_attachments', 'debt'),
+    ('payment_attachments', 'payment'),
+]
+
+# Índice de una sola columna reemplazado por ix_attachment_debt_kind
+OLD_INDEXES = ['ix_attachment_debt_id']
+
+# Deudas por lote y pausa entre lotes (transacciones cortas)
+BATCH_SIZE = 200
+PAUSE_SECONDS = 0.05
+
+
+def missing_columns():
+    """Columnas nuevas que aún no existen en la tabla attachment"""
+    existing = {col['name'] for col in db.inspect(db.engine).get_columns('attachment')}
+    return [column for column, _ in COLUMNS if column not in existing]
+
+
+def prepare_schema():
+    """Crea las tablas que falten y agrega columnas e índices nuevos a la tabla attachment"""
+    db.create_all()
+
+    missing = missing_columns()
+    for column, column_type in COLUMNS:
+        if column not in missing:
+            print(f"✅ La columna '{column}' ya existe en la tabla 'attachment'")
+            continue
+
+        print(f"🔄 Agregando columna '{column}' a la tabla 'attachment'...")
+        db.session.execute(text(f'ALTER TABLE attachment ADD COLUMN {column} {column_type}'))
+        db.session.commit()
+        print(f"✅ Columna '{column}' agregada")
+
+    existing_indexes = {index['name'] for index in db.inspect(db.engine).get_indexes('attachment')}
+    for index in Attachment.__table__.indexes:
+        if index.name not in existing_indexes:
+            index.create(db.engine)
+            print(f"✅ Índice '{index.name}' creado")
+
+    for name in OLD_INDEXES:
+        if name in existing_indexes:
+            db.session.execute(text(f'DROP INDEX {name}'))
+            db.session.commit()
+            print(f"✅ Índice '{name}' eliminado (cubierto por ix_attachment_debt_kind)")
+
+
+def legacy_names(value):
+    """Nombres de archivo de una columna JSON antigua ([] si está vacía o es inválida)"""
+    if not value:
+        return []
+    try:
+        names = json.loads(value)
+    except ValueError:
+        return []
+    return [name for name in names if isinstance(name, str) and name] if isinstance(names, list) else []
+
+
+def legacy_path(user_id, debt_id, filename):
+    """Ruta del archivo antiguo: uploads/<usuario>/<deuda>/<nombre>"""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], str(user_id), str(debt_id), filename)
+
+
+def _legacy_batch(last_id):
+    """Siguiente lote de deudas con adjuntos JSON (id, usuario y columnas JSON) después de last_id"""
+    return db.session.query(
+        Debt.id, Debtor.user_id, Debt.debt_attachments, Debt.payment_attachments
+    ).join(Debtor, Debt.debtor_id == Debtor.id).filter(
+        Debt.id > last_id,
+        or_(Debt.debt_attachments.isnot(None), Debt.payment_attachments.isnot(None))
+    ).order_by(Debt.id).limit(BATCH_SIZE).all()
+
+
+def _registered(debt_ids):
+    """Pares (deuda, nombre) que ya tienen fila en attachment"""
+    return set(db.session.query(Attachment.debt_id, Attachment.filename).filter(
+        Attachment.debt_id.in_(debt_ids)
+    ))
+
+
+def backfill():
+    """
+    Pasa los adjuntos JSON a la tabla attachment por lotes de BATCH_SIZE deudas
+    (una transacción por lote)
+
+    Returns:
+        dict: migrated, skipped (ya tenían fila), missing (archivo no encontrado) y
+        legacy_files (rutas antiguas ya copiadas al almacén)
+    """
+    result = {'migrated': 0, 'skipped': 0, 'missing': [], 'legacy_files': []}
+
+    last_id = 0
+    while True:
+        rows = _legacy_batch(last_id)
+        if not rows:
+            break
+
+        registered = _registered([row[0] for row in rows])
+        copied = []
+        for debt_id, user_id, debt_value, payment_value in rows:
+            for kind, value in (('debt', debt_value), ('payment', payment_value)):
+                for filename in legacy_names(value):
+                    path = legacy_path(user_id, debt_id, filename)
+                    if (debt_id, filename) in registered:
+                        result['skipped'] += 1
+                        if os.path.exists(path):
+                            copied.append(path)
+                        continue
+                    if not os.path.exists(path):
+                        result['missing'].append(path)
+                        continue
+
+                    with open(path, 'rb') as legacy_file:
+                        sha256, size = write_blob(legacy_file)
+                    attach_blob(debt_id, kind, filename, sha256, size)
+                    registered.add((debt_id, filename))
+                    copied.append(path)
+                    result['migrated'] += 1
+
+        db.session.commit()
+        result['legacy_files'].extend(copied)
+
+        last_id = rows[-1][0]
+        print(f"   ... hasta la deuda {last_id}: {result['migrated']} adjunto(s) migrado(s)")
+        time.sleep(PAUSE_SECONDS)
+
+    return result
+
+
+def fill_metadata():
+    """
+    Completa size (desde attachment_blob) y mime (según la extensión) de las filas que no los tienen
+
+    Returns:
+        int: Cantidad de filas actualizadas
+    """
+    updated = 0
+    while True:
+        rows = db.session.query(Attachment.id, Attachment.filename, AttachmentBlob.size).join(
+            AttachmentBlob, AttachmentBlob.sha256 == Attachment.sha256
+        ).filter(or_(Attachment.size.is_(None), Attachment.mime.is_(None))).limit(1000).all()
+        if not rows:
+            break
+
+        db.session.execute(db.update(Attachment), [
+            {'id': attachment_id, 'size': size, 'mime': guess_mime(filename)}
+            for attachment_id, filename, size in rows
+        ])
+        db.session.commit()
+        updated += len(rows)
+
+    return updated
+
+
+def remove_legacy_files(paths):
+    """Borra los archivos antiguos ya copiados y las carpetas que quedan vacías"""
+    folders = set()
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+        folders.add(os.path.dirname(path))
+
+    # Carpetas de deuda y luego de usuario, si quedaron vacías
+    for folder in sorted(folders, reverse=True):
+        for candidate in (folder, os.path.dirname(folder)):
+            try:
+                os.rmdir(candidate)
+            except OSError:
+                pass
+
+
+def verification_report():
+    """
+    Compara los adjuntos JSON con las filas de attachment
+
+    Returns:
+        dict: legacy (nombres en columnas JSON), pending (sin fila), without_metadata
+        (filas sin size o mime) y attachments (total de filas)
+    """
+    report = {'legacy': 0, 'pending': 0}
+
+    last_id = 0
+    while True:
+        rows = _legacy_batch(last_id)
+        if not rows:
+            break
+
+        registered = _registered([row[0] for row in rows])
+        for debt_id, _, debt_value, payment_value in rows:
+            for value in (debt_value, payment_value):
+                for filename in legacy_names(value):
+                    report['legacy'] += 1
+                    if (debt_id, filename) not in registered:
+                        report['pending'] += 1
+
+        last_id = rows[-1][0]
+        db.session.rollback()
+
+    report['without_metadata'] = Attachment.query.filter(
+        or_(Attachment.size.is_(None), Attachment.mime.is_(None))
+    ).count()
+    report['attachments'] = Attachment.query.count()
+    return report
+
+
+def migrate_attachments(verify_only=False, keep_files=False):
+    """
+    Migra los adjuntos JSON a la tabla attachment y reporta el resultado
+
+    Args:
+        verify_only (bool): Solo reportar, sin modificar la base de datos
+        keep_files (bool): No borrar los archivos antiguos ya copiados al almacén
+
+    Returns:
+        dict: Reporte de verificación
+    """
+    app = create_app()
+
+    with app.app_context():
+        if verify_only and missing_columns():
+            print(f"⚠️  Faltan columnas {', '.join(missing_columns())}: ejecuta python migrate_attachments.py")
+            return None
+
+        if not verify_only:
+            prepare_schema()
+            print("🔄 Copiando adjuntos antiguos al almacén por lotes...")
+            result = backfill()
+            print(f"✅ {result['migrated']} adjunto(s) migrado(s), {result['skipped']} ya registrado(s)")
+            for path in result['missing']:
+                print(f"⚠️  Archivo no encontrado: {path}")
+
+            updated = fill_metadata()
+            print(f"✅ Tamaño y tipo completados en {updated} fila(s)")
+
+            if keep_files:
+                print(f"ℹ️  Se conservan {len(result['legacy_files'])} archivo(s) antiguo(s)")
+            else:
+                remove_legacy_files(result['legacy_files'])
+                print(f"✅ {len(result['legacy_files'])} archivo(s) antiguo(s) eliminado(s)")
+
+        report = verification_report()
+
+        print("\nReporte de verificación")
+        print(f"   Adjuntos en columnas JSON:        {report['legacy']}")
+        print(f"   Sin fila en attachment:           {report['pending']}")
+        print(f"   Filas sin tamaño o tipo:          {report['without_metadata']}")
+        print(f"   Filas en attachment:              {report['attachments']}")
+
+        if report['pending'] or report['without_metadata']:
+            print("\n⚠️  Hay adjuntos pendientes: ejecuta python migrate_attachments.py")
+        else:
+            print("\n✅ Todos los adjuntos están en la tabla attachment")
+
+        return report
+
+
+if __name__ == '__main__':
+    verify_only = '--verify' in sys.argv
+    keep_files = '--keep-files' in sys.argv
+
+    print("=" * 60)
+    print("MIGRACIÓN: Adjuntos en la tabla attachment")
+    print("=" * 60)
+    migrate_attachments(verify_only, keep_files)
+    print("=" * 60)
@@ -0,0 +1,57 @@
+"""
+Script de migración para el reporte por volúmenes en segundo plano
+Agrega a export_job el criterio y tamaño de división de los trabajos kind='volumes':
+- export_job.volume_split
+- export_job.volume_size
+
+Ejecutar con: python migrate_export_volumes.py
+Autor: Fernando Poblete
+"""
+
+from app import create_app
+from extensions import db
+from sqlalchemy import text
+
+# (columna, tipo SQL)
+COLUMNS = [
+    ('volume_split', 'VARCHAR(10)'),
+    ('volume_size', 'INTEGER'),
+]
+
+
+def migrate_export_volumes():
+    """
+    Agrega las columnas que falten en la tabla export_job
+    """
+    app = create_app()
+
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+
+        if not inspector.has_table('export_job'):
+            print("ℹ️  La tabla 'export_job' no existe (se creará completa al iniciar la aplicación)")
+            return
+
+        existing = {col['name'] for col in inspector.get_columns('export_job')}
+
+        for column, sql_type in COLUMNS:
+            if column in existing:
+                print(f"✅ La columna '{column}' ya existe en la tabla 'export_job'")
+                continue
+
+            try:
+                print(f"🔄 Agregando columna '{column}' a la tabla 'export_job'...")
+                db.session.execute(text(f'ALTER TABLE export_job ADD COLUMN {column} {sql_type}'))
+                db.session.commit()
+                print(f"✅ Columna '{column}' agregada")
+            except Exception as e:
+                print(f"❌ Error durante la migración: {e}")
+                db.session.rollback()
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("MIGRACIÓN: Reporte por volúmenes en segundo plano")
+    print("=" * 60)
+    migrate_export_volumes()
+    print("=" * 60)
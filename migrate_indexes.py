@@ -0,0 +1,46 @@
+"""
+Script de migración para crear los índices declarados en los modelos
+db.create_all() solo crea índices junto con tablas nuevas, por lo que
+en bases de datos existentes hay que agregarlos con este script
+
+Ejecutar: python migrate_indexes.py
+Autor: Fernando Poblete
+"""
+
+from app import create_app
+from extensions import db
+
+
+def migrate_indexes():
+    """Crea los índices de los modelos que aún no existen en la base de datos"""
+    app = create_app()
+
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        created = 0
+
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                try:
+                    index.create(bind=db.engine)
+                    created += 1
+                    print(f"✅ Índice '{index.name}' creado en '{table.name}'")
+                except Exception as e:
+                    print(f"❌ Error al crear índice '{index.name}': {e}")
+
+        if created == 0:
+            print("✅ Todos los índices ya existen")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("MIGRACIÓN: Índices de consultas")
+    print("=" * 60)
+    migrate_indexes()
+    print("=" * 60)
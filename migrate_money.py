@@ -0,0 +1,268 @@
+"""
+Script de migración de montos a unidades menores
+Agrega debt.amount_minor y debt.partial_payment_minor (enteros, ver money.py) y los
+completa por lotes cortos desde las columnas float, sin bloquear la aplicación:
+las escrituras nuevas ya guardan ambas columnas (escritura doble en models.Debt)
+
+Los saldos de debtor_balance son derivados: sus columnas float (total_amount, amount_paid,
+pending_amount) se reemplazan por las enteras *_minor y se recalculan desde debt por lotes
+
+Al terminar imprime un reporte de verificación:
+- filas pendientes o distintas entre la columna float y la entera
+- montos con fracciones menores a una centésima (se redondean)
+- diferencia entre SUM() sobre floats y la suma exacta en unidades menores
+
+Ejecutar:
+    python migrate_money.py            # Agrega columnas, completa y verifica
+    python migrate_money.py --verify   # Solo reporta, sin modificar
+Autor: Fernando Poblete
+"""
+
+import sys
+import time
+from sqlalchemy import text, bindparam, func
+from app import create_app
+from extensions import db
+from models import Debt, DebtorBalance
+from money import to_minor, from_minor, MONEY_SCALE
+from summary import refresh_debtor_balances, verify_balances
+
+# (columna float, columna entera)
+COLUMNS = [
+    ('amount', 'amount_minor'),
+    ('partial_payment', 'partial_payment_minor'),
+]
+
+# Saldos de debtor_balance: (columna float anterior, columna entera)
+BALANCE_COLUMNS = [
+    ('total_amount', 'total_amount_minor'),
+    ('amount_paid', 'amount_paid_minor'),
+    ('pending_amount', 'pending_amount_minor'),
+]
+
+# Índice de orden por saldo, definido sobre las columnas de saldo (models.DebtorBalance)
+BALANCE_INDEX = 'ix_debtor_balance_user_net'
+
+# Filas por lote y pausa entre lotes (transacciones cortas)
+BATCH_SIZE = 1000
+PAUSE_SECONDS = 0.05
+
+
+def missing_columns():
+    """Columnas enteras que aún no existen en la tabla debt"""
+    existing = {col['name'] for col in db.inspect(db.engine).get_columns('debt')}
+    return [column for _, column in COLUMNS if column not in existing]
+
+
+def add_columns():
+    """Agrega las columnas enteras que falten en la tabla debt"""
+    missing = missing_columns()
+
+    for _, column in COLUMNS:
+        if column not in missing:
+            print(f"✅ La columna '{column}' ya existe en la tabla 'debt'")
+            continue
+
+        print(f"🔄 Agregando columna '{column}' a la tabla 'debt'...")
+        db.session.execute(text(f'ALTER TABLE debt ADD COLUMN {column} BIGINT'))
+        db.session.commit()
+        print(f"✅ Columna '{column}' agregada")
+
+
+def missing_balance_columns():
+    """Columnas enteras que aún no existen en la tabla debtor_balance"""
+    inspector = db.inspect(db.engine)
+    if not inspector.has_table('debtor_balance'):
+        return []
+    existing = {col['name'] for col in inspector.get_columns('debtor_balance')}
+    return [column for _, column in BALANCE_COLUMNS if column not in existing]
+
+
+def migrate_balances():
+    """
+    Pasa los saldos de debtor_balance a unidades menores
+    Agrega las columnas enteras, elimina las float (y el índice que las usa, que se vuelve
+    a crear sobre las enteras) y recalcula los saldos desde debt por lotes de BATCH_SIZE
+
+    Returns:
+        int: Cantidad de saldos recalculados
+    """
+    inspector = db.inspect(db.engine)
+    if not inspector.has_table('debtor_balance'):
+        return 0
+
+    existing = {col['name'] for col in inspector.get_columns('debtor_balance')}
+    legacy = [old for old, _ in BALANCE_COLUMNS if old in existing]
+
+    for _, column in BALANCE_COLUMNS:
+        if column in existing:
+            print(f"✅ La columna '{column}' ya existe en la tabla 'debtor_balance'")
+            continue
+        print(f"🔄 Agregando columna '{column}' a la tabla 'debtor_balance'...")
+        db.session.execute(text(f'ALTER TABLE debtor_balance ADD COLUMN {column} BIGINT NOT NULL DEFAULT 0'))
+
+    if legacy:
+        db.session.execute(text(f'DROP INDEX IF EXISTS {BALANCE_INDEX}'))
+        for column in legacy:
+            print(f"🔄 Eliminando columna float '{column}' de la tabla 'debtor_balance'...")
+            db.session.execute(text(f'ALTER TABLE debtor_balance DROP COLUMN {column}'))
+    db.session.commit()
+
+    if not legacy:
+        return 0
+
+    index = next(index for index in DebtorBalance.__table__.indexes if index.name == BALANCE_INDEX)
+    index.create(db.engine)
+
+    # Las columnas nuevas parten en 0: se recalculan todos los saldos
+    debtor_ids = [
+        debtor_id for (debtor_id,) in
+        db.session.query(DebtorBalance.debtor_id).order_by(DebtorBalance.debtor_id)
+    ]
+    for start in range(0, len(debtor_ids), BATCH_SIZE):
+        refresh_debtor_balances(debtor_ids[start:start + BATCH_SIZE])
+        db.session.commit()
+        time.sleep(PAUSE_SECONDS)
+    return len(debtor_ids)
+
+
+def _debt_batch(last_id):
+    """Siguiente lote de deudas (id, float y entero de cada columna) después de last_id"""
+    return db.session.query(
+        Debt.id, Debt.amount, Debt.amount_minor, Debt.partial_payment, Debt.partial_payment_minor
+    ).filter(Debt.id > last_id).order_by(Debt.id).limit(BATCH_SIZE).all()
+
+
+def _row_is_stale(amount, amount_minor, partial, partial_minor):
+    """La fila no tiene unidades menores o no coinciden con los floats"""
+    return (amount_minor is None or to_minor(amount) != to_minor(amount_minor)
+            or to_minor(partial or 0) != to_minor(partial_minor or 0))
+
+
+def backfill():
+    """
+    Completa las columnas enteras por lotes de BATCH_SIZE filas (una transacción por lote)
+
+    Returns:
+        int: Cantidad de filas actualizadas
+    """
+    table = Debt.__table__
+    update = table.update().where(table.c.id == bindparam('row_id')).values(
+        amount_minor=bindparam('amount_value'),
+        partial_payment_minor=bindparam('partial_value')
+    )
+
+    last_id, updated = 0, 0
+    while True:
+        rows = _debt_batch(last_id)
+        if not rows:
+            break
+
+        # El tipo Money convierte los montos en unidades mayores a enteros
+        params = [
+            {'row_id': row_id, 'amount_value': amount, 'partial_value': partial or 0}
+            for row_id, amount, amount_minor, partial, partial_minor in rows
+            if _row_is_stale(amount, amount_minor, partial, partial_minor)
+        ]
+        if params:
+            db.session.execute(update, params)
+        db.session.commit()
+
+        updated += len(params)
+        last_id = rows[-1][0]
+        print(f"   ... hasta la deuda {last_id}: {updated} fila(s) actualizada(s)")
+        time.sleep(PAUSE_SECONDS)
+
+    return updated
+
+
+def verification_report():
+    """
+    Compara las columnas float con las enteras
+
+    Returns:
+        dict: rows, missing, mismatched, sub_cent, float_sum, exact_sum y difference
+    """
+    report = {'rows': 0, 'missing': 0, 'mismatched': 0, 'sub_cent': 0}
+    exact_total = 0
+
+    last_id = 0
+    while True:
+        rows = _debt_batch(last_id)
+        if not rows:
+            break
+
+        for row_id, amount, amount_minor, partial, partial_minor in rows:
+            report['rows'] += 1
+            exact_total += to_minor(amount)
+            if amount_minor is None:
+                report['missing'] += 1
+            elif _row_is_stale(amount, amount_minor, partial, partial_minor):
+                report['mismatched'] += 1
+            if abs(amount * MONEY_SCALE - round(amount * MONEY_SCALE)) > 1e-6:
+                report['sub_cent'] += 1
+
+        last_id = rows[-1][0]
+        db.session.rollback()
+
+    report['float_sum'] = db.session.query(func.coalesce(func.sum(Debt.amount), 0)).scalar()
+    report['exact_sum'] = from_minor(exact_total)
+    report['difference'] = report['float_sum'] - report['exact_sum']
+    return report
+
+
+def migrate_money(verify_only=False):
+    """
+    Agrega y completa las columnas de unidades menores, y reporta el resultado
+
+    Args:
+        verify_only (bool): Solo reportar, sin modificar la base de datos
+
+    Returns:
+        dict: Reporte de verificación
+    """
+    app = create_app()
+
+    with app.app_context():
+        missing = missing_columns() + missing_balance_columns()
+        if verify_only and missing:
+            print(f"⚠️  Faltan columnas {', '.join(missing)}: ejecuta python migrate_money.py")
+            return None
+
+        if not verify_only:
+            add_columns()
+            print("🔄 Completando unidades menores por lotes...")
+            updated = backfill()
+            print(f"✅ {updated} fila(s) actualizada(s)")
+            refreshed = migrate_balances()
+            print(f"✅ {refreshed} saldo(s) recalculado(s) en unidades menores")
+
+        report = verification_report()
+        report['balance_drift'] = len(verify_balances())
+
+        print("\nReporte de verificación")
+        print(f"   Deudas revisadas:                 {report['rows']}")
+        print(f"   Sin unidades menores:             {report['missing']}")
+        print(f"   Distintas a la columna float:     {report['mismatched']}")
+        print(f"   Con fracciones de centésima:      {report['sub_cent']} (redondeadas)")
+        print(f"   SUM(amount) float:                {report['float_sum']!r}")
+        print(f"   Suma exacta (unidades menores):   {report['exact_sum']!r}")
+        print(f"   Diferencia:                       {report['difference']!r}")
+        print(f"   Saldos distintos a las deudas:    {report['balance_drift']}")
+
+        if report['missing'] or report['mismatched'] or report['balance_drift']:
+            print("\n⚠️  Hay filas pendientes: ejecuta python migrate_money.py")
+        else:
+            print("\n✅ Todas las deudas tienen sus montos en unidades menores")
+
+        return report
+
+
+if __name__ == '__main__':
+    verify_only = '--verify' in sys.argv
+
+    print("=" * 60)
+    print("MIGRACIÓN: Montos en unidades menores")
+    print("=" * 60)
+    migrate_money(verify_only)
+    print("=" * 60)
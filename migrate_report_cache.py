@@ -0,0 +1,58 @@
+"""
+Script de migración para la caché de reportes PDF
+Agrega las columnas de versión de fila usadas para calcular la huella de los reportes:
+- debtor.updated_at y debt.updated_at (se inicializan con created_at)
+- export_job.fingerprint
+
+Ejecutar con: python migrate_report_cache.py
+Autor: Fernando Poblete
+"""
+
+from app import create_app
+from extensions import db
+from sqlalchemy import text
+
+# (tabla, columna, tipo SQL, valor inicial)
+COLUMNS = [
+    ('debtor', 'updated_at', 'TIMESTAMP', 'created_at'),
+    ('debt', 'updated_at', 'TIMESTAMP', 'created_at'),
+    ('export_job', 'fingerprint', 'VARCHAR(64)', None),
+]
+
+
+def migrate_report_cache():
+    """
+    Agrega las columnas que falten y completa updated_at en las filas existentes
+    """
+    app = create_app()
+
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+
+        for table, column, sql_type, initial in COLUMNS:
+            if not inspector.has_table(table):
+                continue
+
+            existing = {col['name'] for col in inspector.get_columns(table)}
+            if column in existing:
+                print(f"✅ La columna '{column}' ya existe en la tabla '{table}'")
+                continue
+
+            try:
+                print(f"🔄 Agregando columna '{column}' a la tabla '{table}'...")
+                db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {sql_type}'))
+                if initial:
+                    db.session.execute(text(f'UPDATE "{table}" SET {column} = {initial}'))
+                db.session.commit()
+                print(f"✅ Columna '{column}' agregada")
+            except Exception as e:
+                print(f"❌ Error durante la migración: {e}")
+                db.session.rollback()
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("MIGRACIÓN: Versiones de fila para la caché de reportes PDF")
+    print("=" * 60)
+    migrate_report_cache()
+    print("=" * 60)
@@ -1,13 +1,17 @@
 """
 CuentasClaras - Modelos de Base de Datos
-Definición de entidades: User, Debtor, Debt
+Definición de entidades: User, Debtor, DebtorBalance, Debt, DebtHistory, AttachmentBlob,
+Attachment, UploadSession, ExportJob
 Autor: Fernando Poblete
 """
 
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date
+from sqlalchemy import event
 from extensions import db
+from money import Money, to_minor, from_minor, installments_minor
+from currency import format_amount, format_number
 
 
 class User(UserMixin, db.Model):
@@ -61,46 +65,7 @@ class User(UserMixin, db.Model):
         Returns:
             str: Monto formateado con símbolo y separadores
         """
-        # Redondear a 2 decimales
-        amount = round(amount, 2)
-        
-        # Determinar si tiene decimales significativos
-        has_decimals = (amount % 1) != 0
-        
-        if self.currency == 'USD':
-            # Formato USD: $1.000 o $1.000,50 (punto para miles, coma para decimales)
-            if has_decimals:
-                formatted = f"{amount:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-                # Eliminar ceros innecesarios (ej: $1.000,50 OK, $1.000,00 -> $1.000)
-                if formatted.endswith(',00'):
-                    formatted = formatted[:-3]
-                elif formatted.endswith('0') and ',' in formatted:
-                    formatted = formatted.rstrip('0').rstrip(',')
-                return f"${formatted}"
-            else:
-                return f"${amount:,.0f}".replace(',', '.')
-        elif self.currency == 'BRL':
-            # Formato BRL: R$1.000 o R$1.000,50
-            if has_decimals:
-                formatted = f"{amount:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-                if formatted.endswith(',00'):
-                    formatted = formatted[:-3]
-                elif formatted.endswith('0') and ',' in formatted:
-                    formatted = formatted.rstrip('0').rstrip(',')
-                return f"R${formatted}"
-            else:
-                return f"R${amount:,.0f}".replace(',', '.')
-        else:
-            # Formato CLP: $1.000 (sin decimales si es entero, con decimales si es necesario)
-            if has_decimals:
-                formatted = f"{amount:,.2f}".replace(',', '.')
-                if formatted.endswith(',00'):
-                    formatted = formatted[:-3]
-                elif formatted.endswith('0') and ',' in formatted:
-                    formatted = formatted.rstrip('0').rstrip(',')
-                return f"${formatted}"
-            else:
-                return f"${amount:,.0f}".replace(',', '.')
+        return format_amount(amount, self.currency)
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -120,32 +85,68 @@ class Debtor(db.Model):
     phone = db.Column(db.String(20))
     email = db.Column(db.String(120))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Versión de la fila (caché de reportes)
     
     # Relaciones
     debts = db.relationship('Debt', backref='debtor', lazy=True, cascade='all, delete-orphan')
+    balance = db.relationship('DebtorBalance', backref='debtor', uselist=False, lazy=True,
+                              cascade='all, delete-orphan')
     
     def total_debt(self):
         """
         Calcula el total adeudado (deudas no pagadas)
+        Usa la capa de resúmenes para sumar en SQL sin cargar las deudas
         
         Returns:
             float: Suma de deudas pendientes
         """
-        return sum(debt.amount for debt in self.debts if not debt.paid)
+        from summary import debtor_totals
+        return debtor_totals(self.id)['owed']
     
     def total_paid(self):
         """
         Calcula el total pagado
+        Usa la capa de resúmenes para sumar en SQL sin cargar las deudas
         
         Returns:
             float: Suma de deudas pagadas
         """
-        return sum(debt.amount for debt in self.debts if debt.paid)
+        from summary import debtor_totals
+        return debtor_totals(self.id)['paid']
     
     def __repr__(self):
         return f'<Debtor {self.name}>'
 
 
+class DebtorBalance(db.Model):
+    """
+    Modelo de Saldo de Deudor
+    Registro desnormalizado con los totales de cada deudor
+    Se actualiza en la misma transacción que cada escritura sobre sus deudas
+    """
+    __tablename__ = 'debtor_balance'
+    
+    # Campos
+    debtor_id = db.Column(db.Integer, db.ForeignKey('debtor.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    # Saldos en unidades menores (Money): SUM() sobre debtor_balance es exacto (ver migrate_money.py)
+    total_amount = db.Column('total_amount_minor', Money, default=0, nullable=False)  # Suma de todas las deudas
+    amount_paid = db.Column('amount_paid_minor', Money, default=0, nullable=False)  # Suma de deudas pagadas
+    pending_amount = db.Column('pending_amount_minor', Money, default=0, nullable=False)  # Suma de deudas no pagadas
+    debt_count = db.Column(db.Integer, default=0, nullable=False)
+    open_debt_count = db.Column(db.Integer, default=0, nullable=False)
+    last_activity_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DebtorBalance Debtor {self.debtor_id}: {self.pending_amount}>'
+
+
+# Índices para ordenar y paginar deudores en SQL (dashboard)
+db.Index('ix_debtor_user_lower_name', Debtor.user_id, db.func.lower(Debtor.name), Debtor.id)
+db.Index('ix_debtor_balance_user_net', DebtorBalance.user_id,
+         DebtorBalance.pending_amount - DebtorBalance.amount_paid, DebtorBalance.debtor_id)
+
+
 class Debt(db.Model):
     """
     Modelo de Deuda
@@ -165,11 +166,18 @@ class Debt(db.Model):
     paid = db.Column(db.Boolean, default=False, index=True)
     notes = db.Column(db.Text)
     
-    # Archivos adjuntos (guardados como JSON string con lista de nombres)
-    debt_attachments = db.Column(db.Text)  # Comprobantes, PDFs de deuda, etc.
-    payment_attachments = db.Column(db.Text)  # Evidencias de pago
+    # Montos exactos en unidades menores (ver money.py), escritos junto a amount y partial_payment
+    # Las sumas en SQL usan estas columnas (summary._balance_columns)
+    amount_minor = db.Column(Money)
+    partial_payment_minor = db.Column(Money, default=0)
+    
+    # Archivos adjuntos antiguos (JSON string con lista de nombres); ya no se escriben,
+    # los adjuntos viven en la tabla attachment (ver migrate_attachments.py)
+    debt_attachments = db.Column(db.Text)
+    payment_attachments = db.Column(db.Text)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Versión de la fila (caché de reportes)
     
     def days_elapsed(self):
         """
@@ -199,9 +207,12 @@ class Debt(db.Model):
             float: Monto pendiente
         """
         if self.has_installments:
-            # Monto total pagado = cuotas completas + abono parcial
-            total_paid = (self.installments_paid * self.installment_amount()) + self.partial_payment
-            return self.amount - total_paid
+            # Monto total pagado = cuotas completas + abono parcial, en unidades menores
+            # (sin sumar cuotas redondeadas: al pagar todas las cuotas el restante es 0 exacto)
+            amount = to_minor(self.amount)
+            total_paid = installments_minor(amount, self.installments_paid, self.installments_total)
+            total_paid += to_minor(self.partial_payment or 0)
+            return from_minor(amount - total_paid)
         return self.amount if not self.paid else 0
     
     def get_debt_attachments(self):
@@ -209,39 +220,28 @@ class Debt(db.Model):
         Obtiene lista de archivos de deuda adjuntos
         
         Returns:
-            list: Lista de nombres de archivos
+            list: Adjuntos (Attachment) de tipo 'debt'
         """
-        if not self.debt_attachments:
-            return []
-        import json
-        try:
-            return json.loads(self.debt_attachments)
-        except:
-            return []
+        return [attachment for attachment in self.attachments if attachment.kind == 'debt']
     
     def get_payment_attachments(self):
         """
         Obtiene lista de archivos de evidencia de pago
         
         Returns:
-            list: Lista de nombres de archivos
+            list: Adjuntos (Attachment) de tipo 'payment'
         """
-        if not self.payment_attachments:
-            return []
-        import json
-        try:
-            return json.loads(self.payment_attachments)
-        except:
-            return []
+        return [attachment for attachment in self.attachments if attachment.kind == 'payment']
     
     def count_attachments(self):
         """
         Cuenta el total de archivos adjuntos
+        Usa attachment_count (cargado junto a la deuda en los listados, ver summary.iter_debtors_with_debts)
         
         Returns:
             int: Total de documentos adjuntos
         """
-        return len(self.get_debt_attachments()) + len(self.get_payment_attachments())
+        return self.attachment_count or 0
     
     def _format_amount(self, amount):
         """
@@ -254,28 +254,13 @@ class Debt(db.Model):
         Returns:
             str: Monto formateado sin símbolo de moneda
         """
-        amount = round(amount, 2)
-        
-        # Si es entero, no mostrar decimales
-        if amount % 1 == 0:
-            return f"{int(amount):,}".replace(',', '.')
-        
-        # Si tiene decimales, formatear con máximo 2 y eliminar ceros innecesarios
-        formatted = f"{amount:,.2f}".replace(',', '.')
-        # Eliminar ceros a la derecha después del punto decimal
-        if ',' in formatted or '.' in formatted[-3:]:
-            parts = formatted.split(',') if ',' in formatted else formatted.split('.')
-            if len(parts) == 2:
-                decimal_part = parts[1].rstrip('0')
-                if decimal_part:
-                    return f"{parts[0]},{decimal_part}"
-                return parts[0]
-        return formatted
+        return format_number(amount)
     
     def process_payment(self, payment_amount):
         """
         Procesa un abono a la deuda
         Si la deuda tiene cuotas, aplica el pago y completa cuotas automáticamente si es necesario
+        (cálculo en forma cerrada, ver payments.allocate_installments)
         
         Args:
             payment_amount (float): Monto del abono
@@ -283,79 +268,25 @@ class Debt(db.Model):
         Returns:
             dict: Información sobre el procesamiento (cuotas completadas, remanente, etc.)
         """
-        result = {
-            'installments_completed': 0,
-            'remaining_payment': 0,
-            'debt_completed': False,
-            'message': ''
-        }
-        
-        if not self.has_installments:
-            # Para deudas sin cuotas, se marca como pagada si el abono >= monto restante
-            remaining = self.amount
-            if payment_amount >= remaining:
-                self.paid = True
-                result['debt_completed'] = True
-                result['remaining_payment'] = payment_amount - remaining
-                if result['remaining_payment'] > 0:
-                    result['message'] = f'Deuda pagada completamente. Sobrante: {self._format_amount(result["remaining_payment"])}'
-                else:
-                    result['message'] = 'Deuda pagada completamente'
-            else:
-                result['message'] = f'Abono de {self._format_amount(payment_amount)} registrado. Aún queda {self._format_amount(remaining - payment_amount)} por pagar.'
-            return result
-        
-        # Para deudas con cuotas
-        installment_value = self.installment_amount()
-        available_payment = payment_amount
-        
-        # Primero, completar la cuota actual si hay abono parcial previo
-        if self.partial_payment > 0:
-            remaining_in_current = installment_value - self.partial_payment
-            if available_payment >= remaining_in_current:
-                # Completa la cuota actual
-                available_payment -= remaining_in_current
-                self.installments_paid += 1
-                self.partial_payment = 0
-                result['installments_completed'] += 1
-            else:
-                # Solo suma al abono parcial
-                self.partial_payment += available_payment
-                result['remaining_payment'] = self.partial_payment
-                result['message'] = f'Abono parcial agregado a cuota actual. Llevas {self._format_amount(self.partial_payment)} de {self._format_amount(installment_value)}'
-                return result
-        
-        # Completar cuotas completas con el dinero disponible
-        while available_payment >= installment_value and self.installments_paid < self.installments_total:
-            available_payment -= installment_value
-            self.installments_paid += 1
-            result['installments_completed'] += 1
-        
-        # Si sobra dinero y aún hay cuotas pendientes, guardar como abono parcial
-        if available_payment > 0 and self.installments_paid < self.installments_total:
-            self.partial_payment = available_payment
-            result['remaining_payment'] = available_payment
-        
-        # Verificar si se completó la deuda
-        if self.installments_paid >= self.installments_total:
-            self.paid = True
-            result['debt_completed'] = True
-            result['remaining_payment'] = available_payment
-        
-        # Mensaje resumen
-        if result['installments_completed'] > 0:
-            result['message'] = f"{result['installments_completed']} cuota(s) completada(s)."
-            if self.partial_payment > 0:
-                result['message'] += f" Abono parcial de {self._format_amount(self.partial_payment)} en siguiente cuota."
-            if result['debt_completed']:
-                result['message'] += " ¡Deuda pagada completamente!"
-        
-        return result
+        from payments import apply_payment
+        return apply_payment(self, payment_amount)
     
     def __repr__(self):
         return f'<Debt ${self.amount} - Debtor {self.debtor_id}>'
 
 
+@event.listens_for(Debt.amount, 'set')
+def _write_amount_minor(target, value, oldvalue, initiator):
+    """Escritura doble: cada cambio de amount se copia a amount_minor"""
+    target.amount_minor = value
+
+
+@event.listens_for(Debt.partial_payment, 'set')
+def _write_partial_payment_minor(target, value, oldvalue, initiator):
+    """Escritura doble: cada cambio de partial_payment se copia a partial_payment_minor"""
+    target.partial_payment_minor = value
+
+
 class DebtHistory(db.Model):
     """
     Modelo de Historial de Deudas
@@ -371,9 +302,179 @@ class DebtHistory(db.Model):
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
+    __table_args__ = (
+        # Historial del usuario ordenado por fecha (ver summary.history_page)
+        db.Index('ix_debt_history_user_created', 'user_id', 'created_at', 'id'),
+        # Línea de tiempo de una deuda (ver routes/debt.history)
+        db.Index('ix_debt_history_debt_created', 'debt_id', 'created_at', 'id'),
+    )
+    
     # Relaciones
     debt = db.relationship('Debt', backref=db.backref('history', lazy=True, cascade='all, delete-orphan', order_by='DebtHistory.created_at.desc()'))
     user = db.relationship('User', backref='debt_actions')
     
     def __repr__(self):
         return f'<DebtHistory {self.action_type} - Debt {self.debt_id}>'
+
+
+class AttachmentBlob(db.Model):
+    """
+    Modelo de Contenido de Adjunto
+    Bytes de un archivo adjunto guardados una sola vez, identificados por su SHA-256
+    ref_count cuenta los adjuntos que lo usan; en 0 se elimina el archivo (ver attachments.py)
+    """
+    __tablename__ = 'attachment_blob'
+    
+    # Campos
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AttachmentBlob {self.sha256[:12]} x{self.ref_count}>'
+
+
+class Attachment(db.Model):
+    """
+    Modelo de Adjunto
+    Asocia un archivo (por su contenido en attachment_blob) a una deuda
+    """
+    __tablename__ = 'attachment'
+    
+    # Campos
+    id = db.Column(db.Integer, primary_key=True)
+    debt_id = db.Column(db.Integer, db.ForeignKey('debt.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # debt, payment
+    filename = db.Column(db.String(255), nullable=False)  # Nombre guardado (tipo_fecha_nombre original)
+    sha256 = db.Column(db.String(64), db.ForeignKey('attachment_blob.sha256'), nullable=False, index=True)
+    size = db.Column(db.BigInteger)
+    mime = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Adjuntos de una deuda por tipo, en orden de subida (ficha del deudor y conteos)
+        db.Index('ix_attachment_debt_kind', 'debt_id', 'kind', 'id'),
+        # Autorización de descargas: deuda + nombre
+        db.Index('ix_attachment_debt_filename', 'debt_id', 'filename'),
+    )
+    
+    @property
+    def display_name(self):
+        """Nombre original del archivo (sin el prefijo tipo_fecha_hora_)"""
+        parts = self.filename.split('_', 3)
+        return parts[3] if len(parts) == 4 else self.filename
+    
+    def __repr__(self):
+        return f'<Attachment {self.filename} - Debt {self.debt_id}>'
+
+
+class UploadSession(db.Model):
+    """
+    Modelo de Subida por Partes
+    Archivo que el navegador envía en partes (ver uploads.py): received es el avance con el que
+    se reanuda una subida interrumpida y sha256 queda definido cuando llega la última parte
+    """
+    __tablename__ = 'upload_session'
+    
+    # Campos
+    id = db.Column(db.String(32), primary_key=True)  # Token aleatorio
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)  # Nombre original (secure_filename)
+    size = db.Column(db.BigInteger, nullable=False)  # Tamaño declarado al iniciar
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    sha256 = db.Column(db.String(64))  # Definido al completar
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    @property
+    def complete(self):
+        """La subida recibió todos sus bytes"""
+        return self.sha256 is not None
+    
+    def __repr__(self):
+        return f'<UploadSession {self.filename} {self.received}/{self.size}>'
+
+
+# Adjuntos de cada deuda (solo lectura: se escriben y eliminan con attachments.py)
+Debt.attachments = db.relationship('Attachment', lazy=True, viewonly=True, order_by=Attachment.id,
+                                   backref=db.backref('debt', viewonly=True))
+
+# Total de adjuntos de cada deuda como subconsulta; se carga bajo demanda o junto a la deuda
+# con .options(undefer(Debt.attachment_count)) para no hacer una consulta por deuda
+Debt.attachment_count = db.column_property(
+    db.select(db.func.count(Attachment.id)).where(Attachment.debt_id == Debt.id)
+    .correlate_except(Attachment).scalar_subquery(),
+    deferred=True
+)
+
+
+class ExportJob(db.Model):
+    """
+    Modelo de Trabajo de Exportación
+    Cola local (en la base de datos) de reportes PDF que se generan fuera del request
+    (el reporte por volúmenes se entrega como ZIP)
+    Estados: pending -> running -> done | failed
+    """
+    __tablename__ = 'export_job'
+    
+    # Campos
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # all_debtors, debtor, volumes
+    debtor_id = db.Column(db.Integer, db.ForeignKey('debtor.id', ondelete='SET NULL'))
+    volume_split = db.Column(db.String(10))  # volumes: 'debtors' o 'pages' (ver volume_export)
+    volume_size = db.Column(db.Integer)  # volumes: deudores o páginas por volumen (None: por defecto)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    download_name = db.Column(db.String(255), nullable=False)  # Nombre sugerido al descargar
+    fingerprint = db.Column(db.String(64))  # Huella de los datos del reporte (ver report_cache)
+    file_path = db.Column(db.String(500))  # Ruta del PDF generado
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        # Siguiente trabajo pendiente de la cola (ver export_jobs.claim_job)
+        db.Index('ix_export_job_status_created', 'status', 'created_at'),
+    )
+    
+    @property
+    def file_extension(self):
+        """Extensión del archivo generado: 'zip' para el reporte por volúmenes, 'pdf' para el resto"""
+        return 'zip' if self.kind == 'volumes' else 'pdf'
+    
+    @property
+    def mimetype(self):
+        """Tipo del archivo generado"""
+        return f'application/{self.file_extension}'
+    
+    def is_expired(self):
+        """
+        Verifica si el archivo generado ya expiró
+        
+        Returns:
+            bool: True si el trabajo tiene fecha de expiración y ya pasó
+        """
+        return self.expires_at is not None and self.expires_at <= datetime.utcnow()
+    
+    def to_dict(self):
+        """
+        Representación del estado del trabajo para las respuestas JSON
+        
+        Returns:
+            dict: id, kind, status, error y fechas en formato ISO
+        """
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.kind} - {self.status}>'
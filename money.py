@@ -0,0 +1,107 @@
+"""
+CuentasClaras - Montos en Unidades Menores
+Los montos se guardan como enteros en centésimas (MONEY_SCALE) para que las sumas en SQL
+sean exactas y los cálculos de cuotas no acumulen errores de punto flotante
+En Python se siguen leyendo y escribiendo en unidades mayores (pesos, dólares, reales)
+Autor: Fernando Poblete
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import BigInteger, case, func, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+# Unidades menores por unidad mayor
+# Es la misma escala para todas las monedas: un usuario puede cambiar de moneda sin
+# reescribir sus montos, y los pesos chilenos (sin decimales) quedan como múltiplos de 100
+MONEY_SCALE = 100
+
+
+def to_minor(amount):
+    """
+    Convierte un monto en unidades mayores a unidades menores (redondeo comercial)
+
+    Args:
+        amount (float|Decimal|int): Monto en unidades mayores
+
+    Returns:
+        int: Monto en unidades menores (None si amount es None)
+    """
+    if amount is None:
+        return None
+    # str() evita arrastrar el error binario del float (1.005 -> 1.005, no 1.00499...)
+    value = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+    return int((value * MONEY_SCALE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor):
+    """
+    Convierte un monto en unidades menores a unidades mayores
+
+    Args:
+        minor (int): Monto en unidades menores
+
+    Returns:
+        float: Monto en unidades mayores (None si minor es None)
+    """
+    if minor is None:
+        return None
+    return float(Decimal(int(minor)) / MONEY_SCALE)
+
+
+def installments_minor(amount_minor, installments_paid, installments_total):
+    """
+    Parte de un monto cubierta por un número de cuotas, en unidades menores
+    Se calcula de una vez sobre el total (no sumando cuotas redondeadas),
+    así al completar todas las cuotas el resultado es exactamente el monto
+
+    Args:
+        amount_minor (int): Monto total en unidades menores
+        installments_paid (int): Cuotas pagadas
+        installments_total (int): Cuotas totales
+
+    Returns:
+        int: Monto cubierto por las cuotas pagadas
+    """
+    if not installments_total or installments_total <= 0:
+        return 0
+    # Redondeo al entero más cercano con aritmética entera
+    return (2 * amount_minor * installments_paid + installments_total) // (2 * installments_total)
+
+
+class Money(TypeDecorator):
+    """
+    Monto guardado como entero en unidades menores (BIGINT)
+    Se asigna y se lee en unidades mayores; SUM() sobre la columna es exacto
+    y su resultado se convierte igual que la columna
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return to_minor(value)
+
+    def process_result_value(self, value, dialect):
+        return from_minor(value)
+
+
+def money_sum(minor_column, legacy_column=None, condition=None):
+    """
+    Expresión SQL con la suma exacta de una columna Money
+    Mientras la migración (migrate_money.py) no termina, las filas sin unidades menores
+    se suman desde la columna float anterior, redondeada a unidades menores
+
+    Args:
+        minor_column: Columna Money (unidades menores)
+        legacy_column: Columna float equivalente (None si la columna no tiene versión float,
+            como los saldos de debtor_balance)
+        condition: Condición para sumar solo algunas filas (opcional)
+
+    Returns:
+        Expresión SQL de tipo Money (el resultado se lee en unidades mayores)
+    """
+    value = minor_column
+    if legacy_column is not None:
+        value = func.coalesce(minor_column, func.round(legacy_column * MONEY_SCALE))
+    if condition is not None:
+        value = case((condition, value), else_=0)
+    return type_coerce(func.coalesce(func.sum(value), 0), Money)
@@ -0,0 +1,223 @@
+"""
+CuentasClaras - Aplicación de Abonos
+Reparte un abono entre las cuotas de una deuda en forma cerrada (sin recorrer cuota por cuota):
+con los montos en unidades menores, las cuotas cubiertas salen de una sola división entera
+Incluye la aplicación por lotes de abonos ordenados sobre muchas deudas, en una transacción
+y con el historial escrito en un solo INSERT
+Autor: Fernando Poblete
+"""
+
+import math
+from datetime import datetime
+from sqlalchemy import insert
+from extensions import db
+from money import to_minor, from_minor, installments_minor
+from currency import format_amount, format_number
+
+
+def allocate_installments(amount_minor, installments_total, installments_paid, partial_minor, payment_minor):
+    """
+    Calcula el efecto de un abono sobre una deuda en cuotas
+
+    El monto cubierto por k cuotas es installments_minor(amount, k, total), es decir
+    (2·amount·k + total) // (2·total). El mayor k cuyo monto cubierto no supera lo pagado
+    (cuotas pagadas + abono parcial + abono nuevo) se despeja directamente de esa fórmula
+
+    Args:
+        amount_minor (int): Monto de la deuda en unidades menores
+        installments_total (int): Cuotas totales
+        installments_paid (int): Cuotas pagadas antes del abono
+        partial_minor (int): Abono parcial previo en la cuota actual, en unidades menores
+        payment_minor (int): Abono en unidades menores
+
+    Returns:
+        dict: installments_paid, installments_completed, partial_minor (abono parcial que queda
+        en la cuota siguiente), overflow_minor (sobrante al completar la deuda) y debt_completed
+    """
+    if not installments_total or installments_total <= 0:
+        return {
+            'installments_paid': installments_paid,
+            'installments_completed': 0,
+            'partial_minor': 0,
+            'overflow_minor': payment_minor,
+            'debt_completed': True
+        }
+
+    covered = installments_minor(amount_minor, installments_paid, installments_total)
+    paid_total = covered + partial_minor + payment_minor
+
+    if amount_minor > 0:
+        # Mayor k con (2·amount·k + total) // (2·total) <= paid_total
+        total = installments_total
+        reached = (2 * total * (paid_total + 1) - total - 1) // (2 * amount_minor)
+    else:
+        reached = installments_total
+    reached = max(installments_paid, min(reached, installments_total))
+
+    debt_completed = reached >= installments_total
+    leftover = paid_total - installments_minor(amount_minor, reached, installments_total)
+
+    return {
+        'installments_paid': reached,
+        'installments_completed': reached - installments_paid,
+        'partial_minor': 0 if debt_completed else leftover,
+        'overflow_minor': leftover if debt_completed else 0,
+        'debt_completed': debt_completed
+    }
+
+
+def apply_payment(debt, payment_amount):
+    """
+    Aplica un abono a una deuda (ver Debt.process_payment)
+    Si la deuda tiene cuotas, completa las cuotas cubiertas y guarda el resto como abono parcial
+
+    Args:
+        debt (Debt): Deuda a modificar (no se hace commit)
+        payment_amount (float): Monto del abono
+
+    Returns:
+        dict: installments_completed, remaining_payment, debt_completed y message
+    """
+    result = {
+        'installments_completed': 0,
+        'remaining_payment': 0,
+        'debt_completed': False,
+        'message': ''
+    }
+
+    if not debt.has_installments:
+        # Para deudas sin cuotas, se marca como pagada si el abono >= monto restante
+        remaining = debt.amount
+        if payment_amount >= remaining:
+            debt.paid = True
+            result['debt_completed'] = True
+            result['remaining_payment'] = payment_amount - remaining
+            if result['remaining_payment'] > 0:
+                result['message'] = f'Deuda pagada completamente. Sobrante: {format_number(result["remaining_payment"])}'
+            else:
+                result['message'] = 'Deuda pagada completamente'
+        else:
+            result['message'] = f'Abono de {format_number(payment_amount)} registrado. Aún queda {format_number(remaining - payment_amount)} por pagar.'
+        return result
+
+    # Para deudas con cuotas
+    amount_minor = to_minor(debt.amount)
+    allocation = allocate_installments(
+        amount_minor, debt.installments_total, debt.installments_paid,
+        to_minor(debt.partial_payment or 0), to_minor(payment_amount)
+    )
+
+    debt.installments_paid = allocation['installments_paid']
+    debt.partial_payment = from_minor(allocation['partial_minor'])
+    result['installments_completed'] = allocation['installments_completed']
+
+    if allocation['debt_completed']:
+        debt.paid = True
+        result['debt_completed'] = True
+        result['remaining_payment'] = from_minor(allocation['overflow_minor'])
+    else:
+        result['remaining_payment'] = debt.partial_payment
+
+    # Mensaje resumen
+    if result['installments_completed'] > 0:
+        result['message'] = f"{result['installments_completed']} cuota(s) completada(s)."
+        if debt.partial_payment > 0:
+            result['message'] += f" Abono parcial de {format_number(debt.partial_payment)} en siguiente cuota."
+        if result['debt_completed']:
+            result['message'] += " ¡Deuda pagada completamente!"
+    elif not result['debt_completed']:
+        # Valor de la cuota actual (las cuotas pueden diferir en una unidad menor por redondeo)
+        installment_value = from_minor(
+            installments_minor(amount_minor, debt.installments_paid + 1, debt.installments_total)
+            - installments_minor(amount_minor, debt.installments_paid, debt.installments_total)
+        )
+        result['message'] = f'Abono parcial agregado a cuota actual. Llevas {format_number(debt.partial_payment)} de {format_number(installment_value)}'
+
+    return result
+
+
+def payment_history_entry(result, payment_amount, currency):
+    """
+    Tipo de acción y descripción del historial para un abono aplicado
+
+    Args:
+        result (dict): Resultado de apply_payment
+        payment_amount (float): Monto del abono
+        currency (str): Moneda del usuario
+
+    Returns:
+        tuple: (action_type, description)
+    """
+    amount_text = format_amount(payment_amount, currency)
+    if result['debt_completed']:
+        return 'marked_paid', f'Deuda pagada con abono de {amount_text}. {result["message"]}'
+    if result['installments_completed'] > 0:
+        return 'installment_paid', f'Abono de {amount_text}. {result["message"]}'
+    return 'payment_added', f'Abono parcial de {amount_text}. {result["message"]}'
+
+
+def apply_payments(user, payments):
+    """
+    Aplica una lista ordenada de abonos sobre deudas del usuario en una sola transacción
+    Las deudas se cargan en una consulta, los abonos se aplican en orden (varios abonos a la
+    misma deuda se acumulan), el historial se escribe en un solo INSERT y los saldos de los
+    deudores afectados se recalculan una vez. El commit queda a cargo de quien llama
+
+    Args:
+        user (User): Dueño de las deudas (moneda de los mensajes y autor del historial)
+        payments (list): Pares (debt_id, monto) en el orden en que se aplican
+
+    Returns:
+        list: Un dict por abono, en el mismo orden: debt_id, amount y el resultado de
+        Debt.process_payment, o 'error' si el abono no se pudo aplicar
+    """
+    from models import Debt, Debtor, DebtHistory
+    from summary import refresh_debtor_balance
+
+    debt_ids = {debt_id for debt_id, _ in payments}
+    debts = {
+        debt.id: debt
+        for debt in Debt.query.join(Debtor).filter(
+            Debt.id.in_(debt_ids), Debtor.user_id == user.id
+        )
+    } if debt_ids else {}
+
+    now = datetime.utcnow()
+    results, history_rows, debtor_ids = [], [], set()
+
+    for debt_id, amount in payments:
+        entry = {'debt_id': debt_id, 'amount': amount}
+        results.append(entry)
+
+        debt = debts.get(debt_id)
+        if debt is None:
+            entry['error'] = 'Deuda no encontrada'
+            continue
+        if debt.paid:
+            entry['error'] = 'Esta deuda ya está pagada'
+            continue
+        if not amount or not math.isfinite(amount) or amount <= 0:
+            entry['error'] = 'Monto inválido'
+            continue
+
+        result = debt.process_payment(amount)
+        entry.update(result)
+
+        action_type, description = payment_history_entry(result, amount, user.currency)
+        history_rows.append({
+            'debt_id': debt.id,
+            'user_id': user.id,
+            'action_type': action_type,
+            'description': description,
+            'created_at': now
+        })
+        debtor_ids.add(debt.debtor_id)
+
+    if history_rows:
+        db.session.flush()
+        db.session.execute(insert(DebtHistory), history_rows)
+
+    for debtor_id in sorted(debtor_ids):
+        refresh_debtor_balance(debtor_id)
+
+    return results
@@ -13,6 +13,14 @@ from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from reportlab.pdfgen import canvas
 from io import BytesIO
 from datetime import datetime
+from functools import partial
+from itertools import chain
+from money import to_minor, from_minor
+from currency import format_amount, format_many
+
+# Versión del diseño de los reportes; incrementarla al cambiar su contenido o formato
+# invalida los PDFs guardados en la caché de reportes (ver report_cache.py)
+PDF_TEMPLATE_VERSION = 1
 
 
 def format_date_pdf(date_obj):
@@ -53,10 +61,11 @@ class NumberedCanvas(canvas.Canvas):
     Canvas personalizado que agrega número de página, fecha/hora y marca de agua
     en cada página del PDF para prevenir falsificaciones
     """
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, export_timestamp=None, **kwargs):
         canvas.Canvas.__init__(self, *args, **kwargs)
         self.pages = []
-        self.export_timestamp = format_datetime_pdf(datetime.now())
+        # Los fragmentos de un reporte en paralelo comparten el mismo timestamp
+        self.export_timestamp = export_timestamp or format_datetime_pdf(datetime.now())
     
     def showPage(self):
         self.pages.append(dict(self.__dict__))
@@ -77,25 +86,36 @@ class NumberedCanvas(canvas.Canvas):
         - Número de página en footer
         - Marca de agua diagonal en el centro
         """
+        self.draw_timestamp()
+        self.draw_page_number(page_num, page_count)
+        self.draw_watermark()
+    
+    def draw_timestamp(self):
+        """Timestamp en esquina superior derecha (pequeño y discreto)"""
         page_width, page_height = letter
         
-        # Timestamp en esquina superior derecha (pequeño y discreto)
         self.saveState()
         self.setFont('Helvetica', 7)
         self.setFillColor(colors.HexColor('#6b7280'))
         self.drawRightString(page_width - 0.5*inch, page_height - 0.4*inch, 
                             f"Exportado: {self.export_timestamp}")
         self.restoreState()
+    
+    def draw_page_number(self, page_num, page_count):
+        """Número de página en footer"""
+        page_width, page_height = letter
         
-        # Número de página en footer
         self.saveState()
         self.setFont('Helvetica', 9)
         self.setFillColor(colors.HexColor('#9ca3af'))
         self.drawCentredString(page_width / 2, 0.5*inch, 
                               f"Página {page_num} de {page_count}")
         self.restoreState()
+    
+    def draw_watermark(self):
+        """Marca de agua diagonal (muy sutil pero presente)"""
+        page_width, page_height = letter
         
-        # Marca de agua diagonal (muy sutil pero presente)
         self.saveState()
         self.translate(page_width / 2, page_height / 2)
         self.rotate(45)
@@ -107,9 +127,103 @@ class NumberedCanvas(canvas.Canvas):
         self.restoreState()
 
 
+class LowMemoryNumberedCanvas(NumberedCanvas):
+    """
+    Variante de NumberedCanvas que no guarda el estado de cada página
+    Cada página se entrega de inmediato al documento y el footer "Página X de Y" se
+    dibuja como un form XObject por página que se define al final, cuando ya se
+    conoce el total (el PDF permite referenciar un form antes de definirlo)
+    El resultado visual es idéntico: timestamp, footer y marca de agua en el mismo orden
+    """
+    def showPage(self):
+        page_num = self.getPageNumber()
+        self.draw_timestamp()
+        self.doForm(self._footer_name(page_num))
+        self.draw_watermark()
+        canvas.Canvas.showPage(self)
+    
+    def save(self):
+        page_count = self.getPageNumber() - 1
+        for page_num in range(1, page_count + 1):
+            self.beginForm(self._footer_name(page_num))
+            self.draw_page_number(page_num, page_count)
+            self.endForm()
+        canvas.Canvas.save(self)
+    
+    @staticmethod
+    def _footer_name(page_num):
+        """Nombre del form XObject con el footer de una página"""
+        return f"footer_{page_num}"
+
+
+class UnnumberedCanvas(NumberedCanvas):
+    """
+    Variante de NumberedCanvas sin número de página, para los fragmentos de un reporte
+    generado en paralelo: el total solo se conoce al unirlos (ver merge_report_shards)
+    """
+    def showPage(self):
+        self.draw_timestamp()
+        self.draw_watermark()
+        canvas.Canvas.showPage(self)
+    
+    def save(self):
+        canvas.Canvas.save(self)
+
+
+class LazyFlowables:
+    """
+    Lista perezosa de flowables para doc.build()
+    ReportLab consume la lista desde el frente (flowables[0], del flowables[0]) y solo
+    reinserta al inicio los fragmentos divididos, por lo que basta mantener en memoria
+    unos pocos elementos leídos desde un iterador
+    """
+    def __init__(self, iterable, lookahead=2):
+        self._iterator = iter(iterable)
+        self._buffer = []
+        self._lookahead = lookahead
+        self._exhausted = False
+    
+    def _fill(self, size=None):
+        """Lee del iterador hasta tener size elementos en el buffer (None: todos)"""
+        while not self._exhausted and (size is None or len(self._buffer) < size):
+            try:
+                self._buffer.append(next(self._iterator))
+            except StopIteration:
+                self._exhausted = True
+    
+    def _fill_for(self, index):
+        """Asegura que el índice o slice solicitado esté en el buffer"""
+        if isinstance(index, slice):
+            stop = index.stop
+            self._fill(stop if stop is not None and stop >= 0 else None)
+        else:
+            self._fill(index + 1 if index >= 0 else None)
+    
+    def __len__(self):
+        # Solo se conoce la parte leída; el lookahead permite evaluar keepWithNext
+        self._fill(self._lookahead)
+        return len(self._buffer)
+    
+    def __getitem__(self, index):
+        self._fill_for(index)
+        return self._buffer[index]
+    
+    def __setitem__(self, index, value):
+        self._fill_for(index)
+        self._buffer[index] = value
+    
+    def __delitem__(self, index):
+        self._fill_for(index)
+        del self._buffer[index]
+    
+    def insert(self, index, value):
+        self._buffer.insert(index, value)
+
+
 def format_currency_for_pdf(amount, currency):
     """
     Formatea un monto según la moneda del usuario para mostrar en PDF
+    Usa las mismas reglas que la web (ver currency.py)
     
     Args:
         amount (float): Monto a formatear
@@ -118,25 +232,7 @@ def format_currency_for_pdf(amount, currency):
     Returns:
         str: Monto formateado con símbolo de moneda
     """
-    # Redondear a 2 decimales
-    amount = round(amount, 2)
-    
-    # Separar parte entera y decimal
-    integer_part = int(amount)
-    decimal_part = int((amount - integer_part) * 100)
-    
-    # Formatear parte entera con separador de miles
-    formatted_integer = "{:,}".format(integer_part).replace(",", ".")
-    
-    # Formato según moneda
-    if currency == 'CLP':
-        return f"${formatted_integer}"
-    elif currency == 'USD':
-        return f"${formatted_integer},{decimal_part:02d}"
-    elif currency == 'BRL':
-        return f"R${formatted_integer},{decimal_part:02d}"
-    else:
-        return f"${formatted_integer},{decimal_part:02d}"
+    return format_amount(amount, currency)
 
 
 def generate_debtor_pdf(debtor, debts, current_user):
@@ -233,7 +329,10 @@ def generate_debtor_pdf(debtor, debts, current_user):
     total_debt = 0
     total_paid = 0
     
-    for debt in debts:
+    # Columna de montos formateada de una vez
+    amount_texts = format_many([debt.amount for debt in debts], current_user.currency)
+    
+    for debt, amount_text in zip(debts, amount_texts):
         # Calcular valores
         days = debt.days_elapsed()
         installment_text = '-'
@@ -250,16 +349,16 @@ def generate_debtor_pdf(debtor, debts, current_user):
         if debt.paid:
             paid_amount = debt.amount
         elif debt.has_installments:
-            paid_amount = (debt.amount / debt.installments_total) * debt.installments_paid + debt.partial_payment
+            paid_amount = debt.amount - debt.remaining_amount()
         else:
             paid_amount = 0
         
-        total_debt += debt.amount
-        total_paid += paid_amount
+        total_debt += to_minor(debt.amount)
+        total_paid += to_minor(paid_amount)
         
         # Agregar fila
         debts_data.append([
-            format_currency_for_pdf(debt.amount, current_user.currency),
+            amount_text,
             format_date_pdf(debt.initial_date),
             str(days),
             installment_text,
@@ -300,8 +399,9 @@ def generate_debtor_pdf(debtor, debts, current_user):
     elements.append(KeepTogether(debts_section))
     elements.append(Spacer(1, 0.3*inch))
     
-    # Totales
-    pending = total_debt - total_paid
+    # Totales (acumulados en unidades menores)
+    pending = from_minor(total_debt - total_paid)
+    total_debt, total_paid = from_minor(total_debt), from_minor(total_paid)
     
     totals_section = []
     totals_data = [
@@ -354,24 +454,275 @@ def generate_debtor_pdf(debtor, debts, current_user):
     return buffer
 
 
-def generate_all_debtors_pdf(debtors, current_user):
+def generate_all_debtors_pdf(current_user):
     """
     Genera un PDF con el reporte completo de todos los deudores
+    Deudores y deudas se leen por lotes en una sola consulta y las secciones se
+    entregan a ReportLab a medida que se dibujan, así la memoria no crece con el
+    número de deudas
     
     Args:
-        debtors: Lista de objetos Debtor con sus deudas
-        current_user: Usuario actual para obtener formato de moneda
+        current_user: Usuario dueño de los deudores (id y formato de moneda)
     
     Returns:
         BytesIO: Buffer con el PDF generado
     """
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
+    
+    # Generar PDF con canvas personalizado; las secciones por deudor se generan bajo demanda
+    doc.build(LazyFlowables(all_debtors_flowables(current_user, datetime.now())),
+              canvasmaker=LowMemoryNumberedCanvas)
+    buffer.seek(0)
+    
+    return buffer
+
+
+def generate_all_debtors_shard(current_user, now, first_id, last_id, include_header, include_closing):
+    """
+    Genera un fragmento del reporte general (deudores con ID entre first_id y last_id)
+    sin números de página, para generarlos en paralelo y unirlos con merge_report_shards
+    
+    Args:
+        current_user: Usuario dueño de los deudores
+        now (datetime): Momento de exportación compartido por todos los fragmentos
+        first_id (int): Primer ID de deudor del fragmento
+        last_id (int): Último ID de deudor del fragmento
+        include_header (bool): Incluir título y resumen general (primer fragmento)
+        include_closing (bool): Incluir nota de autenticidad (último fragmento)
+    
+    Returns:
+        bytes: PDF del fragmento
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    
+    flowables = all_debtors_flowables(current_user, now, first_id, last_id, include_header, include_closing)
+    doc.build(LazyFlowables(flowables),
+              canvasmaker=partial(UnnumberedCanvas, export_timestamp=format_datetime_pdf(now)))
+    
+    return buffer.getvalue()
+
+
+def merge_report_shards(shards):
+    """
+    Une los fragmentos del reporte general en un solo PDF y agrega el footer
+    "Página X de Y" con la numeración global sobre cada página
+    
+    Args:
+        shards (list): PDFs de los fragmentos (bytes) en orden
+    
+    Returns:
+        BytesIO: Buffer con el PDF completo
+    """
+    from pypdf import PdfReader, PdfWriter
+    
+    writer = PdfWriter()
+    for shard in shards:
+        writer.append(PdfReader(BytesIO(shard)))
+    
+    # Footer de cada página dibujado igual que en NumberedCanvas, en un PDF superpuesto
+    page_count = len(writer.pages)
+    overlay_buffer = BytesIO()
+    overlay = canvas.Canvas(overlay_buffer, pagesize=letter)
+    for page_num in range(1, page_count + 1):
+        NumberedCanvas.draw_page_number(overlay, page_num, page_count)
+        overlay.showPage()
+    overlay.save()
+    
+    for page, footer in zip(writer.pages, PdfReader(overlay_buffer).pages):
+        page.merge_page(footer)
+        page.compress_content_streams()
+    
+    # Fuentes y recursos repetidos en cada fragmento se guardan una sola vez
+    writer.compress_identical_objects()
+    
+    buffer = BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    
+    return buffer
+
+
+def generate_all_debtors_volume(current_user, now, volume, volume_count):
+    """
+    Genera un volumen del reporte general (un rango consecutivo de deudores)
+    Cada volumen es un PDF independiente con su propia numeración de páginas
+    
+    Args:
+        current_user: Usuario dueño de los deudores
+        now (datetime): Momento de exportación compartido por todos los volúmenes
+        volume (dict): Volumen de summary.report_volumes
+        volume_count (int): Total de volúmenes de la exportación
+    
+    Returns:
+        BytesIO: Buffer con el PDF del volumen
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = getSampleStyleSheet()
+    
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#1f2937'),
+        spaceAfter=12,
+        alignment=TA_CENTER
+    )
+    
+    volume_info_style = ParagraphStyle(
+        'VolumeInfo',
+        parent=styles['Normal'],
+        fontSize=11,
+        textColor=colors.HexColor('#374151'),
+        alignment=TA_CENTER,
+        spaceAfter=6
+    )
+    
+    export_info_style = ParagraphStyle(
+        'ExportInfo',
+        parent=styles['Normal'],
+        fontSize=9,
+        textColor=colors.HexColor('#6b7280'),
+        alignment=TA_CENTER,
+        spaceAfter=20
+    )
+    
+    export_datetime = f"{now.day}/{now.month}/{now.year} a las {now.hour}:{now.minute:02d}:{now.second:02d}"
+    header = [
+        Paragraph("CuentasClaras - Reporte General", title_style),
+        Paragraph(f"Volumen {volume['number']} de {volume_count}", volume_info_style),
+        Paragraph(f"Deudores: {volume['first_name']} — {volume['last_name']} ({volume['debtor_count']})",
+                  volume_info_style),
+        Paragraph(f"Documento exportado el {export_datetime}", export_info_style),
+        Spacer(1, 0.2*inch)
+    ]
+    
+    flowables = all_debtors_flowables(current_user, now, volume['first_id'], volume['last_id'],
+                                      include_header=False)
+    doc.build(LazyFlowables(chain(header, flowables)),
+              canvasmaker=partial(LowMemoryNumberedCanvas, export_timestamp=format_datetime_pdf(now)))
+    buffer.seek(0)
+    
+    return buffer
+
+
+def generate_volume_index_pdf(current_user, volumes, now):
+    """
+    Genera la página índice de una exportación por volúmenes:
+    rango de deudores y totales de cada volumen, y los totales generales
+    
+    Args:
+        current_user: Usuario dueño de los deudores
+        volumes (list): Volúmenes de summary.report_volumes
+        now (datetime): Momento de exportación
+    
+    Returns:
+        BytesIO: Buffer con el PDF del índice
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
     elements = []
     styles = getSampleStyleSheet()
+    currency = current_user.currency
     
-    # Obtener timestamp de exportación
-    now = datetime.now()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#1f2937'),
+        spaceAfter=30,
+        alignment=TA_CENTER
+    )
+    
+    export_info_style = ParagraphStyle(
+        'ExportInfo',
+        parent=styles['Normal'],
+        fontSize=9,
+        textColor=colors.HexColor('#6b7280'),
+        alignment=TA_CENTER,
+        spaceAfter=20
+    )
+    
+    cell_style = ParagraphStyle(
+        'IndexCell',
+        parent=styles['Normal'],
+        fontSize=8,
+        leading=10
+    )
+    
+    export_datetime = f"{now.day}/{now.month}/{now.year} a las {now.hour}:{now.minute:02d}:{now.second:02d}"
+    elements.append(Paragraph("CuentasClaras - Índice de Volúmenes", title_style))
+    elements.append(Paragraph(f"Documento exportado el {export_datetime}", export_info_style))
+    
+    index_data = [['Volumen', 'Deudores', 'Cant.', 'Deudas', 'Adeudado', 'Pagado', 'Pendiente']]
+    for volume in volumes:
+        index_data.append([
+            str(volume['number']),
+            Paragraph(f"{volume['first_name']} — {volume['last_name']}", cell_style),
+            str(volume['debtor_count']),
+            str(volume['debt_count']),
+            format_currency_for_pdf(volume['total_owed'], currency),
+            format_currency_for_pdf(volume['total_paid'], currency),
+            format_currency_for_pdf(volume['total_pending'], currency)
+        ])
+    
+    # Fila de totales generales
+    index_data.append([
+        'Total',
+        '',
+        str(sum(volume['debtor_count'] for volume in volumes)),
+        str(sum(volume['debt_count'] for volume in volumes)),
+        format_currency_for_pdf(sum(volume['total_owed'] for volume in volumes), currency),
+        format_currency_for_pdf(sum(volume['total_paid'] for volume in volumes), currency),
+        format_currency_for_pdf(sum(volume['total_pending'] for volume in volumes), currency)
+    ])
+    
+    index_table = Table(index_data, repeatRows=1,
+                        colWidths=[0.6*inch, 2.2*inch, 0.5*inch, 0.6*inch, 1*inch, 1*inch, 1*inch])
+    index_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6b7280')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#f9fafb')]),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#e5e7eb')),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ('TOPPADDING', (0, 0), (-1, -1), 5),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db'))
+    ]))
+    elements.append(index_table)
+    
+    doc.build(elements, canvasmaker=partial(NumberedCanvas, export_timestamp=format_datetime_pdf(now)))
+    buffer.seek(0)
+    
+    return buffer
+
+
+def all_debtors_flowables(current_user, now, first_id=None, last_id=None,
+                          include_header=True, include_closing=True):
+    """
+    Genera en orden los elementos del reporte general
+    
+    Args:
+        current_user: Usuario dueño de los deudores
+        now (datetime): Momento de exportación
+        first_id (int): Primer ID de deudor a incluir (None: desde el primero)
+        last_id (int): Último ID de deudor a incluir (None: hasta el último)
+        include_header (bool): Incluir título, resumen general y encabezado del detalle
+        include_closing (bool): Incluir la nota de autenticidad final
+    
+    Yields:
+        Flowable: Elementos del reporte
+    """
+    elements = []
+    styles = getSampleStyleSheet()
+    
+    # Timestamp de exportación
     export_datetime = f"{now.day}/{now.month}/{now.year} a las {now.hour}:{now.minute:02d}:{now.second:02d}"
     
     # Estilos personalizados
@@ -402,89 +753,120 @@ def generate_all_debtors_pdf(debtors, current_user):
         spaceBefore=8
     )
     
-    # Título del documento
-    title = Paragraph("CuentasClaras - Reporte General", title_style)
-    elements.append(title)
-    
-    # Timestamp de exportación prominente
-    export_info_style = ParagraphStyle(
-        'ExportInfo',
+    if include_header:
+        # Título del documento
+        title = Paragraph("CuentasClaras - Reporte General", title_style)
+        elements.append(title)
+        
+        # Timestamp de exportación prominente
+        export_info_style = ParagraphStyle(
+            'ExportInfo',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=colors.HexColor('#6b7280'),
+            alignment=TA_CENTER,
+            spaceAfter=20
+        )
+        export_info = Paragraph(f"Documento exportado el {export_datetime}", export_info_style)
+        elements.append(export_info)
+        elements.append(Spacer(1, 0.3*inch))
+        
+        # Calcular totales generales desde los saldos desnormalizados
+        from summary import user_totals
+        totals = user_totals(current_user.id)
+        grand_total_debt = totals['total_owed']
+        grand_total_paid = totals['total_paid']
+        active_debtors = totals['active_debtors']
+        
+        # Resumen general
+        summary_section = []
+        summary_heading = Paragraph("Resumen General", heading_style)
+        summary_section.append(summary_heading)
+        summary_section.append(Spacer(1, 0.1*inch))
+        
+        summary_data = [
+            ['Total Deudores:', str(totals['debtor_count'])],
+            ['Deudores Activos:', str(active_debtors)],
+            ['Total Adeudado:', format_currency_for_pdf(grand_total_debt, current_user.currency)],
+            ['Total Pagado:', format_currency_for_pdf(grand_total_paid, current_user.currency)],
+            ['Total Pendiente:', format_currency_for_pdf(grand_total_debt - grand_total_paid, current_user.currency)]
+        ]
+        
+        summary_table = Table(summary_data, colWidths=[2.5*inch, 2.5*inch])
+        summary_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
+            ('BACKGROUND', (0, 4), (-1, 4), colors.HexColor('#3b82f6')),
+            ('TEXTCOLOR', (0, 0), (-1, 3), colors.HexColor('#1f2937')),
+            ('TEXTCOLOR', (0, 4), (-1, 4), colors.whitesmoke),
+            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
+        ]))
+        
+        summary_section.append(summary_table)
+        
+        # Mantener resumen junto
+        elements.append(KeepTogether(summary_section))
+        elements.append(Spacer(1, 0.3*inch))
+        
+        # Detalle por deudor
+        detail_heading = Paragraph("Detalle por Deudor", heading_style)
+        elements.append(detail_heading)
+        elements.append(Spacer(1, 0.1*inch))
+        
+    # Nota de autenticidad al final
+    authenticity_style = ParagraphStyle(
+        'Authenticity',
         parent=styles['Normal'],
-        fontSize=9,
-        textColor=colors.HexColor('#6b7280'),
+        fontSize=8,
+        textColor=colors.HexColor('#9ca3af'),
         alignment=TA_CENTER,
-        spaceAfter=20
+        leading=10
+    )
+    authenticity_note = Paragraph(
+        f"Este documento fue generado electrónicamente por CuentasClaras el {export_datetime}.<br/>"
+        f"Cualquier modificación posterior invalida su autenticidad.",
+        authenticity_style
     )
-    export_info = Paragraph(f"Documento exportado el {export_datetime}", export_info_style)
-    elements.append(export_info)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Calcular totales generales
-    grand_total_debt = 0
-    grand_total_paid = 0
-    active_debtors = 0
-    
-    for debtor in debtors:
-        debtor_total = debtor.total_debt()
-        debtor_paid = debtor.total_paid()
-        
-        grand_total_debt += debtor_total
-        grand_total_paid += debtor_paid
-        
-        if debtor_total > debtor_paid:
-            active_debtors += 1
-    
-    # Resumen general
-    summary_section = []
-    summary_heading = Paragraph("Resumen General", heading_style)
-    summary_section.append(summary_heading)
-    summary_section.append(Spacer(1, 0.1*inch))
-    
-    summary_data = [
-        ['Total Deudores:', str(len(debtors))],
-        ['Deudores Activos:', str(active_debtors)],
-        ['Total Adeudado:', format_currency_for_pdf(grand_total_debt, current_user.currency)],
-        ['Total Pagado:', format_currency_for_pdf(grand_total_paid, current_user.currency)],
-        ['Total Pendiente:', format_currency_for_pdf(grand_total_debt - grand_total_paid, current_user.currency)]
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[2.5*inch, 2.5*inch])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
-        ('BACKGROUND', (0, 4), (-1, 4), colors.HexColor('#3b82f6')),
-        ('TEXTCOLOR', (0, 0), (-1, 3), colors.HexColor('#1f2937')),
-        ('TEXTCOLOR', (0, 4), (-1, 4), colors.whitesmoke),
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
-    ]))
     
-    summary_section.append(summary_table)
+    closing = [Spacer(1, 0.5*inch), authenticity_note] if include_closing else []
     
-    # Mantener resumen junto
-    elements.append(KeepTogether(summary_section))
-    elements.append(Spacer(1, 0.3*inch))
+    sections = _debtor_sections(current_user, subheading_style, styles['Italic'], first_id, last_id)
+    yield from chain(elements, sections, closing)
+
+
+def _debtor_sections(current_user, subheading_style, empty_style, first_id=None, last_id=None):
+    """
+    Genera las secciones del detalle por deudor (nombre + tabla de deudas + totales)
+    Los totales de cada deudor se calculan en la misma pasada sobre sus deudas
     
-    # Detalle por deudor
-    detail_heading = Paragraph("Detalle por Deudor", heading_style)
-    elements.append(detail_heading)
-    elements.append(Spacer(1, 0.1*inch))
+    Args:
+        current_user: Usuario dueño de los deudores
+        subheading_style: Estilo del nombre del deudor
+        empty_style: Estilo para deudores sin deudas
+        first_id (int): Primer ID de deudor a incluir (opcional)
+        last_id (int): Último ID de deudor a incluir (opcional)
+    
+    Yields:
+        Flowable: Elementos del detalle en orden
+    """
+    from summary import iter_debtors_with_debts
     
-    for idx, debtor in enumerate(debtors):
+    debtors = iter_debtors_with_debts(current_user.id, first_id=first_id, last_id=last_id)
+    for idx, (debtor_id, debtor_name, debts) in enumerate(debtors):
+        # Espacio entre deudores
+        if idx > 0:
+            yield Spacer(1, 0.3*inch)
+        
         # Crear lista de elementos para este deudor (se mantendrán juntos)
         debtor_elements = []
         
         # Nombre del deudor
-        debtor_name = Paragraph(debtor.name, subheading_style)
-        debtor_elements.append(debtor_name)
-        
-        # Obtener deudas del deudor
-        from models import Debt
-        debts = Debt.query.filter_by(debtor_id=debtor.id).all()
+        debtor_elements.append(Paragraph(debtor_name, subheading_style))
         
         if debts:
             # Tabla de deudas del deudor
@@ -493,7 +875,10 @@ def generate_all_debtors_pdf(debtors, current_user):
             debtor_total = 0
             debtor_paid = 0
             
-            for debt in debts:
+            # Columna de montos formateada de una vez
+            amount_texts = format_many([debt.amount for debt in debts], current_user.currency)
+            
+            for debt, amount_text in zip(debts, amount_texts):
                 days = debt.days_elapsed()
                 installment_text = '-'
                 if debt.has_installments:
@@ -509,15 +894,15 @@ def generate_all_debtors_pdf(debtors, current_user):
                 if debt.paid:
                     paid_amount = debt.amount
                 elif debt.has_installments:
-                    paid_amount = (debt.amount / debt.installments_total) * debt.installments_paid + debt.partial_payment
+                    paid_amount = debt.amount - debt.remaining_amount()
                 else:
                     paid_amount = 0
                 
-                debtor_total += debt.amount
-                debtor_paid += paid_amount
+                debtor_total += to_minor(debt.amount)
+                debtor_paid += to_minor(paid_amount)
                 
                 debtor_debts_data.append([
-                    format_currency_for_pdf(debt.amount, current_user.currency),
+                    amount_text,
                     format_date_pdf(debt.initial_date),
                     str(days),
                     installment_text,
@@ -525,8 +910,9 @@ def generate_all_debtors_pdf(debtors, current_user):
                     status
                 ])
             
-            # Agregar fila de totales del deudor
-            debtor_pending = debtor_total - debtor_paid
+            # Agregar fila de totales del deudor (acumulados en unidades menores)
+            debtor_pending = from_minor(debtor_total - debtor_paid)
+            debtor_total, debtor_paid = from_minor(debtor_total), from_minor(debtor_paid)
             debtor_debts_data.append([
                 f"Total: {format_currency_for_pdf(debtor_total, current_user.currency)}",
                 f"Pagado: {format_currency_for_pdf(debtor_paid, current_user.currency)}",
@@ -572,35 +958,8 @@ def generate_all_debtors_pdf(debtors, current_user):
             
             debtor_elements.append(debtor_debts_table)
         else:
-            no_debts = Paragraph("Sin deudas registradas", styles['Italic'])
+            no_debts = Paragraph("Sin deudas registradas", empty_style)
             debtor_elements.append(no_debts)
         
         # Mantener todos los elementos del deudor juntos en la misma página
-        elements.append(KeepTogether(debtor_elements))
-        
-        # Agregar espacio o salto de página entre deudores
-        if idx < len(debtors) - 1:
-            elements.append(Spacer(1, 0.3*inch))
-    
-    # Nota de autenticidad al final
-    elements.append(Spacer(1, 0.5*inch))
-    authenticity_style = ParagraphStyle(
-        'Authenticity',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.HexColor('#9ca3af'),
-        alignment=TA_CENTER,
-        leading=10
-    )
-    authenticity_note = Paragraph(
-        f"Este documento fue generado electrónicamente por CuentasClaras el {export_datetime}.<br/>"
-        f"Cualquier modificación posterior invalida su autenticidad.",
-        authenticity_style
-    )
-    elements.append(authenticity_note)
-    
-    # Generar PDF con canvas personalizado
-    doc.build(elements, canvasmaker=NumberedCanvas)
-    buffer.seek(0)
-    
-    return buffer
+        yield KeepTogether(debtor_elements)
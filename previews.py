@@ -0,0 +1,264 @@
+"""
+CuentasClaras - Vistas Previas de Adjuntos
+Genera una miniatura JPEG comprimida de cada comprobante (PNG/JPG) y de la primera página
+de cada PDF, guardada junto al contenido en el almacén (uploads/blobs/ab/<hash>.preview.jpg).
+Como el almacén es por contenido, un archivo repetido tiene una sola vista previa.
+
+La generación corre en un pool de procesos propio (PREVIEW_WORKERS, por defecto 1), separado
+del de exportaciones: una miniatura no espera detrás de reportes PDF ni retrasa la subida.
+Se encarga recién cuando la transacción que registra el adjunto se confirma (after_commit);
+si se revierte, no se genera. Con PREVIEW_WORKERS=0 se genera en el proceso actual al confirmar.
+La ficha del deudor muestra la miniatura cuando ya existe, y encarga las que falten (adjuntos migrados)
+
+Imágenes requieren Pillow (instalado con reportlab); PDFs requieren además PyMuPDF
+(dependencia opcional: pip install pymupdf)
+Autor: Fernando Poblete
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.utils import send_file
+from extensions import db
+from attachments import blob_path, preview_path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    import fitz
+except ImportError:
+    fitz = None
+
+# Los callbacks del pool corren fuera del contexto de la app (sin current_app.logger)
+logger = logging.getLogger(__name__)
+
+# Lado mayor de la miniatura en píxeles (se muestra a 64 px; el doble para pantallas densas)
+PREVIEW_SIZE = 256
+
+# Calidad JPEG de la miniatura
+PREVIEW_QUALITY = 70
+
+# Caché del navegador: la vista previa de un contenido nunca cambia (un año)
+PREVIEW_MAX_AGE = 365 * 24 * 3600
+
+IMAGE_MIMES = {'image/png', 'image/jpeg'}
+PDF_MIME = 'application/pdf'
+
+# Hashes con vista previa encargada en este proceso (evita encargar dos veces la misma)
+_pending = set()
+_pending_lock = threading.Lock()
+
+# Clave en Session.info de las vistas previas a encargar al confirmar la transacción
+SESSION_PENDING_KEY = 'pending_previews'
+
+# Pool de procesos de vistas previas del proceso web actual (se crea al primer uso)
+_executor = None
+
+
+def get_preview_executor():
+    """
+    Retorna el pool de procesos de vistas previas, creándolo si no existe
+    Usa el contexto 'spawn', igual que el pool de exportaciones
+
+    Returns:
+        ProcessPoolExecutor: Pool de vistas previas (None si PREVIEW_WORKERS es 0)
+    """
+    global _executor
+
+    workers = current_app.config.get('PREVIEW_WORKERS', 0)
+    if workers <= 0:
+        return None
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+
+    return _executor
+
+
+def preview_supported(mime):
+    """Indica si se puede generar la vista previa de un tipo de archivo con las librerías instaladas"""
+    if Image is None:
+        return False
+    if mime in IMAGE_MIMES:
+        return True
+    return mime == PDF_MIME and fitz is not None
+
+
+def _first_page(source):
+    """Primera página de un PDF como imagen de Pillow, escalada al tamaño de la miniatura"""
+    with fitz.open(source) as document:
+        page = document.load_page(0)
+        zoom = PREVIEW_SIZE / max(page.rect.width, page.rect.height, 1)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def render_preview(source, target, mime):
+    """
+    Genera la miniatura de un archivo (se ejecuta en el pool de procesos)
+
+    Args:
+        source (str): Archivo original
+        target (str): Ruta de la miniatura JPEG
+        mime (str): Tipo del archivo original
+
+    Returns:
+        bool: True si se generó la miniatura
+    """
+    if os.path.exists(target) or not os.path.exists(source) or not preview_supported(mime):
+        return False
+
+    if mime == PDF_MIME:
+        image = _first_page(source)
+    else:
+        image = Image.open(source)
+        # JPEG: decodifica directo a una escala reducida (mucho menos trabajo que el tamaño completo)
+        image.draft('RGB', (PREVIEW_SIZE, PREVIEW_SIZE))
+        image = ImageOps.exif_transpose(image)
+
+    image.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE))
+    if image.mode != 'RGB':
+        # Transparencias sobre fondo blanco
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        image = background
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            image.save(tmp_file, 'JPEG', quality=PREVIEW_QUALITY, optimize=True, progressive=True)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+def _finished(sha256, future):
+    """Libera el hash encargado y registra el error si la miniatura falló"""
+    with _pending_lock:
+        _pending.discard(sha256)
+    if future.exception() is not None:
+        logger.warning(f"No se pudo generar la vista previa de {sha256[:12]}: {future.exception()}")
+
+
+def schedule_preview(sha256, mime):
+    """
+    Encarga la vista previa de un contenido del almacén si aún no existe
+
+    Args:
+        sha256 (str): Hash del contenido
+        mime (str): Tipo del archivo
+
+    Returns:
+        bool: True si se encargó o generó la vista previa
+    """
+    source, target = blob_path(sha256), preview_path(sha256)
+    if not preview_supported(mime) or os.path.exists(target) or not os.path.exists(source):
+        return False
+
+    executor = get_preview_executor()
+    if executor is None:
+        try:
+            return render_preview(source, target, mime)
+        except Exception as e:
+            current_app.logger.warning(f"No se pudo generar la vista previa de {sha256[:12]}: {e}")
+            return False
+
+    with _pending_lock:
+        if sha256 in _pending:
+            return False
+        _pending.add(sha256)
+
+    future = executor.submit(render_preview, source, target, mime)
+    future.add_done_callback(lambda done: _finished(sha256, done))
+    return True
+
+
+def schedule_preview_on_commit(sha256, mime):
+    """
+    Encarga la vista previa de un adjunto recién registrado cuando la transacción se confirme
+    Así el proceso de trabajo nunca ve un adjunto sin confirmar, y una subida revertida
+    no deja miniatura
+
+    Args:
+        sha256 (str): Hash del contenido
+        mime (str): Tipo del archivo
+    """
+    if preview_supported(mime):
+        db.session.info.setdefault(SESSION_PENDING_KEY, {})[sha256] = mime
+
+
+@event.listens_for(Session, 'after_commit')
+def _schedule_committed(session):
+    """Encarga las vistas previas de los adjuntos confirmados"""
+    for sha256, mime in session.info.pop(SESSION_PENDING_KEY, {}).items():
+        schedule_preview(sha256, mime)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    """Descarta las vistas previas de adjuntos revertidos"""
+    session.info.pop(SESSION_PENDING_KEY, None)
+
+
+def available_previews(attachments):
+    """
+    Hashes de los adjuntos que ya tienen vista previa; encarga las que falten
+
+    Args:
+        attachments (list): Adjuntos (Attachment) a mostrar
+
+    Returns:
+        set: Hashes con miniatura lista
+    """
+    ready = set()
+    for sha256, mime in {(attachment.sha256, attachment.mime) for attachment in attachments}:
+        if not preview_supported(mime):
+            continue
+        if os.path.exists(preview_path(sha256)):
+            ready.add(sha256)
+        else:
+            schedule_preview(sha256, mime)
+    return ready
+
+
+def preview_response(attachment):
+    """
+    Respuesta con la miniatura de un adjunto autorizado (None si aún no existe)
+    La URL lleva el hash (?v=), así el navegador la guarda un año sin revalidar
+
+    Args:
+        attachment (Attachment): Adjunto autorizado
+
+    Returns:
+        Response: 200 o 304 con la miniatura JPEG
+    """
+    path = preview_path(attachment.sha256)
+    if not os.path.exists(path):
+        return None
+
+    response = send_file(
+        path, request.environ, mimetype='image/jpeg', conditional=True,
+        etag=f"{attachment.sha256}-preview", max_age=PREVIEW_MAX_AGE
+    )
+    # Miniatura de un adjunto privado: caché solo del navegador
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
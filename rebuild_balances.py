@@ -0,0 +1,66 @@
+"""
+Script para reconstruir y verificar la tabla debtor_balance
+Recalcula los saldos de todos los deudores desde las filas de debt
+y reporta las diferencias encontradas
+
+Ejecutar:
+    python rebuild_balances.py            # Reconstruye los saldos
+    python rebuild_balances.py --verify   # Solo reporta diferencias, sin corregir
+Autor: Fernando Poblete
+"""
+
+import sys
+from app import create_app
+from extensions import db
+from summary import verify_balances
+
+
+def rebuild_balances(fix=True):
+    """
+    Verifica (y opcionalmente corrige) los saldos desnormalizados
+
+    Args:
+        fix (bool): Si es True, corrige las diferencias encontradas
+
+    Returns:
+        int: Cantidad de diferencias encontradas
+    """
+    app = create_app()
+
+    with app.app_context():
+        # Asegurar que la tabla debtor_balance exista
+        db.create_all()
+
+        drift = verify_balances(fix=fix)
+
+        if not drift:
+            print("✅ Todos los saldos coinciden con las deudas registradas")
+            return 0
+
+        print(f"⚠️  Se encontraron {len(drift)} diferencia(s):")
+        for item in drift:
+            if item['field'] == 'missing':
+                print(f"   - Deudor {item['debtor_id']}: sin registro de saldo")
+            elif item['field'] == 'orphan':
+                print(f"   - Deudor {item['debtor_id']}: saldo huérfano (el deudor no existe)")
+            else:
+                print(f"   - Deudor {item['debtor_id']}: {item['field']} guardado={item['stored']} "
+                      f"calculado={item['expected']}")
+
+        if fix:
+            print("\n✅ Saldos reconstruidos desde la tabla 'debt'")
+
+        return len(drift)
+
+
+if __name__ == '__main__':
+    verify_only = '--verify' in sys.argv
+
+    print("=" * 60)
+    print("   SALDOS DE DEUDORES - " + ("Verificación" if verify_only else "Reconstrucción"))
+    print("=" * 60)
+    differences = rebuild_balances(fix=not verify_only)
+    print("=" * 60)
+
+    # Código de salida distinto de cero si hay diferencias en modo verificación
+    sys.exit(1 if verify_only and differences else 0)
@@ -0,0 +1,236 @@
+"""
+CuentasClaras - Conciliación de Abonos desde Cartolas Bancarias
+Lee el CSV de transferencias recibidas, asocia cada fila a una deuda abierta del usuario
+y arma una vista previa; al confirmar, los abonos se aplican en una sola transacción
+(payments.apply_payments)
+
+Asociación de cada fila, en orden:
+1. ID de deuda: columna de ID o referencia del tipo 'deuda 123'
+2. Nombre del deudor (sin tildes ni mayúsculas) y monto: saldo pendiente exacto o valor de la cuota actual
+3. Nombre del deudor con una sola deuda abierta
+Las filas ambiguas o sin deudor quedan fuera de la vista previa confirmable
+Autor: Fernando Poblete
+"""
+
+import math
+import re
+from collections import defaultdict
+from extensions import db
+from models import Debtor, Debt
+from money import to_minor, from_minor, installments_minor
+from data_import import iter_csv_rows, normalize_text, parse_amount, parse_date, pick
+
+# Nombres de columna aceptados (encabezados normalizados, ver data_import.normalize_header)
+DEBT_ID_COLUMNS = ['debt_id', 'id_deuda', 'deuda_id', 'deuda']
+NAME_COLUMNS = ['nombre', 'name', 'deudor', 'debtor', 'debtor_name', 'remitente', 'ordenante', 'titular', 'origen']
+AMOUNT_COLUMNS = ['monto', 'amount', 'abono', 'importe', 'valor', 'deposito', 'abonos', 'credito', 'cargo_abono']
+DATE_COLUMNS = ['fecha', 'date', 'fecha_operacion', 'fecha_transaccion']
+REFERENCE_COLUMNS = ['referencia', 'reference', 'descripcion', 'description', 'glosa', 'detalle', 'comentario', 'mensaje']
+
+# ID de deuda escrito en la referencia de la transferencia ('deuda 123', 'Deuda #123', 'deuda N° 123')
+# Se exige la palabra 'deuda': un '#123' suelto suele ser el número de operación del banco
+REFERENCE_DEBT_ID = re.compile(r'(?:deuda|debt)\s*(?:n[°º.]?|#)?\s*(\d+)', re.IGNORECASE)
+
+# Métodos de asociación (se muestran en la vista previa)
+MATCH_BY_ID = 'ID de deuda'
+MATCH_BY_BALANCE = 'Nombre y saldo'
+MATCH_BY_INSTALLMENT = 'Nombre y cuota'
+MATCH_BY_NAME = 'Nombre (única deuda abierta)'
+
+
+class OpenDebtIndex:
+    """
+    Deudas abiertas del usuario, cargadas en una consulta
+    Indexadas por ID y por nombre normalizado del deudor, con el saldo pendiente
+    y el valor de la cuota actual en unidades menores
+    """
+
+    def __init__(self, user_id):
+        self.by_id = {}
+        self.by_name = defaultdict(list)
+
+        rows = db.session.query(Debt, Debtor.name).join(Debtor).filter(
+            Debtor.user_id == user_id, Debt.paid.is_(False)
+        ).order_by(Debt.initial_date, Debt.id)
+
+        for debt, debtor_name in rows:
+            entry = {
+                'debt': debt,
+                'debtor_name': debtor_name,
+                'remaining_minor': to_minor(debt.remaining_amount()),
+                'installment_minor': self._current_installment(debt)
+            }
+            self.by_id[debt.id] = entry
+            self.by_name[normalize_text(debtor_name)].append(entry)
+
+    @staticmethod
+    def _current_installment(debt):
+        """Lo que falta para completar la cuota actual, en unidades menores (None sin cuotas)"""
+        if not debt.has_installments or not debt.installments_total:
+            return None
+        amount = to_minor(debt.amount)
+        current = (installments_minor(amount, debt.installments_paid + 1, debt.installments_total)
+                   - installments_minor(amount, debt.installments_paid, debt.installments_total))
+        return current - to_minor(debt.partial_payment or 0)
+
+
+def _debt_id_from(row, reference):
+    """ID de deuda de la fila: columna de ID o referencia de la transferencia (None si no hay)"""
+    value = pick(row, DEBT_ID_COLUMNS).lstrip('#')
+    if value.isdigit():
+        return int(value)
+    found = REFERENCE_DEBT_ID.search(reference or '')
+    if found:
+        return int(found.group(1))
+    return None
+
+
+def _match_by_name(entries, amount_minor):
+    """
+    Elige la deuda de un deudor según el monto
+
+    Returns:
+        tuple: (entrada de la deuda o None, método o mensaje de error)
+    """
+    for key, method in (('remaining_minor', MATCH_BY_BALANCE), ('installment_minor', MATCH_BY_INSTALLMENT)):
+        candidates = [entry for entry in entries if entry[key] == amount_minor]
+        if len(candidates) == 1:
+            return candidates[0], method
+
+    if len(entries) == 1:
+        return entries[0], MATCH_BY_NAME
+
+    return None, f'{len(entries)} deudas abiertas sin coincidencia de monto: indica el ID de la deuda'
+
+
+def match_row(line_number, row, index):
+    """
+    Asocia una fila de la cartola a una deuda abierta
+
+    Args:
+        line_number (int): Línea del archivo
+        row (dict): Fila con encabezados normalizados
+        index (OpenDebtIndex): Deudas abiertas del usuario
+
+    Returns:
+        dict: line, name, amount, date, reference, status ('matched', 'unmatched' o 'error'),
+        debt_id, debtor_id, debtor_name, method y message
+    """
+    reference = pick(row, REFERENCE_COLUMNS)
+    result = {
+        'line': line_number,
+        'name': pick(row, NAME_COLUMNS),
+        'amount': None,
+        'date': None,
+        'reference': reference,
+        'status': 'unmatched',
+        'debt_id': None,
+        'debtor_id': None,
+        'debtor_name': None,
+        'method': None,
+        'message': ''
+    }
+
+    try:
+        result['amount'] = parse_amount(pick(row, AMOUNT_COLUMNS))
+    except ValueError as e:
+        result['status'], result['message'] = 'error', str(e)
+        return result
+    if result['amount'] <= 0:
+        result['status'], result['message'] = 'error', 'El monto debe ser mayor a 0 (¿es un cargo?)'
+        return result
+
+    date_text = pick(row, DATE_COLUMNS)
+    if date_text:
+        try:
+            result['date'] = parse_date(date_text)
+        except ValueError:
+            pass
+
+    entry, method = None, None
+    debt_id = _debt_id_from(row, reference)
+    if debt_id is not None and debt_id in index.by_id:
+        entry, method = index.by_id[debt_id], MATCH_BY_ID
+    elif result['name']:
+        entries = index.by_name.get(normalize_text(result['name']))
+        if entries:
+            entry, method = _match_by_name(entries, to_minor(result['amount']))
+        else:
+            method = 'Deudor sin deudas abiertas'
+    else:
+        method = 'Sin ID de deuda ni nombre del deudor'
+
+    if entry is None:
+        if debt_id is not None and not result['name']:
+            method = f'Deuda {debt_id} no encontrada o ya pagada'
+        result['message'] = method
+        return result
+
+    result.update({
+        'status': 'matched',
+        'debt_id': entry['debt'].id,
+        'debtor_id': entry['debt'].debtor_id,
+        'debtor_name': entry['debtor_name'],
+        'method': method
+    })
+    return result
+
+
+def preview_statement(user_id, stream, max_rows=None):
+    """
+    Lee una cartola CSV y asocia cada fila a una deuda, sin modificar nada
+
+    Args:
+        user_id (int): ID del usuario
+        stream: Archivo CSV binario
+        max_rows (int): Máximo de filas a leer (opcional)
+
+    Returns:
+        dict: rows (resultado de match_row por fila), matched, unmatched, errors,
+        matched_total (suma de los abonos asociados) y truncated
+    """
+    index = OpenDebtIndex(user_id)
+    preview = {'rows': [], 'matched': 0, 'unmatched': 0, 'errors': 0, 'matched_total': 0, 'truncated': False}
+    matched_minor = 0
+
+    for line_number, row in iter_csv_rows(stream):
+        if max_rows is not None and len(preview['rows']) >= max_rows:
+            preview['truncated'] = True
+            break
+
+        result = match_row(line_number, row, index)
+        preview['rows'].append(result)
+
+        if result['status'] == 'matched':
+            preview['matched'] += 1
+            matched_minor += to_minor(result['amount'])
+        elif result['status'] == 'error':
+            preview['errors'] += 1
+        else:
+            preview['unmatched'] += 1
+
+    preview['matched_total'] = from_minor(matched_minor)
+    return preview
+
+
+def parse_confirmed_payments(values):
+    """
+    Abonos confirmados desde la vista previa (campos 'payment' con formato 'debt_id:monto')
+
+    Args:
+        values (list): Valores enviados por el formulario, en orden
+
+    Returns:
+        list: Pares (debt_id, monto) en el mismo orden (los valores mal formados,
+        no finitos como 'nan' o 'inf', o no positivos se ignoran)
+    """
+    payments = []
+    for value in values:
+        debt_id, _, amount = value.partition(':')
+        try:
+            debt_id, amount = int(debt_id), float(amount)
+        except ValueError:
+            continue
+        if math.isfinite(amount) and amount > 0:
+            payments.append((debt_id, amount))
+    return payments
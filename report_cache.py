@@ -0,0 +1,175 @@
+"""
+CuentasClaras - Caché de Reportes PDF
+Guarda los PDFs generados en disco con una huella (fingerprint) de los datos de entrada:
+usuario, moneda, versión de las filas de deudores/deudas, fecha y versión del diseño
+Si los datos no cambiaron se reutiliza el PDF ya generado (conserva su hora de exportación original)
+La caché se limita por tamaño total eliminando primero los archivos usados hace más tiempo (LRU)
+Autor: Fernando Poblete
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import date
+from flask import current_app
+from sqlalchemy import func
+from extensions import db
+from models import Debtor, Debt
+from pdf_generator import PDF_TEMPLATE_VERSION
+
+
+def _cache_folder():
+    """Retorna la carpeta de la caché, creándola si no existe"""
+    folder = current_app.config['REPORT_CACHE_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _cache_path(fingerprint):
+    """Ruta del PDF guardado para una huella"""
+    return os.path.join(_cache_folder(), f"{fingerprint}.pdf")
+
+
+def _row_versions(user_id, debtor_id=None):
+    """
+    Versión agregada de las filas que alimentan el reporte
+    Cantidad de filas + última modificación detecta altas, bajas y ediciones
+
+    Args:
+        user_id (int): ID del usuario
+        debtor_id (int): Limitar a un deudor (reporte individual)
+
+    Returns:
+        list: [deudores, última edición de deudor, deudas, última edición de deuda]
+    """
+    debtors = db.session.query(func.count(Debtor.id), func.max(Debtor.updated_at)).filter(
+        Debtor.user_id == user_id
+    )
+    debts = db.session.query(func.count(Debt.id), func.max(Debt.updated_at)).join(
+        Debtor, Debt.debtor_id == Debtor.id
+    ).filter(Debtor.user_id == user_id)
+
+    if debtor_id is not None:
+        debtors = debtors.filter(Debtor.id == debtor_id)
+        debts = debts.filter(Debt.debtor_id == debtor_id)
+
+    debtor_count, debtor_updated = debtors.one()
+    debt_count, debt_updated = debts.one()
+
+    return [
+        debtor_count,
+        debtor_updated.isoformat() if debtor_updated else None,
+        debt_count,
+        debt_updated.isoformat() if debt_updated else None
+    ]
+
+
+def report_fingerprint(user, kind, debtor_id=None):
+    """
+    Calcula la huella de un reporte a partir de sus datos de entrada
+    Incluye la fecha actual porque el reporte muestra los días transcurridos de cada deuda
+
+    Args:
+        user (User): Usuario dueño del reporte
+        kind (str): 'all_debtors' o 'debtor'
+        debtor_id (int): Deudor del reporte individual
+
+    Returns:
+        str: Huella SHA-256 en hexadecimal
+    """
+    payload = {
+        'template': PDF_TEMPLATE_VERSION,
+        'kind': kind,
+        'user': user.id,
+        'currency': user.currency,
+        'debtor': debtor_id,
+        'rows': _row_versions(user.id, debtor_id if kind == 'debtor' else None),
+        'date': date.today().isoformat()
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def get_cached_report(fingerprint):
+    """
+    Busca un PDF en la caché y lo marca como usado recientemente
+
+    Args:
+        fingerprint (str): Huella del reporte
+
+    Returns:
+        str: Ruta del PDF guardado, o None si no está en la caché
+    """
+    path = _cache_path(fingerprint)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def store_report(fingerprint, source_path):
+    """
+    Guarda una copia de un PDF generado en la caché y aplica el límite de tamaño
+
+    Args:
+        fingerprint (str): Huella del reporte
+        source_path (str): Ruta del PDF recién generado
+    """
+    path = _cache_path(fingerprint)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    copy_file(source_path, temp_path)
+    os.replace(temp_path, path)
+
+    evict_reports()
+
+
+def copy_file(source_path, target_path):
+    """
+    Copia un archivo usando un enlace duro cuando es posible (instantáneo, sin duplicar espacio)
+    Los PDFs nunca se modifican en su lugar, por lo que compartir el inodo es seguro
+
+    Args:
+        source_path (str): Archivo existente
+        target_path (str): Ruta destino (no debe existir)
+    """
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copyfile(source_path, target_path)
+
+
+def evict_reports(max_bytes=None):
+    """
+    Elimina los PDFs usados hace más tiempo hasta que la caché quede bajo el límite
+
+    Args:
+        max_bytes (int): Tamaño máximo en bytes (None: REPORT_CACHE_MAX_MB)
+
+    Returns:
+        int: Cantidad de archivos eliminados
+    """
+    if max_bytes is None:
+        max_bytes = current_app.config['REPORT_CACHE_MAX_MB'] * 1024 * 1024
+
+    entries = []
+    for entry in os.scandir(_cache_folder()):
+        if entry.is_file() and entry.name.endswith('.pdf'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+
+    # Los más antiguos primero (mtime se actualiza en cada acierto)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+
+    return removed
@@ -4,9 +4,12 @@ Panel de administración para gestionar usuarios
 Autor: Fernando Poblete
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, flash, send_file
 from flask_login import login_required, current_user
 from models import User
+from summary import users_totals
+from columnar_export import build_columnar_archive, columnar_available
 from functools import wraps
 
 # Crear blueprint para rutas de administración
@@ -42,4 +45,29 @@ def panel():
     # Obtener todos los usuarios ordenados por fecha de creación
     users = User.query.order_by(User.created_at.desc()).all()
     
-    return render_template('admin.html', users=users)
+    # Cantidad de deudores y saldo por cobrar de cada usuario (una consulta agrupada)
+    totals = users_totals()
+    
+    return render_template('admin.html', users=users, totals=totals)
+
+
+@admin_bp.route('/export_data/columnar.<any(parquet, arrow):fmt>')
+@login_required
+@admin_required
+def export_columnar(fmt):
+    """
+    Exportar deudores, deudas e historial de todos los usuarios como Parquet o Arrow (ZIP)
+    Cada archivo incluye la columna user_id
+    """
+    if not columnar_available():
+        flash('La exportación Parquet/Arrow no está disponible en este servidor (requiere pyarrow)', 'error')
+        return redirect(url_for('admin.panel'))
+    
+    archive = build_columnar_archive(fmt)
+    
+    return send_file(
+        archive,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=f"cuentasclaras_admin_{fmt}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    )
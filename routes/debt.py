@@ -4,15 +4,19 @@ Operaciones sobre deudas individuales
 Autor: Fernando Poblete
 """
 
-from flask import Blueprint, request, redirect, url_for, flash, send_from_directory, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from models import Debtor, Debt, DebtHistory
-import json
 from extensions import db
+from summary import refresh_debtor_balance, history_page, DEBT_HISTORY_PAGE_SIZE
+from payments import payment_history_entry, apply_payments
+from reconciliation import preview_statement, parse_confirmed_payments
+from attachments import add_attachment, find_attachment, attachment_response, release_attachments, remove_blob_files, stored_filename
+from uploads import attach_uploads
+from previews import preview_response
 from datetime import datetime
 import os
-import json
 
 # Crear blueprint para rutas de deudas
 debt_bp = Blueprint('debt', __name__, url_prefix='/debt')
@@ -45,6 +49,8 @@ def allowed_file(filename):
 def save_attachments(files, user_id, debt_id, attachment_type='debt'):
     """
     Guarda archivos adjuntos y retorna lista de nombres
+    El contenido va al almacén por hash (attachments.py): un archivo repetido no ocupa más disco
+    y cada archivo queda registrado en la tabla attachment
     
     Args:
         files: Lista de archivos desde request.files
@@ -60,24 +66,40 @@ def save_attachments(files, user_id, debt_id, attachment_type='debt'):
     if not files:
         return saved_files
     
-    # Crear directorio si no existe
-    upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], str(user_id), str(debt_id))
-    os.makedirs(upload_path, exist_ok=True)
-    
     for file in files:
         if file and file.filename and allowed_file(file.filename):
             # Crear nombre seguro con timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            original_filename = secure_filename(file.filename)
-            filename = f"{attachment_type}_{timestamp}_{original_filename}"
+            filename = stored_filename(attachment_type, secure_filename(file.filename))
             
-            # Guardar archivo
-            file.save(os.path.join(upload_path, filename))
+            # Guardar contenido y asociarlo a la deuda
+            add_attachment(debt_id, attachment_type, filename, file.stream)
             saved_files.append(filename)
     
     return saved_files
 
 
+def save_request_attachments(debt_id, attachment_type='debt'):
+    """
+    Guarda los adjuntos enviados con el formulario actual (no hace commit)
+    Acepta archivos del campo <tipo>_files y subidas por partes ya completas
+    del campo <tipo>_uploads (ver uploads.py)
+    
+    Args:
+        debt_id: ID de la deuda
+        attachment_type: 'debt' o 'payment'
+    
+    Returns:
+        list: Lista de nombres de archivos guardados
+    """
+    saved_files = save_attachments(
+        request.files.getlist(f'{attachment_type}_files'), current_user.id, debt_id, attachment_type
+    )
+    saved_files += attach_uploads(
+        request.form.getlist(f'{attachment_type}_uploads'), current_user.id, debt_id, attachment_type
+    )
+    return saved_files
+
+
 @debt_bp.route('/add', methods=['POST'])
 @login_required
 def add():
@@ -131,11 +153,7 @@ def add():
     db.session.flush()  # Para obtener el debt.id
     
     # Procesar archivos adjuntos
-    if 'debt_files' in request.files:
-        files = request.files.getlist('debt_files')
-        saved_files = save_attachments(files, current_user.id, debt.id, 'debt')
-        if saved_files:
-            debt.debt_attachments = json.dumps(saved_files)
+    save_request_attachments(debt.id, 'debt')
     
     # Registrar en historial
     log_debt_change(
@@ -145,6 +163,9 @@ def add():
         (f' en {installments_total} cuotas' if has_installments else '')
     )
     
+    # Actualizar saldo del deudor en la misma transacción
+    refresh_debtor_balance(debtor_id)
+    
     db.session.commit()
     
     flash('Deuda agregada correctamente', 'success')
@@ -182,25 +203,10 @@ def add_payment(debt_id):
     result = debt.process_payment(payment_amount)
     
     # Registrar en historial
-    if result['debt_completed']:
-        log_debt_change(
-            debt.id,
-            'marked_paid',
-            f'Deuda pagada con abono de {current_user.format_currency(payment_amount)}. {result["message"]}'
-        )
-    elif result['installments_completed'] > 0:
-        log_debt_change(
-            debt.id,
-            'installment_paid',
-            f'Abono de {current_user.format_currency(payment_amount)}. {result["message"]}'
-        )
-    else:
-        log_debt_change(
-            debt.id,
-            'payment_added',
-            f'Abono parcial de {current_user.format_currency(payment_amount)}. {result["message"]}'
-        )
+    action_type, description = payment_history_entry(result, payment_amount, current_user.currency)
+    log_debt_change(debt.id, action_type, description)
     
+    refresh_debtor_balance(debt.debtor_id)
     db.session.commit()
     flash(result['message'], 'success')
     return redirect(url_for('debtor.detail', debtor_id=debt.debtor_id))
@@ -251,6 +257,7 @@ def pay_installment(debt_id):
         )
         flash(f'Cuota pagada. Progreso: {debt.installments_paid}/{debt.installments_total}', 'success')
     
+    refresh_debtor_balance(debt.debtor_id)
     db.session.commit()
     return redirect(url_for('debtor.detail', debtor_id=debt.debtor_id))
 
@@ -279,17 +286,7 @@ def mark_paid(debt_id):
         debt.installments_paid = debt.installments_total
     
     # Procesar archivos adjuntos de evidencia si hay
-    if 'payment_files' in request.files:
-        files = request.files.getlist('payment_files')
-        if files and files[0].filename:  # Verificar que hay archivos
-            new_attachments = save_attachments(files, current_user.id, debt_id, 'payment')
-            if new_attachments:
-                # Obtener adjuntos existentes
-                existing = debt.get_payment_attachments()
-                # Agregar nuevos
-                existing.extend(new_attachments)
-                # Guardar como JSON
-                debt.payment_attachments = json.dumps(existing)
+    save_request_attachments(debt_id, 'payment')
     
     # Registrar en historial
     log_debt_change(
@@ -298,6 +295,7 @@ def mark_paid(debt_id):
         'Deuda marcada como pagada'
     )
     
+    refresh_debtor_balance(debt.debtor_id)
     db.session.commit()
     flash('Deuda marcada como pagada correctamente', 'success')
     return redirect(url_for('debtor.detail', debtor_id=debt.debtor_id))
@@ -330,15 +328,18 @@ def delete(debt_id):
     )
     db.session.commit()
     
-    # Eliminar archivos adjuntos físicos
+    # Eliminar archivos adjuntos anteriores al almacén por hash
     upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], str(current_user.id), str(debt_id))
     if os.path.exists(upload_path):
         import shutil
         shutil.rmtree(upload_path)
     
-    # Eliminar deuda (cascade eliminará el historial automáticamente)
+    # Eliminar deuda (cascade eliminará el historial automáticamente) y liberar sus adjuntos
+    orphaned = release_attachments([debt_id])
     db.session.delete(debt)
+    refresh_debtor_balance(debtor_id)
     db.session.commit()
+    remove_blob_files(orphaned)
     
     flash('Deuda eliminada correctamente', 'success')
     return redirect(url_for('debtor.detail', debtor_id=debtor_id))
@@ -359,16 +360,10 @@ def add_payment_evidence(debt_id):
         return redirect(url_for('main.dashboard'))
     
     # Procesar archivos
-    if 'payment_files' in request.files:
-        files = request.files.getlist('payment_files')
-        saved_files = save_attachments(files, current_user.id, debt.id, 'payment')
+    if 'payment_files' in request.files or 'payment_uploads' in request.form:
+        saved_files = save_request_attachments(debt.id, 'payment')
         
         if saved_files:
-            # Agregar a los existentes
-            existing = debt.get_payment_attachments()
-            existing.extend(saved_files)
-            debt.payment_attachments = json.dumps(existing)
-            
             db.session.commit()
             flash(f'Se agregaron {len(saved_files)} archivo(s) de evidencia de pago', 'success')
         else:
@@ -379,13 +374,52 @@ def add_payment_evidence(debt_id):
     return redirect(url_for('debtor.detail', debtor_id=debt.debtor_id))
 
 
+@debt_bp.route('/<int:debt_id>/history')
+@login_required
+def history(debt_id):
+    """
+    Historial de cambios de una deuda (JSON), del más reciente al más antiguo
+    Paginado por cursor; el detalle del deudor lo carga al expandir la línea de tiempo
+    """
+    debt = Debt.query.get_or_404(debt_id)
+    
+    # Verificar propiedad
+    if debt.debtor.user_id != current_user.id:
+        return jsonify({'error': 'No tienes permiso para ver esta deuda'}), 403
+    
+    limit = min(request.args.get('limit', type=int) or DEBT_HISTORY_PAGE_SIZE, 100)
+    page = history_page(current_user.id, debt_id=debt_id, after=request.args.get('after'), limit=limit)
+    
+    format_datetime = current_app.jinja_env.filters['format_datetime']
+    
+    return jsonify({
+        'movements': [
+            {
+                'id': record.id,
+                'action_type': record.action_type,
+                'description': record.description,
+                'created_at': record.created_at.isoformat(),
+                'created_at_display': format_datetime(record.created_at)
+            }
+            for record in page['movements']
+        ],
+        'next_cursor': page['next_cursor']
+    })
+
+
 @debt_bp.route('/<int:debt_id>/download/<filename>')
 @login_required
 def download_file(debt_id, filename):
     """
     Descargar un archivo adjunto
+    Soporta Range, ETag / If-None-Match y X-Sendfile (ver attachments.attachment_response)
     """
-    # Buscar deuda
+    # Archivo de esta deuda y del usuario actual, en una sola consulta por índice
+    attachment = find_attachment(debt_id, filename, user_id=current_user.id)
+    if attachment is not None:
+        return attachment_response(attachment)
+    
+    # Buscar deuda para informar el motivo
     debt = Debt.query.get_or_404(debt_id)
     
     # Verificar propiedad
@@ -393,16 +427,22 @@ def download_file(debt_id, filename):
         flash('No tienes permiso para acceder a este archivo', 'error')
         return redirect(url_for('main.dashboard'))
     
-    # Verificar que el archivo pertenece a esta deuda
-    all_files = debt.get_debt_attachments() + debt.get_payment_attachments()
-    if filename not in all_files:
-        flash('Archivo no encontrado', 'error')
-        return redirect(url_for('debtor.detail', debtor_id=debt.debtor_id))
-    
-    # Construir ruta del archivo
-    upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], str(current_user.id), str(debt_id))
+    flash('Archivo no encontrado', 'error')
+    return redirect(url_for('debtor.detail', debtor_id=debt.debtor_id))
+
+
+@debt_bp.route('/<int:debt_id>/preview/<filename>')
+@login_required
+def preview(debt_id, filename):
+    """
+    Miniatura de un archivo adjunto (imagen o primera página de un PDF)
+    """
+    attachment = find_attachment(debt_id, filename, user_id=current_user.id)
+    response = preview_response(attachment) if attachment is not None else None
+    if response is None:
+        abort(404)
     
-    return send_from_directory(upload_path, filename, as_attachment=True)
+    return response
 
 
 @debt_bp.route('/<int:debt_id>/edit', methods=['POST'])
@@ -449,17 +489,7 @@ def edit(debt_id):
     debt.notes = notes
     
     # Procesar archivos adjuntos si hay
-    if 'debt_files' in request.files:
-        files = request.files.getlist('debt_files')
-        if files and files[0].filename:  # Verificar que hay archivos
-            new_attachments = save_attachments(files, current_user.id, debt_id, 'debt')
-            if new_attachments:
-                # Obtener adjuntos existentes
-                existing = debt.get_debt_attachments()
-                # Agregar nuevos
-                existing.extend(new_attachments)
-                # Guardar como JSON
-                debt.debt_attachments = json.dumps(existing)
+    save_request_attachments(debt_id, 'debt')
     
     # Registrar en historial
     log_debt_change(
@@ -468,8 +498,64 @@ def edit(debt_id):
         'Deuda editada'
     )
     
+    refresh_debtor_balance(debt.debtor_id)
     db.session.commit()
     
     flash('Deuda actualizada correctamente', 'success')
     return redirect(url_for('debtor.detail', debtor_id=debt.debtor_id))
 
+
+@debt_bp.route('/reconcile', methods=['GET', 'POST'])
+@login_required
+def reconcile():
+    """
+    Conciliar abonos desde una cartola bancaria (CSV)
+    GET: formulario de carga. POST: vista previa con la deuda asociada a cada transferencia
+    """
+    if request.method == 'GET':
+        return render_template('reconcile.html', preview=None)
+    
+    statement = request.files.get('statement')
+    if not statement or not statement.filename:
+        flash('Selecciona el archivo CSV de la cartola', 'error')
+        return redirect(url_for('debt.reconcile'))
+    
+    if not statement.filename.lower().endswith(('.csv', '.txt')):
+        flash('La cartola debe ser un archivo CSV', 'error')
+        return redirect(url_for('debt.reconcile'))
+    
+    preview = preview_statement(
+        current_user.id, statement.stream, max_rows=current_app.config['RECONCILE_MAX_ROWS']
+    )
+    
+    if not preview['rows']:
+        flash('El archivo no tiene transferencias', 'error')
+        return redirect(url_for('debt.reconcile'))
+    
+    return render_template('reconcile.html', preview=preview, file_name=statement.filename)
+
+
+@debt_bp.route('/reconcile/confirm', methods=['POST'])
+@login_required
+def reconcile_confirm():
+    """
+    Aplicar los abonos confirmados en la vista previa
+    Todos los abonos se aplican en una sola transacción (ver payments.apply_payments)
+    """
+    payments = parse_confirmed_payments(request.form.getlist('payment'))
+    
+    if not payments:
+        flash('No seleccionaste abonos para aplicar', 'error')
+        return redirect(url_for('debt.reconcile'))
+    
+    results = apply_payments(current_user, payments)
+    db.session.commit()
+    
+    failed = [result for result in results if result.get('error')]
+    applied = len(results) - len(failed)
+    flash(f'{applied} abono(s) aplicado(s) desde la cartola', 'success')
+    if failed:
+        details = '; '.join(f"deuda {result['debt_id']}: {result['error']}" for result in failed[:5])
+        flash(f'{len(failed)} abono(s) no se aplicaron ({details})', 'error')
+    
+    return redirect(url_for('main.dashboard'))
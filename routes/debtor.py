@@ -4,11 +4,18 @@ CRUD completo para gestión de deudores
 Autor: Fernando Poblete
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
-from models import Debtor, Debt
+from models import Debtor, DebtorBalance, Debt, DebtHistory
 from extensions import db
-from pdf_generator import generate_debtor_pdf
+from export_jobs import enqueue_export
+from data_export import export_response
+from search import index_debtor, remove_debtor, typeahead
+from summary import debt_cards, debtor_totals
+from bulk_import import import_debts
+from data_import import xlsx_available
+from attachments import release_attachments, remove_blob_files
+from uploads import get_upload, part_path, cancel_upload
 
 # Crear blueprint para rutas de deudores
 debtor_bp = Blueprint('debtor', __name__, url_prefix='/debtor')
@@ -39,12 +46,87 @@ def add():
     )
     
     db.session.add(debtor)
+    db.session.flush()  # Para obtener el debtor.id
+    
+    # Crear saldo inicial en cero y agregar al índice de búsqueda
+    db.session.add(DebtorBalance(debtor_id=debtor.id, user_id=current_user.id))
+    index_debtor(debtor)
     db.session.commit()
     
     flash(f'Deudor {name} agregado correctamente', 'success')
     return redirect(url_for('main.dashboard'))
 
 
+@debtor_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_file():
+    """
+    Importar deudores y deudas desde una planilla (CSV o XLSX)
+    Las filas válidas se guardan en una sola transacción; las inválidas se informan por línea
+    """
+    if request.method == 'GET':
+        return render_template('import.html', report=None, xlsx_available=xlsx_available())
+    
+    # Planillas grandes llegan por /upload/ (purpose='import') y el formulario trae solo el ID
+    upload = None
+    upload_id = request.form.get('sheet_upload')
+    if upload_id:
+        upload = get_upload(upload_id, current_user.id)
+        if upload is None or not upload.complete:
+            flash('La planilla no terminó de subirse', 'error')
+            return redirect(url_for('debtor.import_file'))
+        file_name, stream = upload.filename, open(part_path(upload.id), 'rb')
+    else:
+        sheet = request.files.get('sheet')
+        if not sheet or not sheet.filename:
+            flash('Selecciona la planilla a importar', 'error')
+            return redirect(url_for('debtor.import_file'))
+        file_name, stream = sheet.filename, sheet.stream
+    
+    try:
+        report = import_debts(
+            current_user, file_name, stream, max_rows=current_app.config['IMPORT_MAX_ROWS']
+        )
+    except (ValueError, RuntimeError) as e:
+        db.session.rollback()
+        flash(str(e), 'error')
+        return redirect(url_for('debtor.import_file'))
+    else:
+        db.session.commit()
+    finally:
+        if upload is not None:
+            # La subida se descarta importe o no: para reintentar se sube de nuevo
+            stream.close()
+            cancel_upload(upload)
+    
+    flash(f"Importación terminada: {report['debtors_created']} deudor(es) y "
+          f"{report['debts_created']} deuda(s) creados", 'success')
+    return render_template('import.html', report=report, file_name=file_name,
+                           xlsx_available=xlsx_available())
+
+
+@debtor_bp.route('/search')
+@login_required
+def search():
+    """
+    Autocompletado de deudores (JSON)
+    Retorna los mejores resultados por prefijo y similitud dentro del presupuesto de latencia
+    """
+    term = request.args.get('q', '')
+    limit = min(request.args.get('limit', type=int) or current_app.config['SEARCH_TYPEAHEAD_LIMIT'], 50)
+    
+    result = typeahead(current_user.id, term, limit=limit)
+    
+    return jsonify({
+        'results': [
+            {'id': debtor_id, 'name': name, 'url': url_for('debtor.detail', debtor_id=debtor_id)}
+            for debtor_id, name in result['results']
+        ],
+        'timed_out': result['timed_out'],
+        'took_ms': result['took_ms']
+    })
+
+
 @debtor_bp.route('/<int:debtor_id>')
 @login_required
 def detail(debtor_id):
@@ -59,20 +141,19 @@ def detail(debtor_id):
         flash('No tienes permiso para ver este deudor', 'error')
         return redirect(url_for('main.dashboard'))
     
-    # Obtener todas las deudas del deudor
-    debts = Debt.query.filter_by(debtor_id=debtor_id).all()
+    # Deudas con sus adjuntos y la cantidad de movimientos (número fijo de consultas);
+    # el historial se carga bajo demanda desde /debt/<id>/history
+    cards = debt_cards(debtor_id)
     
-    # Calcular estadísticas
-    total_debt = debtor.total_debt()
-    total_paid = debtor.total_paid()
-    pending = total_debt - total_paid
+    # Calcular estadísticas desde debtor_balance
+    totals = debtor_totals(debtor_id)
     
     return render_template('debtor_detail.html',
                          debtor=debtor,
-                         debts=debts,
-                         total_debt=total_debt,
-                         total_paid=total_paid,
-                         pending=pending)
+                         debt_cards=cards,
+                         total_debt=totals['owed'],
+                         total_paid=totals['paid'],
+                         pending=totals['pending'])
 
 
 @debtor_bp.route('/<int:debtor_id>/edit', methods=['POST'])
@@ -94,6 +175,9 @@ def edit(debtor_id):
     debtor.phone = request.form.get('phone', debtor.phone)
     debtor.email = request.form.get('email', debtor.email)
     
+    # Mantener sincronizado el índice de búsqueda
+    index_debtor(debtor)
+    
     db.session.commit()
     
     flash('Deudor actualizado correctamente', 'success')
@@ -114,12 +198,19 @@ def delete(debtor_id):
         flash('No tienes permiso para eliminar este deudor', 'error')
         return redirect(url_for('main.dashboard'))
     
-    # Eliminar todas las deudas asociadas
+    # Liberar adjuntos, eliminar todas las deudas asociadas y su saldo desnormalizado
+    debt_ids = [debt_id for (debt_id,) in db.session.query(Debt.id).filter_by(debtor_id=debtor_id)]
+    orphaned = release_attachments(debt_ids)
+    # El DELETE masivo no aplica el cascade del ORM: el historial de las deudas se borra aparte
+    DebtHistory.query.filter(DebtHistory.debt_id.in_(debt_ids)).delete(synchronize_session=False)
     Debt.query.filter_by(debtor_id=debtor_id).delete()
+    DebtorBalance.query.filter_by(debtor_id=debtor_id).delete()
+    remove_debtor(debtor_id)
     
     # Eliminar deudor
     db.session.delete(debtor)
     db.session.commit()
+    remove_blob_files(orphaned)
     
     flash('Deudor eliminado correctamente', 'success')
     return redirect(url_for('main.dashboard'))
@@ -130,7 +221,7 @@ def delete(debtor_id):
 def export_pdf(debtor_id):
     """
     Exportar deudas de un deudor a PDF
-    Genera y descarga PDF con detalle completo
+    Encola la generación en segundo plano y redirige a la página de estado
     """
     # Buscar deudor y verificar propiedad
     debtor = Debtor.query.get_or_404(debtor_id)
@@ -139,19 +230,25 @@ def export_pdf(debtor_id):
         flash('No tienes permiso para exportar este deudor', 'error')
         return redirect(url_for('main.dashboard'))
     
-    # Obtener todas las deudas del deudor
-    debts = Debt.query.filter_by(debtor_id=debtor_id).all()
+    job = enqueue_export(current_user, 'debtor', debtor=debtor)
     
-    # Generar PDF
-    pdf_buffer = generate_debtor_pdf(debtor, debts, current_user)
+    return redirect(url_for('export.status_page', job_id=job.id))
+
+
+@debtor_bp.route('/<int:debtor_id>/export_data/<any(debts, history):dataset>.<any(csv, ndjson):fmt>')
+@login_required
+def export_data(debtor_id, dataset, fmt):
+    """
+    Exportar las deudas o el historial de un deudor como CSV o NDJSON
+    Las filas se transmiten a medida que se leen de la base de datos
+    """
+    # Buscar deudor y verificar propiedad
+    debtor = Debtor.query.get_or_404(debtor_id)
+    
+    if debtor.user_id != current_user.id:
+        flash('No tienes permiso para exportar este deudor', 'error')
+        return redirect(url_for('main.dashboard'))
     
-    # Nombre del archivo
-    filename = f"deudas_{debtor.name.replace(' ', '_')}.pdf"
+    download_name = f"{dataset}_{debtor.name.replace(' ', '_')}"
     
-    # Enviar archivo
-    return send_file(
-        pdf_buffer,
-        mimetype='application/pdf',
-        as_attachment=True,
-        download_name=filename
-    )
+    return export_response(dataset, fmt, current_user.id, download_name, debtor_id=debtor.id)
@@ -0,0 +1,78 @@
+"""
+CuentasClaras - Rutas de Exportaciones
+Estado y descarga de los reportes generados en segundo plano (PDF o ZIP por volúmenes)
+Autor: Fernando Poblete
+"""
+
+import os
+from flask import Blueprint, render_template, redirect, url_for, flash, send_file, jsonify
+from flask_login import login_required, current_user
+from models import ExportJob
+
+# Crear blueprint para rutas de exportaciones
+export_bp = Blueprint('export', __name__, url_prefix='/export')
+
+
+def get_user_job(job_id):
+    """
+    Obtiene un trabajo de exportación del usuario actual
+
+    Args:
+        job_id (int): ID del trabajo
+
+    Returns:
+        ExportJob: Trabajo encontrado, o None si no existe o pertenece a otro usuario
+    """
+    return ExportJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+
+
+@export_bp.route('/<int:job_id>')
+@login_required
+def status_page(job_id):
+    """
+    Página de espera de una exportación
+    Consulta el estado periódicamente y ofrece la descarga al terminar
+    """
+    job = get_user_job(job_id)
+
+    if job is None:
+        flash('Exportación no encontrada o expirada', 'error')
+        return redirect(url_for('main.dashboard'))
+
+    return render_template('export_status.html', job=job)
+
+
+@export_bp.route('/<int:job_id>/status')
+@login_required
+def status(job_id):
+    """
+    Estado de una exportación (JSON)
+    """
+    job = get_user_job(job_id)
+
+    if job is None:
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+
+    data = job.to_dict()
+    data['download_url'] = url_for('export.download', job_id=job.id) if job.status == 'done' else None
+    return jsonify(data)
+
+
+@export_bp.route('/<int:job_id>/download')
+@login_required
+def download(job_id):
+    """
+    Descargar el archivo de una exportación terminada
+    """
+    job = get_user_job(job_id)
+
+    if job is None or job.status != 'done' or job.is_expired() or not os.path.exists(job.file_path):
+        flash('La exportación no está disponible. Genera el reporte nuevamente.', 'error')
+        return redirect(url_for('main.dashboard'))
+
+    return send_file(
+        job.file_path,
+        mimetype=job.mimetype,
+        as_attachment=True,
+        download_name=job.download_name
+    )
@@ -4,12 +4,16 @@ Landing page, dashboard y perfil de usuario
 Autor: Fernando Poblete
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response, send_file
 from flask_login import login_required, current_user
 from models import User, Debtor, Debt, DebtHistory
 from extensions import db
 from sqlalchemy import func
-from pdf_generator import generate_all_debtors_pdf
+from export_jobs import enqueue_export
+from volume_export import VOLUME_SPLITS
+from data_export import export_response
+from columnar_export import build_columnar_archive, columnar_available
+from summary import debtor_page, history_page, user_totals, SORT_OPTIONS
 from datetime import datetime, timedelta
 
 # Crear blueprint para rutas principales
@@ -32,55 +36,30 @@ def dashboard():
     Dashboard principal del usuario
     Muestra estadísticas y lista de deudores con búsqueda y ordenamiento
     """
-    # Obtener parámetros de búsqueda y ordenamiento
+    # Obtener parámetros de búsqueda, ordenamiento y paginación
     search = request.args.get('search', '').strip()
-    sort_by = request.args.get('sort_by', 'name')  # name, debt_asc, debt_desc
+    sort_by = request.args.get('sort_by', 'name_asc')  # name_asc, name_desc, debt_asc, debt_desc
+    after = request.args.get('after') or None
+    before = request.args.get('before') or None
     
-    # Obtener todos los deudores del usuario actual
-    query = Debtor.query.filter_by(user_id=current_user.id)
+    if sort_by not in SORT_OPTIONS:
+        sort_by = 'name_asc'
     
-    # Aplicar búsqueda por nombre si existe
-    if search:
-        query = query.filter(Debtor.name.ilike(f'%{search}%'))
-    
-    debtors = query.all()
-    
-    # Ordenar deudores
-    if sort_by == 'name_asc':
-        debtors.sort(key=lambda d: d.name.lower())
-    elif sort_by == 'name_desc':
-        debtors.sort(key=lambda d: d.name.lower(), reverse=True)
-    elif sort_by == 'debt_asc':
-        debtors.sort(key=lambda d: d.total_debt() - d.total_paid())
-    elif sort_by == 'debt_desc':
-        debtors.sort(key=lambda d: d.total_debt() - d.total_paid(), reverse=True)
+    # Página de deudores con sus saldos, ordenada y paginada en SQL
+    page = debtor_page(current_user.id, sort_by=sort_by, search=search, after=after, before=before)
     
     # Calcular estadísticas (con todos los deudores, no filtrados)
-    all_debtors = Debtor.query.filter_by(user_id=current_user.id).all()
-    total_owed = 0
-    total_paid = 0
-    active_debtors = 0
-    
-    for debtor in all_debtors:
-        debtor_total = debtor.total_debt()
-        debtor_paid = debtor.total_paid()
-        
-        total_owed += debtor_total
-        total_paid += debtor_paid
-        
-        # Contar deudores con deudas activas (no pagadas completamente)
-        if debtor_total > debtor_paid:
-            active_debtors += 1
-    
-    # Calcular total pendiente
-    total_pending = total_owed - total_paid
+    totals = user_totals(current_user.id)
     
     return render_template('dashboard.html', 
-                         debtors=debtors,
-                         total_owed=total_owed,
-                         total_paid=total_paid,
-                         total_pending=total_pending,
-                         active_debtors=active_debtors,
+                         debtors=page['rows'],
+                         next_cursor=page['next_cursor'],
+                         prev_cursor=page['prev_cursor'],
+                         total_owed=totals['total_owed'],
+                         total_paid=totals['total_paid'],
+                         total_pending=totals['total_pending'],
+                         active_debtors=totals['active_debtors'],
+                         debtor_count=totals['debtor_count'],
                          search=search,
                          sort_by=sort_by)
 
@@ -123,44 +102,55 @@ def help():
 def history():
     """
     Historial general de movimientos del usuario
-    Con filtros por deudor, fecha y tipo de acción
+    Con filtros por deudor, fecha y tipo de acción, paginado con "Cargar más"
     """
     # Obtener parámetros de filtro
     debtor_id = request.args.get('debtor_id', type=int)
     action_type = request.args.get('action_type', '')
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
+    after = request.args.get('after') or None  # Cursor de paginación
     
-    # Query base: todos los movimientos del usuario a través de sus deudas
-    query = DebtHistory.query.join(Debt).join(Debtor).filter(
-        Debtor.user_id == current_user.id
-    )
-    
-    # Aplicar filtros
-    if debtor_id:
-        query = query.filter(Debt.debtor_id == debtor_id)
-    
-    if action_type:
-        query = query.filter(DebtHistory.action_type == action_type)
-    
+    # Convertir fechas de los filtros
+    date_from_obj = None
     if date_from:
         try:
             date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            query = query.filter(DebtHistory.created_at >= date_from_obj)
         except ValueError:
             pass
     
+    date_to_obj = None
     if date_to:
         try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d')
             # Agregar 1 día para incluir todo el día seleccionado
-            date_to_obj = date_to_obj + timedelta(days=1)
-            query = query.filter(DebtHistory.created_at < date_to_obj)
+            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
         except ValueError:
             pass
     
-    # Ordenar por fecha descendente (más reciente primero)
-    movements = query.order_by(DebtHistory.created_at.desc()).all()
+    # Página de movimientos (más reciente primero) paginada por cursor
+    page = history_page(
+        current_user.id,
+        debtor_id=debtor_id,
+        action_type=action_type,
+        date_from=date_from_obj,
+        date_to=date_to_obj,
+        after=after
+    )
+    movements = page['movements']
+    
+    # Filtros activos, para construir el enlace "Cargar más"
+    filters = {
+        'debtor_id': debtor_id,
+        'action_type': action_type or None,
+        'date_from': date_from or None,
+        'date_to': date_to or None
+    }
+    
+    # "Cargar más": devolver solo los movimientos de la página siguiente
+    if request.args.get('partial'):
+        response = make_response(render_template('history_items.html', movements=movements))
+        response.headers['X-Next-Cursor'] = page['next_cursor'] or ''
+        return response
     
     # Obtener lista de deudores para el filtro
     debtors = Debtor.query.filter_by(user_id=current_user.id).order_by(Debtor.name).all()
@@ -176,6 +166,8 @@ def history():
     
     return render_template('history.html',
                          movements=movements,
+                         next_cursor=page['next_cursor'],
+                         filters=filters,
                          debtors=debtors,
                          action_types=action_types,
                          selected_debtor=debtor_id,
@@ -189,24 +181,56 @@ def history():
 def export_all_pdf():
     """
     Exportar reporte completo de todos los deudores a PDF
-    Genera y descarga PDF con estadísticas y detalle
+    Encola la generación en segundo plano y redirige a la página de estado
+    
+    Con ?split=debtors|pages&size=N el reporte se divide en volúmenes de N deudores
+    (o N páginas estimadas) y se descarga como ZIP, generado también en segundo plano
+    """
+    split = request.args.get('split')
+    
+    if split:
+        if split not in VOLUME_SPLITS:
+            flash('Criterio de división no válido', 'error')
+            return redirect(url_for('main.dashboard'))
+        
+        job = enqueue_export(current_user, 'volumes', split=split, size=request.args.get('size', type=int))
+        return redirect(url_for('export.status_page', job_id=job.id))
+    
+    job = enqueue_export(current_user, 'all_debtors')
+    
+    return redirect(url_for('export.status_page', job_id=job.id))
+
+
+@main_bp.route('/export_data/<any(debtors, debts, history):dataset>.<any(csv, ndjson):fmt>')
+@login_required
+def export_data(dataset, fmt):
     """
-    # Obtener todos los deudores del usuario actual
-    debtors = Debtor.query.filter_by(user_id=current_user.id).all()
+    Exportar deudores, deudas o historial del usuario como CSV o NDJSON
+    Las filas se transmiten a medida que se leen de la base de datos
+    """
+    download_name = f"{dataset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     
-    # Generar PDF
-    pdf_buffer = generate_all_debtors_pdf(debtors, current_user)
+    return export_response(dataset, fmt, current_user.id, download_name)
+
+
+@main_bp.route('/export_data/columnar.<any(parquet, arrow):fmt>')
+@login_required
+def export_columnar(fmt):
+    """
+    Exportar deudores, deudas e historial del usuario como archivos Parquet o Arrow (ZIP)
+    Columnas tipadas para cargarlas directamente en dataframes
+    """
+    if not columnar_available():
+        flash('La exportación Parquet/Arrow no está disponible en este servidor (requiere pyarrow)', 'error')
+        return redirect(url_for('main.dashboard'))
     
-    # Nombre del archivo con fecha
-    from datetime import datetime
-    filename = f"reporte_completo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    archive = build_columnar_archive(fmt, current_user.id)
     
-    # Enviar archivo
     return send_file(
-        pdf_buffer,
-        mimetype='application/pdf',
+        archive,
+        mimetype='application/zip',
         as_attachment=True,
-        download_name=filename
+        download_name=f"cuentasclaras_{fmt}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
     )
 
 
@@ -0,0 +1,109 @@
+"""
+CuentasClaras - Rutas de Subidas por Partes
+API JSON para subir adjuntos grandes en partes y reanudar subidas interrumpidas
+
+    POST   /upload/              {filename, size, purpose}  -> inicia la subida
+    GET    /upload/<id>                                      -> avance (para reanudar)
+    PUT    /upload/<id>?offset=N  cuerpo binario             -> escribe una parte
+    DELETE /upload/<id>                                      -> cancela la subida
+
+purpose es 'attachment' (por omisión) o 'import' para planillas de importación
+Autor: Fernando Poblete
+"""
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required, current_user
+from werkzeug.exceptions import RequestEntityTooLarge
+from uploads import start_upload, get_upload, append_chunk, cancel_upload
+
+# Crear blueprint para rutas de subidas
+upload_bp = Blueprint('upload', __name__, url_prefix='/upload')
+
+
+def upload_state(upload):
+    """Estado de una subida para el navegador"""
+    return {
+        'upload_id': upload.id,
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.received,
+        'complete': upload.complete,
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE']
+    }
+
+
+@upload_bp.route('/', methods=['POST'])
+@login_required
+def start():
+    """
+    Iniciar una subida por partes
+    """
+    data = request.get_json(silent=True) or request.form
+
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Tamaño inválido'}), 400
+
+    try:
+        upload = start_upload(current_user.id, data.get('filename'), size,
+                              purpose=data.get('purpose') or 'attachment')
+    except RequestEntityTooLarge as e:
+        return jsonify({'error': e.description}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(upload_state(upload)), 201
+
+
+@upload_bp.route('/<upload_id>')
+@login_required
+def status(upload_id):
+    """
+    Avance de una subida
+    """
+    upload = get_upload(upload_id, current_user.id)
+    if upload is None:
+        return jsonify({'error': 'Subida no encontrada'}), 404
+
+    return jsonify(upload_state(upload))
+
+
+@upload_bp.route('/<upload_id>', methods=['PUT'])
+@login_required
+def chunk(upload_id):
+    """
+    Escribir una parte de la subida
+    El cuerpo se lee en streaming desde request.stream (sin formulario multipart)
+    """
+    upload = get_upload(upload_id, current_user.id)
+    if upload is None:
+        return jsonify({'error': 'Subida no encontrada'}), 404
+
+    offset = request.args.get('offset', type=int)
+    if offset is None or offset != upload.received:
+        # El navegador reanuda desde el avance informado
+        return jsonify(dict(upload_state(upload), error='Posición inválida')), 409
+
+    try:
+        append_chunk(upload, offset, request.stream)
+    except RequestEntityTooLarge as e:
+        return jsonify(dict(upload_state(upload), error=e.description)), 413
+    except ValueError as e:
+        return jsonify(dict(upload_state(upload), error=str(e))), 409
+
+    return jsonify(upload_state(upload))
+
+
+@upload_bp.route('/<upload_id>', methods=['DELETE'])
+@login_required
+def cancel(upload_id):
+    """
+    Cancelar una subida
+    """
+    upload = get_upload(upload_id, current_user.id)
+    if upload is None:
+        return jsonify({'error': 'Subida no encontrada'}), 404
+
+    cancel_upload(upload)
+    return jsonify({'success': True})
@@ -0,0 +1,316 @@
+"""
+CuentasClaras - Búsqueda de Deudores
+Índice de búsqueda por subcadena sobre el nombre de los deudores:
+- PostgreSQL: extensión pg_trgm con índice GIN sobre debtor.name
+- SQLite: tabla espejo FTS5 (tokenizer trigram) sincronizada desde las rutas de deudores
+Si ninguno está disponible se usa ILIKE como respaldo
+Autor: Fernando Poblete
+"""
+
+import time
+from difflib import SequenceMatcher
+from flask import current_app
+from sqlalchemy import text, func, or_, and_
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from extensions import db
+from models import Debtor
+
+# Tabla espejo FTS5 (SQLite) e índice trigram (PostgreSQL)
+FTS_TABLE = 'debtor_search'
+TRGM_INDEX = 'ix_debtor_name_trgm'
+
+# El tokenizer trigram necesita al menos 3 caracteres; términos más cortos buscan por prefijo
+MIN_TRIGRAM_LENGTH = 3
+
+# Similitud mínima para sugerencias aproximadas (errores de tipeo)
+FUZZY_THRESHOLD = 0.5
+
+
+def _dialect():
+    """Retorna el nombre del motor de base de datos actual (sqlite, postgresql)"""
+    return db.engine.dialect.name
+
+
+def _backend():
+    """Retorna el backend de búsqueda activo: 'fts5', 'pg_trgm' o 'like'"""
+    return current_app.extensions.get('debtor_search', 'like')
+
+
+def _escape_like(term):
+    """Escapa comodines de LIKE en el término de búsqueda"""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _fts_phrase(term):
+    """Convierte el término en una frase FTS5 (coincidencia por subcadena con trigram)"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def init_search_index():
+    """
+    Crea la estructura de búsqueda si no existe
+    SQLite: tabla virtual FTS5 (y la llena si está vacía)
+    PostgreSQL: extensión pg_trgm e índice GIN sobre el nombre
+    """
+    dialect = _dialect()
+
+    try:
+        if dialect == 'sqlite':
+            db.session.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5(name, user_id UNINDEXED, tokenize='trigram')"
+            ))
+            db.session.commit()
+            current_app.extensions['debtor_search'] = 'fts5'
+
+            # Llenar el índice la primera vez (bases de datos existentes)
+            indexed = db.session.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+            if not indexed and Debtor.query.first() is not None:
+                rebuild_search_index()
+        elif dialect == 'postgresql':
+            db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            db.session.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {TRGM_INDEX} ON debtor USING gin (name gin_trgm_ops)"
+            ))
+            db.session.commit()
+            current_app.extensions['debtor_search'] = 'pg_trgm'
+        else:
+            current_app.extensions['debtor_search'] = 'like'
+    except (OperationalError, ProgrammingError) as e:
+        # Sin FTS5 o sin permisos para pg_trgm: se usa ILIKE
+        db.session.rollback()
+        current_app.extensions['debtor_search'] = 'like'
+        current_app.logger.warning(f"Índice de búsqueda no disponible, usando ILIKE: {e}")
+
+
+def rebuild_search_index():
+    """
+    Reconstruye la tabla FTS5 completa desde la tabla debtor
+    No hace nada en PostgreSQL (el índice trigram vive sobre la tabla)
+    """
+    if _backend() != 'fts5':
+        return
+
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    db.session.execute(text(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, user_id) SELECT id, name, user_id FROM debtor"
+    ))
+    db.session.commit()
+
+
+def index_debtor(debtor):
+    """
+    Agrega o actualiza un deudor en el índice de búsqueda
+    Debe llamarse antes del commit para quedar en la misma transacción
+
+    Args:
+        debtor (Debtor): Deudor ya persistido (con id)
+    """
+    if _backend() != 'fts5':
+        return
+
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': debtor.id})
+    db.session.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, name, user_id) VALUES (:id, :name, :user_id)"),
+        {'id': debtor.id, 'name': debtor.name, 'user_id': debtor.user_id}
+    )
+
+
+def index_debtors(rows):
+    """
+    Agrega muchos deudores nuevos al índice de búsqueda con un solo INSERT (importaciones masivas)
+    Debe llamarse antes del commit para quedar en la misma transacción
+
+    Args:
+        rows (list): Dicts con id, name y user_id de deudores recién creados
+    """
+    if _backend() != 'fts5' or not rows:
+        return
+
+    db.session.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, name, user_id) VALUES (:id, :name, :user_id)"),
+        rows
+    )
+
+
+def remove_debtor(debtor_id):
+    """
+    Elimina un deudor del índice de búsqueda
+
+    Args:
+        debtor_id (int): ID del deudor eliminado
+    """
+    if _backend() != 'fts5':
+        return
+
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': debtor_id})
+
+
+def search_filter(user_id, term):
+    """
+    Construye el filtro SQL de coincidencia por nombre usando el índice disponible
+
+    Args:
+        user_id (int): ID del usuario dueño de los deudores
+        term (str): Texto buscado
+
+    Returns:
+        ColumnElement: Condición para usar en query.filter()
+    """
+    term = term.strip()
+    backend = _backend()
+
+    if backend == 'fts5' and len(term) >= MIN_TRIGRAM_LENGTH:
+        matches = text(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :phrase AND user_id = :user_id"
+        ).bindparams(phrase=_fts_phrase(term), user_id=user_id).columns(rowid=db.Integer)
+        return Debtor.id.in_(matches)
+
+    # Términos cortos (o sin índice): ILIKE acotado a los deudores del usuario
+    return Debtor.name.ilike(f'%{_escape_like(term)}%', escape='\\')
+
+
+def prefix_filter(term):
+    """
+    Filtro por prefijo del nombre como rango sobre ix_debtor_user_lower_name
+    Usado por el autocompletado cuando el término es muy corto para trigramas
+
+    Args:
+        term (str): Prefijo buscado
+
+    Returns:
+        ColumnElement: Condición para usar en query.filter()
+    """
+    prefix = term.strip().lower()
+    return and_(func.lower(Debtor.name) >= prefix, func.lower(Debtor.name) < prefix + '\uffff')
+
+
+def _similarity(name, term):
+    """
+    Similitud aproximada entre el término y el nombre (0 a 1)
+    Compara contra cada palabra y contra el inicio del nombre, así un error de tipeo
+    en el nombre o el apellido no se diluye con el largo total
+
+    Args:
+        name (str): Nombre en minúsculas
+        term (str): Término en minúsculas
+
+    Returns:
+        float: Mejor similitud encontrada
+    """
+    pieces = name.split() + [name[:len(term)]]
+    return max(SequenceMatcher(None, piece, term).ratio() for piece in pieces)
+
+
+def _rank(name, term):
+    """
+    Clave de ordenamiento de una sugerencia: primero prefijos, luego coincidencias
+    más tempranas en el nombre y por último la similitud aproximada
+    """
+    lowered = name.lower()
+    position = lowered.find(term)
+    similarity = _similarity(lowered, term)
+    return (
+        0 if position == 0 else 1 if position > 0 else 2,
+        position if position >= 0 else len(lowered),
+        -similarity,
+        lowered
+    )
+
+
+def _limit_statement_time(budget_ms):
+    """
+    Limita el tiempo de ejecución de las consultas de la transacción actual
+
+    Returns:
+        callable: Función para quitar el límite (o None si no aplica)
+    """
+    if _dialect() == 'postgresql':
+        db.session.execute(text(f"SET LOCAL statement_timeout = {int(budget_ms)}"))
+        return None
+
+    if _dialect() == 'sqlite':
+        raw = db.session.connection().connection.driver_connection
+        deadline = time.perf_counter() + budget_ms / 1000
+
+        # SQLite interrumpe la consulta cuando el handler retorna un valor verdadero
+        raw.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+        return lambda: raw.set_progress_handler(None, 0)
+
+    return None
+
+
+def _candidates(user_id, term, limit):
+    """Obtiene candidatos desde el índice (coincidencia exacta y aproximada)"""
+    backend = _backend()
+    base = db.session.query(Debtor.id, Debtor.name).filter(Debtor.user_id == user_id)
+
+    if backend == 'pg_trgm':
+        pattern = f'%{_escape_like(term)}%'
+        return base.filter(or_(
+            Debtor.name.ilike(pattern, escape='\\'),
+            Debtor.name.op('%')(term)
+        )).order_by(func.similarity(Debtor.name, term).desc()).limit(limit * 4).all()
+
+    if len(term) < MIN_TRIGRAM_LENGTH:
+        return base.filter(prefix_filter(term)).order_by(func.lower(Debtor.name)).limit(limit).all()
+
+    candidates = base.filter(search_filter(user_id, term)).limit(limit * 4).all()
+
+    # Sin suficientes coincidencias exactas: buscar por trigramas compartidos (errores de tipeo)
+    if backend == 'fts5' and len(candidates) < limit and len(term) > MIN_TRIGRAM_LENGTH:
+        trigrams = {term[i:i + 3] for i in range(len(term) - 2)}
+        query = ' OR '.join(_fts_phrase(trigram) for trigram in sorted(trigrams))
+        seen = {row.id for row in candidates}
+        fuzzy = db.session.execute(text(
+            f"SELECT rowid AS id, name FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH :query AND user_id = :user_id ORDER BY rank LIMIT :limit"
+        ), {'query': query, 'user_id': user_id, 'limit': limit * 4}).all()
+        candidates += [
+            row for row in fuzzy
+            if row.id not in seen and _similarity(row.name.lower(), term) >= FUZZY_THRESHOLD
+        ]
+
+    return candidates
+
+
+def typeahead(user_id, term, limit=10, budget_ms=None):
+    """
+    Sugerencias de deudores para autocompletar, ordenadas por prefijo y similitud
+
+    Args:
+        user_id (int): ID del usuario
+        term (str): Texto ingresado
+        limit (int): Máximo de resultados
+        budget_ms (int): Presupuesto de latencia en milisegundos (None: SEARCH_LATENCY_BUDGET_MS)
+
+    Returns:
+        dict: results (lista de (id, nombre)), timed_out y took_ms
+    """
+    term = term.strip().lower()
+    if budget_ms is None:
+        budget_ms = current_app.config.get('SEARCH_LATENCY_BUDGET_MS', 150)
+
+    start = time.perf_counter()
+    timed_out = False
+    candidates = []
+
+    if term:
+        reset = _limit_statement_time(budget_ms)
+        try:
+            candidates = _candidates(user_id, term, limit)
+        except OperationalError:
+            # Consulta interrumpida por exceder el presupuesto de latencia
+            db.session.rollback()
+            timed_out = True
+        finally:
+            if reset:
+                reset()
+
+    ranked = sorted(candidates, key=lambda row: _rank(row.name, term))[:limit]
+
+    return {
+        'results': [(row.id, row.name) for row in ranked],
+        'timed_out': timed_out,
+        'took_ms': round((time.perf_counter() - start) * 1000, 2)
+    }
@@ -0,0 +1,681 @@
+"""
+CuentasClaras - Capa de Resúmenes
+Consultas agregadas de saldos por deudor y totales generales del usuario
+Listados paginados por cursor (dashboard e historial)
+Mantiene la tabla desnormalizada debtor_balance sincronizada con las deudas
+Autor: Fernando Poblete
+"""
+
+import base64
+import json
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import func, case, tuple_, literal, insert, update, type_coerce
+from extensions import db
+from sqlalchemy.orm import selectinload, undefer
+from models import Debtor, DebtorBalance, Debt, DebtHistory, Attachment
+from money import Money, money_sum, to_minor, from_minor
+from search import search_filter
+from previews import available_previews
+
+# Tolerancia para comparar montos al verificar saldos
+BALANCE_TOLERANCE = 0.005
+
+# Paginación del dashboard
+DASHBOARD_PAGE_SIZE = 24
+SORT_OPTIONS = ('name_asc', 'name_desc', 'debt_asc', 'debt_desc')
+
+# Paginación del historial
+HISTORY_PAGE_SIZE = 50
+
+# Paginación del historial de una deuda (línea de tiempo del detalle del deudor)
+DEBT_HISTORY_PAGE_SIZE = 20
+
+# Filas por lote al recorrer deudas para reportes
+REPORT_BATCH_SIZE = 500
+
+# Deudores por lote al recalcular saldos en importaciones masivas
+REFRESH_BATCH_SIZE = 500
+
+# Estimación de páginas del reporte general (filas de tabla por página y filas extra por deudor:
+# nombre, encabezado, totales y separación)
+REPORT_PAGE_ROWS = 25
+REPORT_DEBTOR_ROWS = 5
+
+
+def _balance_columns():
+    """
+    Construye las columnas agregadas de saldo sobre la tabla debt
+
+    Returns:
+        tuple: (total, pagado, adeudado, cantidad de deudas, deudas abiertas) como expresiones SQL
+    """
+    # Sumas exactas sobre unidades menores (el resultado se lee en unidades mayores)
+    total = money_sum(Debt.amount_minor, Debt.amount)
+    paid = money_sum(Debt.amount_minor, Debt.amount, Debt.paid == True)  # noqa: E712
+    owed = money_sum(Debt.amount_minor, Debt.amount, Debt.paid == False)  # noqa: E712
+    debt_count = func.count(Debt.id)
+    open_count = func.coalesce(func.sum(case((Debt.paid == False, 1), else_=0)), 0)  # noqa: E712
+    return total, paid, owed, debt_count, open_count
+
+
+def computed_balances_query(user_id=None):
+    """
+    Recalcula los saldos por deudor directamente desde las filas de debt
+    Es la fuente de verdad usada para reconstruir y verificar debtor_balance
+
+    Args:
+        user_id (int): Limitar a los deudores de un usuario (opcional)
+
+    Returns:
+        Query: Filas (debtor_id, user_id, total, paid, owed, debt_count, open_count)
+    """
+    total, paid, owed, debt_count, open_count = _balance_columns()
+    query = (
+        db.session.query(
+            Debtor.id.label('debtor_id'),
+            Debtor.user_id.label('user_id'),
+            total.label('total'),
+            paid.label('paid'),
+            owed.label('owed'),
+            debt_count.label('debt_count'),
+            open_count.label('open_count')
+        )
+        .outerjoin(Debt, Debt.debtor_id == Debtor.id)
+        .group_by(Debtor.id, Debtor.user_id)
+    )
+    if user_id is not None:
+        query = query.filter(Debtor.user_id == user_id)
+    return query
+
+
+def _apply_balance(balance, total, paid, owed, debt_count, open_count):
+    """Copia los valores calculados al registro de saldo"""
+    balance.total_amount = total
+    balance.amount_paid = paid
+    balance.pending_amount = owed
+    balance.debt_count = debt_count
+    balance.open_debt_count = open_count
+
+
+def refresh_debtor_balance(debtor_id):
+    """
+    Actualiza el saldo desnormalizado de un deudor
+    Debe llamarse antes del commit de cada escritura sobre sus deudas,
+    así el saldo queda en la misma transacción que el cambio
+
+    Args:
+        debtor_id (int): ID del deudor afectado
+
+    Returns:
+        DebtorBalance: Registro de saldo actualizado (None si el deudor no existe)
+    """
+    debtor = db.session.get(Debtor, debtor_id)
+    if debtor is None:
+        return None
+
+    total, paid, owed, debt_count, open_count = _balance_columns()
+    row = db.session.query(total, paid, owed, debt_count, open_count).filter(
+        Debt.debtor_id == debtor_id
+    ).one()
+
+    balance = db.session.get(DebtorBalance, debtor_id)
+    if balance is None:
+        balance = DebtorBalance(debtor_id=debtor_id, user_id=debtor.user_id)
+        db.session.add(balance)
+
+    _apply_balance(balance, *row)
+    balance.last_activity_at = datetime.utcnow()
+    return balance
+
+
+def refresh_debtor_balances(debtor_ids, batch_size=REFRESH_BATCH_SIZE):
+    """
+    Actualiza los saldos desnormalizados de muchos deudores (importaciones masivas)
+    Cada lote se recalcula con una consulta agrupada y se escribe con un UPDATE/INSERT por lotes
+
+    Args:
+        debtor_ids (iterable): IDs de los deudores afectados
+        batch_size (int): Deudores por lote
+
+    Returns:
+        int: Cantidad de saldos escritos
+    """
+    debtor_ids = sorted(set(debtor_ids))
+    now = datetime.utcnow()
+    written = 0
+
+    for start in range(0, len(debtor_ids), batch_size):
+        chunk = debtor_ids[start:start + batch_size]
+        existing = {
+            debtor_id for (debtor_id,) in
+            db.session.query(DebtorBalance.debtor_id).filter(DebtorBalance.debtor_id.in_(chunk))
+        }
+
+        updates, inserts = [], []
+        for row in computed_balances_query().filter(Debtor.id.in_(chunk)):
+            values = {
+                'debtor_id': row.debtor_id,
+                'user_id': row.user_id,
+                'total_amount': row.total,
+                'amount_paid': row.paid,
+                'pending_amount': row.owed,
+                'debt_count': row.debt_count,
+                'open_debt_count': row.open_count,
+                'last_activity_at': now
+            }
+            (updates if row.debtor_id in existing else inserts).append(values)
+
+        if updates:
+            db.session.execute(update(DebtorBalance), updates)
+        if inserts:
+            db.session.execute(insert(DebtorBalance), inserts)
+        written += len(updates) + len(inserts)
+
+    return written
+
+
+def encode_cursor(*values):
+    """
+    Codifica una posición de paginación (clave de orden, id) como cursor opaco para la URL
+
+    Args:
+        *values: Valores serializables a JSON que identifican la última fila vista
+
+    Returns:
+        str: Cursor en base64 apto para URL
+    """
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decodifica un cursor de paginación
+
+    Args:
+        cursor (str): Cursor generado por encode_cursor
+
+    Returns:
+        tuple: (clave de orden, id) o None si el cursor es inválido
+    """
+    try:
+        sort_key, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return sort_key, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def debtor_page(user_id, sort_by='name_asc', search=None, after=None, before=None,
+                limit=DASHBOARD_PAGE_SIZE):
+    """
+    Obtiene una página de deudores con sus saldos, ordenada y paginada en SQL
+    Usa paginación por cursor (keyset) sobre (clave de orden, id), así cada
+    página cuesta lo mismo sin importar cuántos deudores tenga el usuario
+
+    Args:
+        user_id (int): ID del usuario
+        sort_by (str): name_asc, name_desc, debt_asc o debt_desc
+        search (str): Texto opcional para filtrar por nombre
+        after (str): Cursor para avanzar a la página siguiente
+        before (str): Cursor para volver a la página anterior
+        limit (int): Cantidad de deudores por página
+
+    Returns:
+        dict: rows (deudor, owed, paid, pending, debt_count), next_cursor y prev_cursor
+    """
+    if sort_by not in SORT_OPTIONS:
+        sort_by = 'name_asc'
+
+    # Deudores sin fila en debtor_balance (creados por otra vía o antes de rebuild_balances.py)
+    # se muestran con saldo 0 en lugar de quedar fuera de la lista
+    pending = func.coalesce(DebtorBalance.pending_amount, 0)
+    paid = func.coalesce(DebtorBalance.amount_paid, 0)
+    # La resta de dos Money pierde el tipo: se restaura para leer el saldo en unidades mayores
+    net = type_coerce(pending - paid, Money)
+    if sort_by.startswith('debt'):
+        sort_key = net
+    else:
+        sort_key = func.lower(Debtor.name)
+    tie_breaker = Debtor.id
+    descending = sort_by.endswith('_desc')
+
+    query = db.session.query(
+        Debtor,
+        pending,
+        paid,
+        net,
+        func.coalesce(DebtorBalance.debt_count, 0),
+        sort_key.label('sort_key')
+    ).outerjoin(DebtorBalance, DebtorBalance.debtor_id == Debtor.id).filter(Debtor.user_id == user_id)
+
+    if search:
+        query = query.filter(search_filter(user_id, search))
+
+    # Índice ix_debtor_user_lower_name (orden por nombre); el orden por saldo recorre los
+    # deudores del usuario (ix_debtor_user_id) con su fila de saldo
+    # Al retroceder se recorre en sentido inverso y luego se invierte el resultado
+    cursor = decode_cursor(after) if after else None
+    backwards = False
+    if cursor is None and before:
+        cursor = decode_cursor(before)
+        backwards = cursor is not None
+    reverse = descending != backwards
+
+    if cursor:
+        position = tuple_(sort_key, tie_breaker)
+        # El límite toma el tipo de la clave: el saldo (Money) se compara en unidades menores
+        boundary = tuple_(literal(cursor[0], sort_key.type), literal(cursor[1]))
+        query = query.filter(position < boundary if reverse else position > boundary)
+
+    if reverse:
+        query = query.order_by(sort_key.desc(), tie_breaker.desc())
+    else:
+        query = query.order_by(sort_key.asc(), tie_breaker.asc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    has_next = has_more if not backwards else cursor is not None
+    has_prev = cursor is not None if not backwards else has_more
+
+    return {
+        'rows': [tuple(row[:5]) for row in rows],
+        'next_cursor': encode_cursor(rows[-1].sort_key, rows[-1][0].id) if rows and has_next else None,
+        'prev_cursor': encode_cursor(rows[0].sort_key, rows[0][0].id) if rows and has_prev else None
+    }
+
+
+def history_page(user_id, debtor_id=None, action_type=None, date_from=None, date_to=None,
+                 after=None, limit=HISTORY_PAGE_SIZE, debt_id=None):
+    """
+    Obtiene una página del historial de movimientos del usuario, del más reciente al más antiguo
+    Filtra por el user_id guardado en debt_history (índice ix_debt_history_user_created)
+    en lugar de unir debt_history -> debt -> debtor, y pagina por cursor sobre (created_at, id)
+
+    Args:
+        user_id (int): ID del usuario
+        debtor_id (int): Filtrar por deudor (opcional)
+        action_type (str): Filtrar por tipo de acción (opcional)
+        date_from (datetime): Fecha mínima inclusive (opcional)
+        date_to (datetime): Fecha máxima exclusiva (opcional)
+        after (str): Cursor de la última fila vista
+        limit (int): Cantidad de movimientos por página
+        debt_id (int): Filtrar por deuda (opcional, índice ix_debt_history_debt_created)
+
+    Returns:
+        dict: movements (lista de DebtHistory) y next_cursor
+    """
+    query = DebtHistory.query.filter(DebtHistory.user_id == user_id)
+
+    if debtor_id:
+        query = query.filter(DebtHistory.debt_id.in_(
+            db.session.query(Debt.id).filter(Debt.debtor_id == debtor_id)
+        ))
+
+    if debt_id:
+        query = query.filter(DebtHistory.debt_id == debt_id)
+
+    if action_type:
+        query = query.filter(DebtHistory.action_type == action_type)
+
+    if date_from:
+        query = query.filter(DebtHistory.created_at >= date_from)
+
+    if date_to:
+        query = query.filter(DebtHistory.created_at < date_to)
+
+    cursor = decode_cursor(after) if after else None
+    if cursor:
+        try:
+            created_at = datetime.fromisoformat(cursor[0])
+        except (ValueError, TypeError):
+            created_at = None
+        if created_at is not None:
+            query = query.filter(
+                tuple_(DebtHistory.created_at, DebtHistory.id) < tuple_(literal(created_at), literal(cursor[1]))
+            )
+
+    # Cargar deuda y deudor de la página en consultas separadas (solo para las filas visibles)
+    movements = query.options(
+        selectinload(DebtHistory.debt).selectinload(Debt.debtor)
+    ).order_by(DebtHistory.created_at.desc(), DebtHistory.id.desc()).limit(limit + 1).all()
+
+    has_more = len(movements) > limit
+    movements = movements[:limit]
+    last = movements[-1] if movements else None
+
+    return {
+        'movements': movements,
+        'next_cursor': encode_cursor(last.created_at.isoformat(), last.id) if has_more else None
+    }
+
+
+def user_totals(user_id):
+    """
+    Calcula los totales generales del usuario en una sola consulta
+    Agrega sobre la tabla debtor_balance
+
+    Args:
+        user_id (int): ID del usuario
+
+    Returns:
+        dict: total_owed, total_paid, total_pending, active_debtors y debtor_count
+    """
+    owed = func.coalesce(DebtorBalance.pending_amount, 0)
+    paid = func.coalesce(DebtorBalance.amount_paid, 0)
+    row = db.session.query(
+        money_sum(DebtorBalance.pending_amount),
+        money_sum(DebtorBalance.amount_paid),
+        func.coalesce(func.sum(case((owed > paid, 1), else_=0)), 0),
+        func.count(Debtor.id)
+    ).select_from(Debtor).outerjoin(
+        DebtorBalance, DebtorBalance.debtor_id == Debtor.id
+    ).filter(Debtor.user_id == user_id).one()
+
+    total_owed, total_paid, active_debtors, debtor_count = row
+    return {
+        'total_owed': total_owed,
+        'total_paid': total_paid,
+        'total_pending': total_owed - total_paid,
+        'active_debtors': active_debtors,
+        'debtor_count': debtor_count
+    }
+
+
+def users_totals():
+    """
+    Calcula cantidad de deudores y saldo por cobrar de cada usuario
+    Pensado para el panel de administración (una consulta agrupada)
+
+    Returns:
+        dict: user_id -> {'debtor_count', 'total_owed'}
+    """
+    rows = db.session.query(
+        Debtor.user_id,
+        func.count(Debtor.id),
+        money_sum(DebtorBalance.pending_amount)
+    ).outerjoin(DebtorBalance, DebtorBalance.debtor_id == Debtor.id).group_by(Debtor.user_id).all()
+
+    return {
+        user_id: {'debtor_count': debtor_count, 'total_owed': total_owed}
+        for user_id, debtor_count, total_owed in rows
+    }
+
+
+def debtor_totals(debtor_id):
+    """
+    Obtiene el saldo de un deudor específico en O(1) desde debtor_balance
+    Si el registro aún no existe (datos previos a la migración) lo calcula al vuelo
+
+    Args:
+        debtor_id (int): ID del deudor
+
+    Returns:
+        dict: owed, paid, pending y debt_count del deudor
+    """
+    balance = db.session.get(DebtorBalance, debtor_id)
+    if balance is not None:
+        owed, paid, debt_count = balance.pending_amount, balance.amount_paid, balance.debt_count
+    else:
+        _, paid, owed, debt_count, _ = db.session.query(*_balance_columns()).filter(
+            Debt.debtor_id == debtor_id
+        ).one()
+
+    return {
+        'owed': owed,
+        'paid': paid,
+        'pending': owed - paid,
+        'debt_count': debt_count
+    }
+
+
+def debt_cards(debtor_id):
+    """
+    Prepara los datos de las tarjetas de deuda para el detalle de un deudor
+    Carga las deudas, sus adjuntos y la cantidad de movimientos de cada una en un número fijo
+    de consultas (el historial se obtiene bajo demanda desde /debt/<id>/history) y calcula una sola vez
+    los valores derivados que usa la plantilla
+
+    Args:
+        debtor_id (int): ID del deudor
+
+    Returns:
+        list: Diccionarios con debt, remaining, installment, debt_files y
+              payment_files (Attachment), previews (hashes con miniatura lista),
+              attachment_count e history_count
+    """
+    debts = Debt.query.filter(Debt.debtor_id == debtor_id).order_by(Debt.id).all()
+
+    history_counts = dict(
+        db.session.query(DebtHistory.debt_id, func.count(DebtHistory.id)).filter(
+            DebtHistory.debt_id.in_([debt.id for debt in debts])
+        ).group_by(DebtHistory.debt_id).all()
+    ) if debts else {}
+
+    attachments = {}
+    if debts:
+        for attachment in Attachment.query.filter(
+            Attachment.debt_id.in_([debt.id for debt in debts])
+        ).order_by(Attachment.debt_id, Attachment.id):
+            attachments.setdefault(attachment.debt_id, []).append(attachment)
+
+    previews = available_previews(
+        [attachment for files in attachments.values() for attachment in files]
+    )
+
+    cards = []
+    for debt in debts:
+        files = attachments.get(debt.id, [])
+        debt_files = [attachment for attachment in files if attachment.kind == 'debt']
+        payment_files = [attachment for attachment in files if attachment.kind == 'payment']
+        cards.append({
+            'debt': debt,
+            'remaining': debt.remaining_amount(),
+            'installment': debt.installment_amount(),
+            'debt_files': debt_files,
+            'payment_files': payment_files,
+            'previews': previews,
+            'attachment_count': len(debt_files) + len(payment_files),
+            'history_count': history_counts.get(debt.id, 0)
+        })
+
+    return cards
+
+
+def iter_debtors_with_debts(user_id, batch_size=REPORT_BATCH_SIZE, first_id=None, last_id=None):
+    """
+    Recorre los deudores del usuario junto a sus deudas con una sola consulta
+    Las filas se leen por lotes (yield_per), así la memoria no crece con el total de deudas
+    El total de adjuntos de cada deuda (Debt.attachment_count) se carga en la misma consulta
+
+    Args:
+        user_id (int): ID del usuario
+        batch_size (int): Filas por lote
+        first_id (int): ID mínimo de deudor, inclusive (opcional, ver debtor_shards)
+        last_id (int): ID máximo de deudor, inclusive (opcional)
+
+    Yields:
+        tuple: (debtor_id, nombre, lista de Debt) por cada deudor, ordenados por ID
+    """
+    query = db.select(Debtor.id, Debtor.name, Debt).outerjoin(
+        Debt, Debt.debtor_id == Debtor.id
+    ).where(Debtor.user_id == user_id).options(undefer(Debt.attachment_count))
+
+    if first_id is not None:
+        query = query.where(Debtor.id >= first_id)
+
+    if last_id is not None:
+        query = query.where(Debtor.id <= last_id)
+
+    rows = db.session.execute(
+        query.order_by(Debtor.id, Debt.id).execution_options(yield_per=batch_size)
+    )
+
+    for (debtor_id, name), group in groupby(rows, key=lambda row: (row[0], row[1])):
+        yield debtor_id, name, [row[2] for row in group if row[2] is not None]
+
+
+def debtor_shards(user_id, shard_count, min_debts=0):
+    """
+    Divide los deudores del usuario en rangos consecutivos de ID con carga similar
+    La carga de cada deudor es su cantidad de deudas (desde debtor_balance) más uno
+
+    Args:
+        user_id (int): ID del usuario
+        shard_count (int): Cantidad máxima de rangos
+        min_debts (int): Carga mínima por rango (evita rangos demasiado pequeños)
+
+    Returns:
+        list: Tuplas (primer_id, último_id) en orden
+    """
+    rows = db.session.query(
+        Debtor.id, func.coalesce(DebtorBalance.debt_count, 0) + 1
+    ).outerjoin(
+        DebtorBalance, DebtorBalance.debtor_id == Debtor.id
+    ).filter(Debtor.user_id == user_id).order_by(Debtor.id).all()
+
+    if not rows:
+        return []
+
+    total = sum(weight for _, weight in rows)
+    target = max(total / max(shard_count, 1), min_debts, 1)
+
+    shards = []
+    first_id, load = None, 0
+    for debtor_id, weight in rows:
+        if first_id is None:
+            first_id = debtor_id
+        load += weight
+        if load >= target and len(shards) < shard_count - 1:
+            shards.append((first_id, debtor_id))
+            first_id, load = None, 0
+
+    if first_id is not None:
+        shards.append((first_id, rows[-1][0]))
+
+    return shards
+
+
+def report_volumes(user_id, max_debtors=None, max_pages=None):
+    """
+    Divide los deudores del usuario en volúmenes consecutivos del reporte general
+    Un volumen se cierra al alcanzar max_debtors deudores o al superar max_pages páginas
+    estimadas (REPORT_PAGE_ROWS / REPORT_DEBTOR_ROWS); un deudor nunca se divide
+
+    Args:
+        user_id (int): ID del usuario
+        max_debtors (int): Deudores por volumen (opcional)
+        max_pages (int): Páginas estimadas por volumen (opcional)
+
+    Returns:
+        list: dict por volumen con number, first_id, last_id, first_name, last_name,
+        debtor_count, debt_count, total_owed, total_paid, total_pending y estimated_pages
+    """
+    rows = db.session.query(
+        Debtor.id,
+        Debtor.name,
+        func.coalesce(DebtorBalance.debt_count, 0),
+        func.coalesce(DebtorBalance.pending_amount, 0),
+        func.coalesce(DebtorBalance.amount_paid, 0)
+    ).outerjoin(
+        DebtorBalance, DebtorBalance.debtor_id == Debtor.id
+    ).filter(Debtor.user_id == user_id).order_by(Debtor.id).yield_per(REPORT_BATCH_SIZE)
+
+    max_rows = max_pages * REPORT_PAGE_ROWS if max_pages else None
+    volumes = []
+    volume = None
+
+    for debtor_id, name, debt_count, owed, paid in rows:
+        debtor_rows = debt_count + REPORT_DEBTOR_ROWS
+
+        if volume is not None and (
+            (max_debtors and volume['debtor_count'] >= max_debtors)
+            or (max_rows and volume['rows'] + debtor_rows > max_rows)
+        ):
+            volume = None
+
+        if volume is None:
+            volume = {
+                'number': len(volumes) + 1,
+                'first_id': debtor_id,
+                'first_name': name,
+                'debtor_count': 0,
+                'debt_count': 0,
+                'total_owed': 0,
+                'total_paid': 0,
+                'rows': 0
+            }
+            volumes.append(volume)
+
+        volume['last_id'] = debtor_id
+        volume['last_name'] = name
+        volume['debtor_count'] += 1
+        volume['debt_count'] += debt_count
+        volume['total_owed'] += to_minor(owed)
+        volume['total_paid'] += to_minor(paid)
+        volume['rows'] += debtor_rows
+
+    # Totales acumulados en unidades menores
+    for volume in volumes:
+        volume['total_pending'] = from_minor(volume['total_owed'] - volume['total_paid'])
+        volume['total_owed'] = from_minor(volume['total_owed'])
+        volume['total_paid'] = from_minor(volume['total_paid'])
+        volume['estimated_pages'] = -(-volume.pop('rows') // REPORT_PAGE_ROWS)
+
+    return volumes
+
+
+def verify_balances(fix=False):
+    """
+    Compara debtor_balance con los saldos recalculados desde debt
+
+    Args:
+        fix (bool): Si es True, corrige los registros con diferencias o faltantes
+
+    Returns:
+        list: Diferencias encontradas, un dict por deudor con campo, guardado y calculado
+    """
+    stored = {balance.debtor_id: balance for balance in DebtorBalance.query.all()}
+    drift = []
+
+    for row in computed_balances_query():
+        balance = stored.pop(row.debtor_id, None)
+        expected = {
+            'total_amount': row.total,
+            'amount_paid': row.paid,
+            'pending_amount': row.owed,
+            'debt_count': row.debt_count,
+            'open_debt_count': row.open_count
+        }
+
+        if balance is None:
+            drift.append({'debtor_id': row.debtor_id, 'field': 'missing', 'stored': None, 'expected': expected})
+            if fix:
+                balance = DebtorBalance(debtor_id=row.debtor_id, user_id=row.user_id)
+                _apply_balance(balance, row.total, row.paid, row.owed, row.debt_count, row.open_count)
+                db.session.add(balance)
+            continue
+
+        for field, value in expected.items():
+            current = getattr(balance, field)
+            if current is None or abs(current - value) > BALANCE_TOLERANCE:
+                drift.append({'debtor_id': row.debtor_id, 'field': field, 'stored': current, 'expected': value})
+
+        if fix:
+            _apply_balance(balance, row.total, row.paid, row.owed, row.debt_count, row.open_count)
+            balance.user_id = row.user_id
+
+    # Registros de saldo cuyo deudor ya no existe
+    for debtor_id, balance in stored.items():
+        drift.append({'debtor_id': debtor_id, 'field': 'orphan', 'stored': None, 'expected': None})
+        if fix:
+            db.session.delete(balance)
+
+    if fix:
+        db.session.commit()
+
+    return drift
@@ -0,0 +1,170 @@
+"""
+Prueba del almacén de adjuntos por contenido
+Verifica que el mismo archivo subido a varias deudas se guarde una sola vez,
+que la descarga lo entregue y que se elimine al borrar la última deuda que lo usa,
+y que la migración pase los adjuntos JSON antiguos a la tabla attachment
+
+Ejecutar: python -m pytest -q test_attachments.py
+Autor: Fernando Poblete
+"""
+
+import io
+import os
+from app import create_app
+from extensions import db
+from models import User, Debtor, Debt, Attachment, AttachmentBlob
+from attachments import blob_path, storage_usage
+from migrate_attachments import backfill, fill_metadata, remove_legacy_files, verification_report
+from test_debtor_detail import login
+
+RECEIPT = b'%PDF-1.4 comprobante de prueba' * 100
+
+
+def test_identical_uploads_share_one_blob(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+    with app.app_context():
+        user = User(username='adjuntos', email='adjuntos@cuentasclaras.com')
+        user.set_password('adjuntos')
+        db.session.add(user)
+        db.session.flush()
+        debtor = Debtor(user_id=user.id, name='Deudor Adjuntos')
+        db.session.add(debtor)
+        db.session.commit()
+        user_id, debtor_id = user.id, debtor.id
+
+    client = login(app, user_id)
+    for _ in range(2):
+        client.post('/debt/add', data={
+            'debtor_id': debtor_id, 'amount': '1000', 'initial_date': '2026-01-01',
+            'debt_files': (io.BytesIO(RECEIPT), 'boleta.pdf')
+        }, content_type='multipart/form-data')
+
+    with app.app_context():
+        first = Debt.query.order_by(Debt.id).first().id
+        blob = AttachmentBlob.query.one()
+        assert blob.ref_count == 2 and blob.size == len(RECEIPT)
+        assert storage_usage()['stored_bytes'] == len(RECEIPT)
+        path = blob_path(blob.sha256)
+        filename = Attachment.query.filter_by(debt_id=first).one().filename
+
+    response = client.get(f'/debt/{first}/download/{filename}')
+    assert response.status_code == 200 and response.data == RECEIPT
+    response.close()
+
+    client.post(f'/debt/{first}/delete')
+    with app.app_context():
+        assert AttachmentBlob.query.one().ref_count == 1
+    assert os.path.exists(path)
+
+    client.post(f'/debtor/{debtor_id}/delete')
+    with app.app_context():
+        assert AttachmentBlob.query.count() == 0 and Attachment.query.count() == 0
+    assert not os.path.exists(path)
+
+
+def test_legacy_json_attachments_are_backfilled(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+    with app.app_context():
+        user = User(username='antiguos', email='antiguos@cuentasclaras.com')
+        user.set_password('antiguos')
+        db.session.add(user)
+        db.session.flush()
+        debtor = Debtor(user_id=user.id, name='Deudor Antiguo')
+        db.session.add(debtor)
+        db.session.flush()
+        debt = Debt(
+            debtor_id=debtor.id, amount=1000,
+            debt_attachments='["debt_20240101_000000_boleta.pdf"]',
+            payment_attachments='["payment_20240102_000000_pago.png", "payment_20240103_000000_perdido.png"]'
+        )
+        db.session.add(debt)
+        db.session.commit()
+        user_id, debt_id = user.id, debt.id
+
+        legacy_folder = tmp_path / str(user_id) / str(debt_id)
+        legacy_folder.mkdir(parents=True)
+        (legacy_folder / 'debt_20240101_000000_boleta.pdf').write_bytes(RECEIPT)
+        (legacy_folder / 'payment_20240102_000000_pago.png').write_bytes(b'png')
+
+        result = backfill()
+        assert result['migrated'] == 2 and len(result['missing']) == 1
+        assert fill_metadata() == 0
+        remove_legacy_files(result['legacy_files'])
+        assert not (tmp_path / str(user_id)).exists()
+
+        # Reejecutar no duplica filas
+        assert backfill()['migrated'] == 0
+        report = verification_report()
+        assert report['legacy'] == 3 and report['pending'] == 1 and report['without_metadata'] == 0
+
+        receipt = Attachment.query.filter_by(debt_id=debt_id, kind='debt').one()
+        assert receipt.size == len(RECEIPT) and receipt.mime == 'application/pdf'
+        assert receipt.display_name == 'boleta.pdf'
+        assert db.session.get(Debt, debt_id).count_attachments() == 2
+
+    client = login(app, user_id)
+    response = client.get(f'/debt/{debt_id}/download/debt_20240101_000000_boleta.pdf')
+    assert response.status_code == 200 and response.data == RECEIPT
+    response.close()
+    assert client.get(f'/debt/{debt_id}/download/payment_20240103_000000_perdido.png').status_code == 302
+
+
+def test_download_supports_range_etag_and_sendfile(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+    with app.app_context():
+        user = User(username='descargas', email='descargas@cuentasclaras.com')
+        user.set_password('descargas')
+        db.session.add(user)
+        db.session.flush()
+        debtor = Debtor(user_id=user.id, name='Deudor Descargas')
+        db.session.add(debtor)
+        db.session.commit()
+        user_id, debtor_id = user.id, debtor.id
+
+    client = login(app, user_id)
+    client.post('/debt/add', data={
+        'debtor_id': debtor_id, 'amount': '1000', 'initial_date': '2026-01-01',
+        'debt_files': (io.BytesIO(RECEIPT), 'boleta.pdf')
+    }, content_type='multipart/form-data')
+
+    with app.app_context():
+        attachment = Attachment.query.one()
+        url = f'/debt/{attachment.debt_id}/download/{attachment.filename}'
+        sha256 = attachment.sha256
+
+    response = client.get(url)
+    assert response.status_code == 200 and response.headers['ETag'] == f'"{sha256}"'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert 'boleta.pdf' in response.headers['Content-Disposition']
+    response.close()
+
+    partial = client.get(url, headers={'Range': 'bytes=10-19'})
+    assert partial.status_code == 206 and partial.data == RECEIPT[10:20]
+    assert partial.headers['Content-Range'] == f'bytes 10-19/{len(RECEIPT)}'
+    partial.close()
+
+    assert client.get(url, headers={'If-None-Match': f'"{sha256}"'}).status_code == 304
+
+    # El servidor web envía el archivo: la respuesta solo lleva encabezados
+    app.config['ATTACHMENT_SENDFILE'] = 'x-accel-redirect'
+    accel = client.get(url)
+    assert accel.status_code == 200 and accel.data == b''
+    assert accel.headers['X-Accel-Redirect'] == f'/_blobs/{sha256[:2]}/{sha256}'
+    assert 'X-Sendfile' not in accel.headers
+    not_modified = client.get(url, headers={'If-None-Match': f'"{sha256}"'})
+    assert not_modified.status_code == 304 and 'X-Accel-Redirect' not in not_modified.headers
+
+    app.config['ATTACHMENT_SENDFILE'] = 'x-sendfile'
+    assert client.get(url).headers['X-Sendfile'] == blob_path_for(app, sha256)
+
+
+def blob_path_for(app, sha256):
+    """Ruta del contenido fuera de un request"""
+    with app.app_context():
+        return blob_path(sha256)
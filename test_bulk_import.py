@@ -0,0 +1,130 @@
+"""
+Prueba de la importación masiva de deudores y deudas
+Verifica las reglas de validación por fila, la asociación a deudores existentes,
+los saldos recalculados, el historial 'created' y el índice de búsqueda, y que una
+planilla mayor a MAX_CONTENT_LENGTH se importe subiéndola por partes
+
+Ejecutar: python -m pytest -q test_bulk_import.py
+Autor: Fernando Poblete
+"""
+
+import io
+import os
+from app import create_app
+from extensions import db
+from models import User, Debtor, DebtorBalance, Debt, DebtHistory
+from search import search_filter
+from uploads import part_path
+from test_debtor_detail import login
+
+
+def test_import_sheet_with_row_errors():
+    app = create_app('testing')
+
+    with app.app_context():
+        user = User(username='planilla', email='planilla@cuentasclaras.com')
+        user.set_password('planilla')
+        db.session.add(user)
+        db.session.flush()
+        existing = Debtor(user_id=user.id, name='María José')
+        db.session.add(existing)
+        db.session.flush()
+        db.session.add(DebtorBalance(debtor_id=existing.id, user_id=user.id))
+        db.session.commit()
+        user_id, existing_id = user.id, existing.id
+
+    sheet = (
+        'Deudor,Teléfono,Monto,Fecha,Cuotas,Notas\n'
+        'maria jose,,15.000,01/02/2026,,Almuerzo\n'
+        'Pedro Rojas,+56911111111,"120.000",2026-03-01,3,Notebook\n'
+        'Pedro Rojas,,5000,2026-03-02,,\n'
+        'Carla Díaz,,,,,\n'
+        ',,1000,2026-03-01,,\n'
+        'Sin Monto Válido,,-5,2026-03-01,,\n'
+        'Fecha Mala,,1000,31/31/2026,,\n'
+        'Cuotas Malas,,1000,2026-03-01,0,\n'
+        'Monto NaN,,nan,2026-03-01,,\n'
+        'Monto Infinito,,inf,2026-03-01,,\n'
+        'Monto Desbordado,,1e999,2026-03-01,,\n'
+        'Cuotas Infinitas,,1000,2026-03-01,inf,\n'
+        'Cuotas NaN,,1000,2026-03-01,nan,\n'
+        'Cuotas Decimales,,1000,2026-03-01,2.7,\n'
+    )
+
+    response = login(app, user_id).post('/debtor/import', data={
+        'sheet': (io.BytesIO(sheet.encode('utf-8')), 'planilla.csv')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+
+    with app.app_context():
+        debtors = {debtor.name: debtor for debtor in Debtor.query.filter_by(user_id=user_id)}
+        assert set(debtors) == {'María José', 'Pedro Rojas', 'Carla Díaz'}
+
+        pedro = debtors['Pedro Rojas']
+        assert pedro.balance.total_amount == 125000 and pedro.balance.debt_count == 2
+        assert db.session.get(DebtorBalance, existing_id).pending_amount == 15000
+        assert debtors['Carla Díaz'].balance.debt_count == 0
+
+        split = Debt.query.filter_by(debtor_id=pedro.id, has_installments=True).one()
+        assert split.installments_total == 3 and split.amount_minor == 120000
+        assert DebtHistory.query.filter_by(user_id=user_id, action_type='created').count() == 3
+
+        found = Debtor.query.filter(search_filter(user_id, 'Rojas')).all()
+        assert [debtor.name for debtor in found] == ['Pedro Rojas']
+
+    page = response.get_data(as_text=True)
+    for message in ['El nombre es obligatorio', 'El monto debe ser mayor a cero',
+                    'Fecha inválida', 'El número de cuotas debe ser mayor a cero',
+                    'Monto inválido: nan', 'Monto inválido: inf', 'Monto inválido: 1e999']:
+        assert message in page
+    # Cuotas Infinitas, Cuotas NaN y Cuotas Decimales ('2.7' no se trunca a 2)
+    assert page.count('El número de cuotas debe ser mayor a cero') == 4
+
+
+def test_large_sheet_is_imported_by_parts(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['MAX_CONTENT_LENGTH'] = 64 * 1024
+    chunk = 32 * 1024
+
+    with app.app_context():
+        user = User(username='grande', email='grande@cuentasclaras.com')
+        user.set_password('grande')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    rows = 300
+    sheet = 'Deudor,Monto,Fecha,Cuotas,Notas\n' + ''.join(
+        f"Deudor {i},1000,2026-03-01,3,{'x' * 400}\n" for i in range(rows)
+    )
+    content = sheet.encode('utf-8')
+    assert len(content) > app.config['MAX_CONTENT_LENGTH']
+
+    client = login(app, user_id)
+    # En un solo request la planilla se rechaza antes de llegar al importador
+    direct = client.post('/debtor/import', data={'sheet': (io.BytesIO(content), 'grande.csv')},
+                         content_type='multipart/form-data')
+    assert direct.status_code == 413
+
+    # Una planilla no se acepta como adjunto ni un adjunto como planilla
+    assert client.post('/upload/', json={'filename': 'grande.csv', 'size': len(content)}).status_code == 400
+    assert client.post('/upload/', json={'filename': 'comprobante.pdf', 'size': 10,
+                                         'purpose': 'import'}).status_code == 400
+
+    started = client.post('/upload/', json={'filename': 'grande.csv', 'size': len(content), 'purpose': 'import'})
+    assert started.status_code == 201
+    upload_id = started.get_json()['upload_id']
+    for offset in range(0, len(content), chunk):
+        response = client.put(f'/upload/{upload_id}?offset={offset}', data=content[offset:offset + chunk],
+                              content_type='application/octet-stream')
+        assert response.status_code == 200
+
+    response = client.post('/debtor/import', data={'sheet_upload': upload_id})
+    assert response.status_code == 200
+
+    with app.app_context():
+        assert Debtor.query.filter_by(user_id=user_id).count() == rows
+        assert Debt.query.filter_by(installments_total=3).count() == rows
+        assert not os.path.exists(part_path(upload_id))
+    assert client.get(f'/upload/{upload_id}').status_code == 404
@@ -0,0 +1,95 @@
+"""
+Prueba de la exportación columnar (Parquet / Arrow)
+Verifica los tipos del esquema (montos decimales exactos, fechas y timestamps), que cada
+archivo tenga las mismas filas que el CSV del mismo conjunto de datos, y que sin pyarrow
+la ruta redirija con un aviso en lugar de fallar
+
+Ejecutar: python -m pytest -q test_columnar_export.py
+Autor: Fernando Poblete
+"""
+
+import csv
+import io
+import zipfile
+from decimal import Decimal
+import pytest
+import columnar_export
+from app import create_app
+from extensions import db
+from models import User
+from test_debtor_detail import create_debtor, login
+
+
+def setup_user(app):
+    """Crea un usuario con deudores, deudas e historial y retorna su ID"""
+    with app.app_context():
+        user = User(username='columnas', email='columnas@cuentasclaras.com')
+        user.set_password('columnas')
+        db.session.add(user)
+        db.session.commit()
+        create_debtor(user, 'Deudor Parquet', 3)
+        create_debtor(user, 'Deudor Arrow', 2)
+        return user.id
+
+
+def csv_row_count(client, dataset):
+    """Filas del CSV de un conjunto de datos (sin el encabezado)"""
+    response = client.get(f'/export_data/{dataset}.csv')
+    text = response.get_data(as_text=True).lstrip('\ufeff')
+    response.close()
+    return len(list(csv.reader(io.StringIO(text)))) - 1
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_columnar_types_and_row_counts(fmt):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+
+    app = create_app('testing')
+    client = login(app, setup_user(app))
+
+    response = client.get(f'/export_data/columnar.{fmt}')
+    assert response.status_code == 200 and response.mimetype == 'application/zip'
+
+    tables = {}
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        for dataset in ('debtors', 'debts', 'history'):
+            data = archive.read(f'{dataset}.{fmt}')
+            if fmt == 'parquet':
+                tables[dataset] = pq.read_table(pa.BufferReader(data))
+            else:
+                tables[dataset] = pa.ipc.open_file(pa.BufferReader(data)).read_all()
+    response.close()
+
+    money = pa.decimal128(columnar_export.MONEY_PRECISION, columnar_export.MONEY_DECIMALS)
+    debts = tables['debts'].schema
+    assert debts.field('amount').type == money
+    assert debts.field('remaining_amount').type == money
+    assert debts.field('initial_date').type == pa.date32()
+    assert debts.field('created_at').type == pa.timestamp('us')
+    assert debts.field('paid').type == pa.bool_()
+    assert tables['debtors'].schema.field('pending_amount').type == money
+    assert tables['history'].schema.field('created_at').type == pa.timestamp('us')
+
+    for dataset, table in tables.items():
+        assert table.num_rows == csv_row_count(client, dataset)
+
+    # Montos exactos: la suma decimal no arrastra error de float
+    amounts = tables['debts'].column('amount').to_pylist()
+    assert sum(amounts) == Decimal('9000.00')
+
+
+def test_columnar_route_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(columnar_export, 'pa', None)
+    monkeypatch.setattr(columnar_export, 'pq', None)
+
+    app = create_app('testing')
+    client = login(app, setup_user(app))
+
+    response = client.get('/export_data/columnar.parquet')
+    assert response.status_code == 302
+    page = client.get(response.headers['Location']).get_data(as_text=True)
+    assert 'requiere pyarrow' in page
+
+    with pytest.raises(RuntimeError):
+        columnar_export.build_columnar_archive('parquet')
@@ -0,0 +1,38 @@
+"""
+Prueba del formato de monedas
+Verifica que la web, el historial y los PDFs usen las mismas reglas por moneda
+
+Ejecutar: python -m pytest -q test_currency.py
+Autor: Fernando Poblete
+"""
+
+from decimal import Decimal
+from currency import format_amount, format_many, format_number
+from pdf_generator import format_currency_for_pdf
+
+
+def test_currency_rules():
+    assert format_amount(1000, 'CLP') == '$1.000'
+    assert format_amount(50.5, 'CLP') == '$50,5'
+    assert format_amount(1234.56, 'USD') == '$1.234,56'
+    assert format_amount(1000.5, 'BRL') == 'R$1.000,5'
+    assert format_amount(-999, 'CLP') == '-$999'
+    assert format_amount(1000, 'EUR') == '$1.000'
+    assert format_number(1234567.1) == '1.234.567,1'
+
+
+def test_half_cents_round_up_like_stored_amounts():
+    assert format_amount(1.005, 'USD') == '$1,01'
+    assert format_amount(0.125, 'USD') == '$0,13'
+    assert format_amount(-0.125, 'USD') == '-$0,13'
+    assert format_amount(-0.004, 'USD') == '$0'
+    assert format_amount(Decimal('2.675'), 'USD') == '$2,68'
+    assert format_amount(123456789012.345, 'USD') == '$123.456.789.012,35'
+
+
+def test_pdf_and_batch_match_single_amounts():
+    amounts = [0, 0.05, 99.9, 1000, 1000, 250000.25]
+    for currency in ('CLP', 'USD', 'BRL'):
+        expected = [format_amount(amount, currency) for amount in amounts]
+        assert format_many(amounts, currency) == expected
+        assert [format_currency_for_pdf(amount, currency) for amount in amounts] == expected
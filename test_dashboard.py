@@ -0,0 +1,51 @@
+"""
+Prueba de la lista de deudores del dashboard
+Verifica que los deudores sin fila en debtor_balance aparezcan con saldo 0
+y que la paginación por cursor los recorra en ambos órdenes
+
+Ejecutar: python -m pytest -q test_dashboard.py
+Autor: Fernando Poblete
+"""
+
+from app import create_app
+from extensions import db
+from models import User, Debtor, Debt
+from summary import debtor_page, refresh_debtor_balance
+
+
+def test_debtors_without_balance_row_are_listed():
+    app = create_app('testing')
+
+    with app.app_context():
+        user = User(username='tablero', email='tablero@cuentasclaras.com')
+        user.set_password('tablero')
+        db.session.add(user)
+        db.session.flush()
+
+        names = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elena']
+        for i, name in enumerate(names):
+            debtor = Debtor(user_id=user.id, name=name)
+            db.session.add(debtor)
+            db.session.flush()
+            db.session.add(Debt(debtor_id=debtor.id, amount=1000 * (i + 1)))
+            db.session.flush()
+            # Solo algunos deudores tienen saldo precalculado
+            if i % 2 == 0:
+                refresh_debtor_balance(debtor.id)
+        db.session.commit()
+
+        for sort_by in ('name_asc', 'debt_desc'):
+            seen, cursor = [], None
+            while True:
+                page = debtor_page(user.id, sort_by=sort_by, after=cursor, limit=2)
+                seen += [row[0].name for row in page['rows']]
+                cursor = page['next_cursor']
+                if not cursor:
+                    break
+            assert sorted(seen) == names and len(seen) == len(names)
+
+        rows = {row[0].name: row for row in debtor_page(user.id, limit=10)['rows']}
+        assert rows['Bruno'][1] == 0 and rows['Bruno'][4] == 0
+        assert rows['Elena'][1] == 5000
+        ordered = [row[0].name for row in debtor_page(user.id, sort_by='debt_desc', limit=10)['rows']]
+        assert ordered[:3] == ['Elena', 'Carla', 'Ana']
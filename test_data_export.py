@@ -0,0 +1,54 @@
+"""
+Prueba de la exportación de datos en CSV / NDJSON
+Verifica que las filas transmitidas coincidan con la base de datos (incluido el monto
+restante calculado) y que un usuario no pueda exportar deudores ajenos
+
+Ejecutar: python -m pytest -q test_data_export.py
+Autor: Fernando Poblete
+"""
+
+import csv
+import io
+import json
+from app import create_app
+from extensions import db
+from models import User, Debt, DebtHistory
+from test_debtor_detail import create_debtor, login
+
+
+def test_streamed_exports_match_database():
+    app = create_app('testing')
+
+    with app.app_context():
+        owner = User(username='datos', email='datos@cuentasclaras.com')
+        other = User(username='ajeno', email='ajeno@cuentasclaras.com')
+        owner.set_password('datos')
+        other.set_password('ajeno')
+        db.session.add_all([owner, other])
+        db.session.commit()
+
+        debtor_id = create_debtor(owner, 'Deudor, "Datos"', 5)
+        create_debtor(owner, 'Otro Deudor', 2)
+        remaining = {debt.id: round(debt.remaining_amount(), 2)
+                     for debt in Debt.query.filter_by(debtor_id=debtor_id)}
+        history_count = DebtHistory.query.filter_by(user_id=owner.id).count()
+        owner_id, other_id = owner.id, other.id
+
+    client = login(app, owner_id)
+
+    response = client.get('/export_data/debtors.csv')
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row['name'] for row in rows] == ['Deudor, "Datos"', 'Otro Deudor']
+    assert rows[0]['debt_count'] == '5'
+
+    response = client.get(f'/debtor/{debtor_id}/export_data/debts.ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    debts = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert {debt['id']: debt['remaining_amount'] for debt in debts} == remaining
+
+    history = client.get('/export_data/history.csv').get_data(as_text=True)
+    assert len(list(csv.DictReader(io.StringIO(history)))) == history_count
+
+    response = login(app, other_id).get(f'/debtor/{debtor_id}/export_data/debts.csv')
+    assert response.status_code == 302
@@ -0,0 +1,176 @@
+"""
+Prueba de regresión del detalle de deudor
+Verifica que la cantidad de consultas SQL no crezca con el número de deudas (N+1)
+y que el historial de cada deuda se entregue paginado desde /debt/<id>/history
+También que el historial general siga cargando después de eliminar un deudor
+
+Ejecutar: python -m pytest -q test_debtor_detail.py
+Autor: Fernando Poblete
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import create_app
+from extensions import db
+from models import User, Debtor, Debt, DebtHistory
+from summary import refresh_debtor_balance
+from attachments import attach_blob
+
+# Contenido ficticio de los adjuntos de prueba (solo se registran, no se descargan)
+FIXTURE_SHA256 = '0' * 64
+
+
+def create_debtor(user, name, debt_count):
+    """Crea un deudor con deudas, adjuntos e historial"""
+    debtor = Debtor(user_id=user.id, name=name)
+    db.session.add(debtor)
+    db.session.flush()
+
+    for i in range(debt_count):
+        debt = Debt(
+            debtor_id=debtor.id,
+            amount=1000 * (i + 1),
+            has_installments=i % 2 == 0,
+            installments_total=4,
+            installments_paid=i % 4
+        )
+        db.session.add(debt)
+        db.session.flush()
+
+        attach_blob(debt.id, 'debt', 'debt_20250101_000000_comprobante.pdf', FIXTURE_SHA256, 100)
+        attach_blob(debt.id, 'payment', 'payment_20250101_000000_pago.png', FIXTURE_SHA256, 100)
+
+        for j in range(3):
+            db.session.add(DebtHistory(
+                debt_id=debt.id,
+                user_id=user.id,
+                action_type='edited',
+                description=f'Cambio {j}',
+                created_at=datetime(2025, 1, 1) + timedelta(minutes=j)
+            ))
+
+    refresh_debtor_balance(debtor.id)
+    db.session.commit()
+    return debtor.id
+
+
+def login(app, user_id):
+    """Retorna un cliente de pruebas con sesión iniciada"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def count_detail_queries(app, client, debtor_id):
+    """Cuenta las consultas SQL ejecutadas al renderizar el detalle del deudor"""
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_execute)
+    try:
+        response = client.get(f'/debtor/{debtor_id}')
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_execute)
+
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_detail_query_count_is_constant():
+    app = create_app('testing')
+
+    with app.app_context():
+        user = User(username='detalle', email='detalle@cuentasclaras.com')
+        user.set_password('detalle')
+        db.session.add(user)
+        db.session.commit()
+
+        small = create_debtor(user, 'Deudor Pequeño', 1)
+        large = create_debtor(user, 'Deudor Grande', 25)
+        user_id = user.id
+
+    client = login(app, user_id)
+
+    small_queries = count_detail_queries(app, client, small)
+    large_queries = count_detail_queries(app, client, large)
+
+    assert small_queries == large_queries
+
+    page = client.get(f'/debtor/{large}').get_data(as_text=True)
+    assert page.count('/download/debt_20250101_000000_comprobante.pdf') == 25
+    assert page.count('/download/payment_20250101_000000_pago.png') == 25
+
+
+def test_debt_history_endpoint_is_paginated_newest_first():
+    app = create_app('testing')
+
+    with app.app_context():
+        owner = User(username='duenio', email='duenio@cuentasclaras.com')
+        other = User(username='otro', email='otro@cuentasclaras.com')
+        owner.set_password('duenio')
+        other.set_password('otro')
+        db.session.add_all([owner, other])
+        db.session.commit()
+
+        debtor_id = create_debtor(owner, 'Deudor Historial', 1)
+        debt = Debt.query.filter_by(debtor_id=debtor_id).one()
+        for j in range(3, 25):
+            db.session.add(DebtHistory(
+                debt_id=debt.id,
+                user_id=owner.id,
+                action_type='edited',
+                description=f'Cambio {j}',
+                created_at=datetime(2025, 1, 1) + timedelta(minutes=j)
+            ))
+        db.session.commit()
+        debt_id, owner_id, other_id = debt.id, owner.id, other.id
+
+    client = login(app, owner_id)
+    descriptions = []
+    cursor = None
+    while True:
+        url = f'/debt/{debt_id}/history?limit=10' + (f'&after={cursor}' if cursor else '')
+        data = client.get(url).get_json()
+        descriptions += [record['description'] for record in data['movements']]
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+
+    assert descriptions == [f'Cambio {j}' for j in range(24, -1, -1)]
+    assert login(app, other_id).get(f'/debt/{debt_id}/history').status_code == 403
+
+
+def test_history_page_after_deleting_debtor():
+    app = create_app('testing')
+
+    with app.app_context():
+        user = User(username='borra', email='borra@cuentasclaras.com')
+        user.set_password('borra')
+        db.session.add(user)
+        db.session.commit()
+
+        removed = create_debtor(user, 'Deudor Eliminado', 2)
+        create_debtor(user, 'Deudor Vigente', 1)
+        user_id = user.id
+
+    client = login(app, user_id)
+    client.post(f'/debtor/{removed}/delete')
+
+    with app.app_context():
+        assert DebtHistory.query.filter_by(user_id=user_id).count() == 3
+        # Fila huérfana de una eliminación anterior a esta corrección
+        db.session.add(DebtHistory(debt_id=999999, user_id=user_id, action_type='edited',
+                                   description='Movimiento huérfano'))
+        db.session.commit()
+
+    response = client.get('/history')
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert 'Deudor Vigente' in page and 'Deudor Eliminado' not in page
+    assert 'Movimiento huérfano' in page
@@ -0,0 +1,52 @@
+"""
+Prueba de la limpieza de exportaciones en segundo plano
+Verifica que los trabajos atascados ('running' con proceso caído o 'pending' con envío
+perdido) se marquen como fallidos con expiración y sin dejar su PDF temporal en disco
+
+Ejecutar: python -m pytest -q test_export_jobs.py
+Autor: Fernando Poblete
+"""
+
+import os
+from datetime import datetime, timedelta
+from app import create_app
+from extensions import db
+from models import User, ExportJob
+from export_jobs import cleanup_expired_exports
+
+
+def test_cleanup_fails_stuck_jobs(tmp_path):
+    app = create_app('testing')
+    app.config['EXPORT_FOLDER'] = str(tmp_path)
+
+    with app.app_context():
+        user = User(username='exporta', email='exporta@cuentasclaras.com')
+        user.set_password('exporta')
+        db.session.add(user)
+        db.session.commit()
+
+        old = datetime.utcnow() - timedelta(hours=2)
+        jobs = {
+            'running': ExportJob(user_id=user.id, kind='all_debtors', download_name='a.pdf',
+                                 status='running', created_at=old, started_at=old),
+            'pending': ExportJob(user_id=user.id, kind='all_debtors', download_name='b.pdf',
+                                 status='pending', created_at=old),
+            'recent': ExportJob(user_id=user.id, kind='all_debtors', download_name='c.pdf',
+                                status='pending')
+        }
+        db.session.add_all(jobs.values())
+        db.session.commit()
+
+        temp_path = os.path.join(str(tmp_path), f"{jobs['running'].id}.pdf.tmp")
+        with open(temp_path, 'wb') as f:
+            f.write(b'%PDF-')
+
+        cleanup_expired_exports()
+        db.session.expire_all()
+
+        for name in ('running', 'pending'):
+            job = jobs[name]
+            assert job.status == 'failed' and job.error
+            assert job.expires_at > datetime.utcnow()
+        assert jobs['recent'].status == 'pending' and jobs['recent'].expires_at is None
+        assert not os.path.exists(temp_path)
@@ -0,0 +1,90 @@
+"""
+Prueba de montos en unidades menores
+Verifica el redondeo, que las cuotas completas no dejen restos y que los saldos
+calculados en SQL sean exactos, también los totales sumados desde debtor_balance
+
+Ejecutar: python -m pytest -q test_money.py
+Autor: Fernando Poblete
+"""
+
+from sqlalchemy import text
+from app import create_app
+from extensions import db
+from models import User, Debtor, Debt
+from money import to_minor, from_minor, installments_minor
+from summary import refresh_debtor_balance, refresh_debtor_balances, user_totals, users_totals
+
+
+def test_minor_unit_conversion_rounds_half_up():
+    assert to_minor(1.005) == 101
+    assert to_minor(0.1) == 10
+    assert to_minor(50000) == 5000000
+    assert from_minor(1235) == 12.35
+    assert installments_minor(10000, 1, 3) == 3333
+    assert installments_minor(10000, 2, 3) == 6667
+    assert installments_minor(10000, 3, 3) == 10000
+
+
+def test_balances_are_exact_and_installments_settle_to_zero():
+    app = create_app('testing')
+
+    with app.app_context():
+        user = User(username='montos', email='montos@cuentasclaras.com')
+        user.set_password('montos')
+        db.session.add(user)
+        db.session.commit()
+
+        debtor = Debtor(user_id=user.id, name='Deudor Centavos')
+        db.session.add(debtor)
+        db.session.flush()
+
+        db.session.add_all([Debt(debtor_id=debtor.id, amount=0.1) for _ in range(10)])
+        split = Debt(debtor_id=debtor.id, amount=0.3, has_installments=True,
+                     installments_total=3, installments_paid=3)
+        db.session.add(split)
+        db.session.flush()
+        refresh_debtor_balance(debtor.id)
+        db.session.commit()
+
+        assert split.remaining_amount() == 0
+        assert user_totals(user.id)['total_owed'] == 1.3
+
+        split.amount = 12.345
+        db.session.commit()
+        db.session.expire_all()
+        assert db.session.get(Debt, split.id).amount_minor == 12.35
+
+
+def test_user_totals_sum_many_balances_exactly():
+    app = create_app('testing')
+
+    with app.app_context():
+        user = User(username='saldos', email='saldos@cuentasclaras.com')
+        user.set_password('saldos')
+        db.session.add(user)
+        db.session.flush()
+
+        debtors = [Debtor(user_id=user.id, name=f'Deudor {i}') for i in range(300)]
+        db.session.add_all(debtors)
+        db.session.flush()
+        for debtor in debtors:
+            db.session.add_all([
+                Debt(debtor_id=debtor.id, amount=0.1),
+                Debt(debtor_id=debtor.id, amount=0.2, paid=True)
+            ])
+        db.session.flush()
+        refresh_debtor_balances([debtor.id for debtor in debtors])
+        db.session.commit()
+
+        # Sumar 300 veces 0.1 en float da 30.000000000000156
+        assert sum([0.1] * 300) != 30.0
+        totals = user_totals(user.id)
+        assert totals['total_owed'] == 30.0 and totals['total_paid'] == 60.0
+        assert totals['total_pending'] == -30.0
+        assert users_totals()[user.id]['total_owed'] == 30.0
+
+        # Los saldos se guardan como enteros en unidades menores
+        stored = db.session.execute(text(
+            'SELECT pending_amount_minor, amount_paid_minor FROM debtor_balance WHERE debtor_id = :id'
+        ), {'id': debtors[0].id}).one()
+        assert tuple(stored) == (10, 20)
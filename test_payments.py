@@ -0,0 +1,125 @@
+"""
+Prueba de la aplicación de abonos
+Compara el cálculo en forma cerrada de payments.py con el ciclo anterior de
+Debt.process_payment (una iteración por cuota) sobre casos aleatorios, y verifica
+la aplicación por lotes con historial en un solo INSERT
+
+Ejecutar: python -m pytest -q test_payments.py
+Autor: Fernando Poblete
+"""
+
+import random
+from fractions import Fraction
+from app import create_app
+from extensions import db
+from models import User, Debtor, Debt, DebtHistory
+from money import to_minor, installments_minor
+from payments import allocate_installments, apply_payments
+
+CASES = 5000
+
+
+def legacy_allocation(amount, total, paid, partial, payment):
+    """Ciclo anterior de Debt.process_payment, con aritmética exacta (Fraction)"""
+    installment_value = amount / total
+    available = payment
+
+    if partial > 0:
+        remaining_in_current = installment_value - partial
+        if available >= remaining_in_current:
+            available -= remaining_in_current
+            paid += 1
+            partial = 0
+        else:
+            return paid, partial + available, 0, False
+
+    while available >= installment_value and paid < total:
+        available -= installment_value
+        paid += 1
+
+    if available > 0 and paid < total:
+        partial = available
+
+    if paid >= total:
+        return paid, 0, available, True
+    return paid, partial, 0, False
+
+
+def random_state(rng, even):
+    """Deuda en cuotas con un abono previo válido y un abono nuevo"""
+    total = rng.randint(1, 24)
+    amount = total * rng.randint(1, 100000) if even else rng.randint(1, 2400000)
+    paid = rng.randint(0, total - 1)
+    current = installments_minor(amount, paid + 1, total) - installments_minor(amount, paid, total)
+    partial = rng.randint(0, max(current - 1, 0))
+    payment = rng.randint(1, amount + amount // total + 1)
+    return amount, total, paid, partial, payment
+
+
+def test_closed_form_matches_legacy_loop():
+    rng = random.Random(18)
+    for _ in range(CASES):
+        amount, total, paid, partial, payment = random_state(rng, even=True)
+        allocation = allocate_installments(amount, total, paid, partial, payment)
+
+        scale = Fraction(1, 100)
+        legacy = legacy_allocation(amount * scale, total, paid, partial * scale, payment * scale)
+        assert (
+            allocation['installments_paid'],
+            allocation['partial_minor'] * scale,
+            allocation['overflow_minor'] * scale,
+            allocation['debt_completed']
+        ) == legacy, (amount, total, paid, partial, payment)
+
+
+def test_uneven_installments_conserve_money():
+    rng = random.Random(1018)
+    for _ in range(CASES):
+        amount, total, paid, partial, payment = random_state(rng, even=False)
+        allocation = allocate_installments(amount, total, paid, partial, payment)
+
+        before = amount - installments_minor(amount, paid, total) - partial
+        after = (amount - installments_minor(amount, allocation['installments_paid'], total)
+                 - allocation['partial_minor'])
+        assert before - payment == after - allocation['overflow_minor']
+
+        # El abono parcial que queda nunca cubre la cuota siguiente
+        reached = allocation['installments_paid']
+        if not allocation['debt_completed']:
+            next_value = (installments_minor(amount, reached + 1, total)
+                          - installments_minor(amount, reached, total))
+            assert 0 <= allocation['partial_minor'] < next_value
+
+
+def test_apply_payments_in_one_transaction():
+    app = create_app('testing')
+
+    with app.app_context():
+        user = User(username='abonos', email='abonos@cuentasclaras.com')
+        user.set_password('abonos')
+        db.session.add(user)
+        db.session.commit()
+
+        debtor = Debtor(user_id=user.id, name='Deudor Abonos')
+        db.session.add(debtor)
+        db.session.flush()
+
+        split = Debt(debtor_id=debtor.id, amount=100, has_installments=True, installments_total=3)
+        single = Debt(debtor_id=debtor.id, amount=500)
+        db.session.add_all([split, single])
+        db.session.commit()
+
+        results = apply_payments(user, [
+            (split.id, float('nan')), (split.id, 40), (split.id, 60), (single.id, 500),
+            (single.id, 10), (999999, 10)
+        ])
+        db.session.commit()
+
+        assert [result.get('error') for result in results] == [
+            'Monto inválido', None, None, None, 'Esta deuda ya está pagada', 'Deuda no encontrada'
+        ]
+        assert results[1]['installments_completed'] == 1
+        assert split.paid and single.paid
+        assert to_minor(split.remaining_amount()) == 0
+        assert DebtHistory.query.filter_by(user_id=user.id).count() == 3
+        assert debtor.balance.pending_amount == 0 and debtor.balance.open_debt_count == 0
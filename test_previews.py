@@ -0,0 +1,139 @@
+"""
+Prueba de las vistas previas de adjuntos
+Verifica que una imagen subida genere su miniatura junto al contenido, que la ficha
+del deudor la muestre y que se entregue con caché de larga duración solo a su dueño
+También que la miniatura se encargue solo al confirmar la transacción del adjunto,
+en el pool propio de vistas previas
+
+Ejecutar: python -m pytest -q test_previews.py
+Autor: Fernando Poblete
+"""
+
+import io
+import os
+import time
+from PIL import Image
+from app import create_app
+from extensions import db
+from models import User, Debtor, Debt, Attachment
+from attachments import preview_path, write_blob, attach_blob
+from previews import PREVIEW_SIZE, PREVIEW_MAX_AGE
+from test_debtor_detail import login
+
+
+def photo_bytes():
+    """Foto PNG de 1200x800 con transparencia"""
+    buffer = io.BytesIO()
+    Image.new('RGBA', (1200, 800), (200, 30, 30, 128)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_image_preview_is_generated_and_cached(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+
+    with app.app_context():
+        owner = User(username='miniaturas', email='miniaturas@cuentasclaras.com')
+        other = User(username='curioso', email='curioso@cuentasclaras.com')
+        owner.set_password('miniaturas')
+        other.set_password('curioso')
+        db.session.add_all([owner, other])
+        db.session.flush()
+        debtor = Debtor(user_id=owner.id, name='Deudor Miniaturas')
+        db.session.add(debtor)
+        db.session.commit()
+        owner_id, other_id, debtor_id = owner.id, other.id, debtor.id
+
+    client = login(app, owner_id)
+    client.post('/debt/add', data={
+        'debtor_id': debtor_id, 'amount': '1000', 'initial_date': '2026-01-01',
+        'debt_files': (io.BytesIO(photo_bytes()), 'transferencia.png')
+    }, content_type='multipart/form-data')
+
+    with app.app_context():
+        attachment = Attachment.query.one()
+        path = preview_path(attachment.sha256)
+        url = f'/debt/{attachment.debt_id}/preview/{attachment.filename}'
+
+    # Miniatura JPEG junto al contenido, con el lado mayor en PREVIEW_SIZE
+    assert os.path.exists(path)
+    with Image.open(path) as thumbnail:
+        assert thumbnail.format == 'JPEG' and max(thumbnail.size) == PREVIEW_SIZE
+
+    page = client.get(f'/debtor/{debtor_id}').get_data(as_text=True)
+    assert url in page
+
+    response = client.get(url)
+    assert response.status_code == 200 and response.mimetype == 'image/jpeg'
+    assert response.cache_control.max_age == PREVIEW_MAX_AGE
+    assert response.cache_control.private and response.cache_control.immutable
+    assert not response.cache_control.public
+    assert len(response.data) < 20000
+    etag = response.headers['ETag']
+    response.close()
+
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    assert login(app, other_id).get(url).status_code == 404
+
+    # Al eliminar la deuda se borra también la miniatura
+    client.post(f'/debtor/{debtor_id}/delete')
+    assert not os.path.exists(path)
+
+
+def setup_debt(app):
+    """Crea un usuario con una deuda y retorna su ID"""
+    with app.app_context():
+        user = User(username='confirma', email='confirma@cuentasclaras.com')
+        user.set_password('confirma')
+        db.session.add(user)
+        db.session.flush()
+        debtor = Debtor(user_id=user.id, name='Deudor Confirma')
+        db.session.add(debtor)
+        db.session.flush()
+        debt = Debt(debtor_id=debtor.id, amount=1000)
+        db.session.add(debt)
+        db.session.commit()
+        return debt.id
+
+
+def test_preview_is_scheduled_after_commit_only(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    debt_id = setup_debt(app)
+
+    with app.app_context():
+        sha256, size = write_blob(io.BytesIO(photo_bytes()))
+        path = preview_path(sha256)
+
+        # Adjunto revertido: no deja miniatura
+        attach_blob(debt_id, 'debt', 'debt_20260101_000000_foto.png', sha256, size)
+        db.session.flush()
+        assert not os.path.exists(path)
+        db.session.rollback()
+        assert not os.path.exists(path)
+
+        # Adjunto confirmado: la miniatura se genera recién con el commit
+        attach_blob(debt_id, 'debt', 'debt_20260101_000000_foto.png', sha256, size)
+        db.session.flush()
+        assert not os.path.exists(path)
+        db.session.commit()
+        assert os.path.exists(path)
+
+
+def test_preview_runs_in_its_own_pool(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['PREVIEW_WORKERS'] = 1
+    debt_id = setup_debt(app)
+
+    with app.app_context():
+        sha256, size = write_blob(io.BytesIO(photo_bytes()))
+        path = preview_path(sha256)
+        attach_blob(debt_id, 'debt', 'debt_20260101_000000_foto.png', sha256, size)
+        db.session.commit()
+
+    # EXPORT_WORKERS es 0 en pruebas: la miniatura igual se genera fuera del request
+    deadline = time.monotonic() + 60
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert os.path.exists(path)
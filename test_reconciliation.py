@@ -0,0 +1,73 @@
+"""
+Prueba de la conciliación de abonos desde cartolas bancarias
+Verifica la asociación de transferencias a deudas (por ID, nombre y monto) en la vista
+previa y que al confirmar los abonos se apliquen en una sola transacción
+
+Ejecutar: python -m pytest -q test_reconciliation.py
+Autor: Fernando Poblete
+"""
+
+import io
+from app import create_app
+from extensions import db
+from models import User, Debtor, Debt, DebtHistory
+from reconciliation import parse_confirmed_payments
+from test_debtor_detail import login
+
+
+def test_statement_preview_and_confirm():
+    app = create_app('testing')
+
+    with app.app_context():
+        user = User(username='cartola', email='cartola@cuentasclaras.com')
+        user.set_password('cartola')
+        db.session.add(user)
+        db.session.commit()
+
+        ana = Debtor(user_id=user.id, name='Ana Pérez')
+        luis = Debtor(user_id=user.id, name='Luis Soto')
+        db.session.add_all([ana, luis])
+        db.session.flush()
+
+        loan = Debt(debtor_id=ana.id, amount=30000, has_installments=True, installments_total=3)
+        dinner = Debt(debtor_id=ana.id, amount=15000)
+        rent = Debt(debtor_id=luis.id, amount=200000)
+        db.session.add_all([loan, dinner, rent])
+        db.session.commit()
+        user_id, loan_id, dinner_id, rent_id = user.id, loan.id, dinner.id, rent.id
+
+    statement = (
+        'Fecha;Nombre;Glosa;Monto\n'
+        '01/10/2026;ANA PEREZ;Transferencia;10.000\n'
+        '01/10/2026;Ana Perez;Cena;$ 15.000\n'
+        '02/10/2026;Otro;Pago deuda {rent};50.000,00\n'
+        '02/10/2026;Desconocido;Transferencia;1.000\n'
+        '03/10/2026;Ana Perez;Transferencia;abc\n'
+    ).format(rent=rent_id)
+
+    client = login(app, user_id)
+    response = client.post('/debt/reconcile', data={
+        'statement': (io.BytesIO(statement.encode('utf-8')), 'cartola.csv')
+    }, content_type='multipart/form-data')
+    page = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert f'value="{loan_id}:10000.0"' in page
+    assert f'value="{dinner_id}:15000.0"' in page
+    assert f'value="{rent_id}:50000.0"' in page
+    assert '3 asociada(s)' in page and '1 sin asociar' in page and '1 con error' in page
+
+    response = client.post('/debt/reconcile/confirm', data={
+        'payment': [f'{loan_id}:10000.0', f'{dinner_id}:15000.0', f'{rent_id}:50000.0']
+    })
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert db.session.get(Debt, loan_id).installments_paid == 1
+        assert db.session.get(Debt, dinner_id).paid
+        assert DebtHistory.query.filter_by(user_id=user_id).count() == 3
+
+
+def test_confirmed_payments_skip_invalid_amounts():
+    values = ['1:1000', '2:nan', '3:inf', '4:-inf', '5:1e999', '6:0', '7:-50', 'x:10', '8:12,5', '9:0.5']
+    assert parse_confirmed_payments(values) == [(1, 1000.0), (9, 0.5)]
@@ -0,0 +1,114 @@
+"""
+Prueba de las subidas por partes
+Verifica que un archivo mayor a MAX_CONTENT_LENGTH se suba en partes, que una parte
+fuera de orden se rechace informando el avance para reanudar, que el límite por
+archivo se aplique al recibir los bytes y que la subida se asocie a la deuda
+desde el formulario de evidencias de pago
+
+Ejecutar: python -m pytest -q test_uploads.py
+Autor: Fernando Poblete
+"""
+
+import hashlib
+import os
+from app import create_app
+from extensions import db
+from models import User, Debtor, Debt, Attachment, UploadSession
+from attachments import blob_path
+from uploads import part_path
+from test_debtor_detail import login
+
+CHUNK = 1024 * 1024
+
+
+def setup_debt(app):
+    """Crea un usuario con una deuda y retorna (user_id, debt_id)"""
+    with app.app_context():
+        user = User(username='partes', email='partes@cuentasclaras.com')
+        user.set_password('partes')
+        db.session.add(user)
+        db.session.flush()
+        debtor = Debtor(user_id=user.id, name='Deudor Partes')
+        db.session.add(debtor)
+        db.session.flush()
+        debt = Debt(debtor_id=debtor.id, amount=1000)
+        db.session.add(debt)
+        db.session.commit()
+        return user.id, debt.id
+
+
+def test_chunked_upload_resumes_and_attaches(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    user_id, debt_id = setup_debt(app)
+    client = login(app, user_id)
+
+    # Mayor que MAX_CONTENT_LENGTH (5 MB): no cabe en un solo request
+    content = os.urandom(6 * CHUNK + 123)
+    started = client.post('/upload/', json={'filename': 'transferencia.pdf', 'size': len(content)})
+    assert started.status_code == 201
+    upload_id = started.get_json()['upload_id']
+
+    offset = 0
+    while offset < len(content):
+        if offset == 2 * CHUNK:
+            # Parte repetida: se rechaza con el avance para reanudar
+            retry = client.put(f'/upload/{upload_id}?offset=0', data=content[:CHUNK])
+            assert retry.status_code == 409 and retry.get_json()['offset'] == offset
+            assert client.get(f'/upload/{upload_id}').get_json()['offset'] == offset
+        response = client.put(f'/upload/{upload_id}?offset={offset}', data=content[offset:offset + CHUNK],
+                              content_type='application/octet-stream')
+        assert response.status_code == 200
+        offset = response.get_json()['offset']
+
+    assert client.get(f'/upload/{upload_id}').get_json()['complete'] is True
+
+    client.post(f'/debt/{debt_id}/add_payment_evidence', data={'payment_uploads': upload_id})
+
+    with app.app_context():
+        attachment = Attachment.query.filter_by(debt_id=debt_id).one()
+        assert attachment.kind == 'payment' and attachment.display_name == 'transferencia.pdf'
+        assert attachment.sha256 == hashlib.sha256(content).hexdigest()
+        assert attachment.size == len(content)
+        assert UploadSession.query.count() == 0
+        assert not os.path.exists(part_path(upload_id))
+        with open(blob_path(attachment.sha256), 'rb') as stored:
+            assert stored.read() == content
+
+
+def test_file_limit_is_enforced_while_receiving(tmp_path):
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['UPLOAD_MAX_FILE_MB'] = 1
+    user_id, debt_id = setup_debt(app)
+    client = login(app, user_id)
+
+    assert client.post('/upload/', json={'filename': 'grande.pdf', 'size': 2 * CHUNK}).status_code == 413
+    assert client.post('/upload/', json={'filename': 'programa.exe', 'size': 10}).status_code == 400
+
+    upload_id = client.post('/upload/', json={'filename': 'chico.png', 'size': 10}).get_json()['upload_id']
+    with app.app_context():
+        path = part_path(upload_id)
+
+    # Más bytes que los declarados: la parte se descarta y el avance no cambia
+    response = client.put(f'/upload/{upload_id}?offset=0', data=b'x' * 64)
+    assert response.status_code == 413 and response.get_json()['offset'] == 0
+    assert os.path.getsize(path) == 0
+
+    # Una subida incompleta no se asocia a la deuda
+    client.put(f'/upload/{upload_id}?offset=0', data=b'x' * 5)
+    client.post(f'/debt/{debt_id}/add_payment_evidence', data={'payment_uploads': upload_id})
+    with app.app_context():
+        assert Attachment.query.count() == 0
+
+    # Otro usuario no ve la subida
+    with app.app_context():
+        other = User(username='ajeno', email='ajeno@cuentasclaras.com')
+        other.set_password('ajeno')
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.id
+    assert login(app, other_id).get(f'/upload/{upload_id}').status_code == 404
+
+    assert client.delete(f'/upload/{upload_id}').status_code == 200
+    assert not os.path.exists(path)
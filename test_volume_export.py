@@ -0,0 +1,68 @@
+"""
+Prueba del reporte general por volúmenes
+Verifica que la exportación dividida se encole como trabajo (sin generarse en el request)
+y que el ZIP descargado tenga el índice y un PDF válido por volumen
+
+Ejecutar: python -m pytest -q test_volume_export.py
+Autor: Fernando Poblete
+"""
+
+import io
+import zipfile
+from pypdf import PdfReader
+from app import create_app
+from extensions import db
+from models import User, Debtor, Debt, ExportJob
+from summary import refresh_debtor_balance
+from test_debtor_detail import login
+
+
+def test_split_export_runs_as_job_and_zip_has_volumes(tmp_path):
+    app = create_app('testing')
+    app.config['EXPORT_FOLDER'] = str(tmp_path)
+    app.config['REPORT_CACHE_FOLDER'] = str(tmp_path / 'cache')
+
+    with app.app_context():
+        user = User(username='volumenes', email='volumenes@cuentasclaras.com')
+        user.set_password('volumenes')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(5):
+            debtor = Debtor(user_id=user.id, name=f'Deudor Volumen {i}')
+            db.session.add(debtor)
+            db.session.flush()
+            db.session.add(Debt(debtor_id=debtor.id, amount=1000 * (i + 1)))
+            db.session.flush()
+            refresh_debtor_balance(debtor.id)
+        db.session.commit()
+        user_id = user.id
+
+    client = login(app, user_id)
+    response = client.get('/export_all_pdf?split=debtors&size=2')
+    assert response.status_code == 302 and '/export/' in response.headers['Location']
+
+    with app.app_context():
+        job = ExportJob.query.filter_by(user_id=user_id).one()
+        assert job.kind == 'volumes' and job.status == 'done'
+        assert job.file_path.endswith('.zip')
+        job_id = job.id
+
+    download = client.get(f'/export/{job_id}/download')
+    assert download.status_code == 200 and download.mimetype == 'application/zip'
+
+    with zipfile.ZipFile(io.BytesIO(download.data)) as archive:
+        names = archive.namelist()
+        assert names == ['00_indice.pdf', 'volumen_1_de_3.pdf', 'volumen_2_de_3.pdf', 'volumen_3_de_3.pdf']
+        for name in names:
+            reader = PdfReader(io.BytesIO(archive.read(name)))
+            assert len(reader.pages) >= 1
+
+        first = ''.join(page.extract_text() for page in PdfReader(
+            io.BytesIO(archive.read('volumen_1_de_3.pdf'))
+        ).pages)
+        assert 'Deudor Volumen 0' in first and 'Deudor Volumen 4' not in first
+    download.close()
+
+    assert client.get('/export_all_pdf?split=otro').status_code == 302
+    with app.app_context():
+        assert ExportJob.query.filter_by(user_id=user_id).count() == 1
@@ -0,0 +1,249 @@
+"""
+CuentasClaras - Subidas de Adjuntos por Partes
+El navegador inicia una subida con el nombre y tamaño del archivo y luego envía el contenido
+en partes de UPLOAD_CHUNK_SIZE bytes (un request por parte, bajo MAX_CONTENT_LENGTH).
+Cada parte se escribe directo a disco (uploads/sessions/<id>.part) y se suma al hash mientras
+llega, así el límite por archivo se aplica byte a byte y no después de recibir todo.
+Una subida interrumpida se reanuda desde el avance guardado en upload_session.
+
+La subida completa se asocia a una deuda desde los formularios de siempre: el campo
+debt_uploads / payment_uploads lleva los IDs junto a debt_files / payment_files.
+Las planillas de importación (purpose='import') usan el mismo flujo con sus propias
+extensiones y límite (IMPORT_MAX_FILE_MB); el formulario de importación envía sheet_upload
+Autor: Fernando Poblete
+"""
+
+import hashlib
+import os
+import secrets
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from extensions import db
+from models import UploadSession
+from attachments import store_blob_file, stored_filename, attach_blob
+from data_import import IMPORT_EXTENSIONS
+
+# Carpeta de subidas en curso dentro de UPLOAD_FOLDER
+SESSION_DIRNAME = 'sessions'
+
+# Propósitos de una subida: adjunto de deuda o planilla de importación
+UPLOAD_PURPOSES = ('attachment', 'import')
+
+# Bytes leídos por vez desde el request
+READ_SIZE = 64 * 1024
+
+# Hash parcial de las subidas en curso en este proceso: upload_id -> (bytes, hash)
+# Si otra instancia recibió la parte anterior, el hash se recalcula desde el archivo parcial
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def session_folder():
+    """Carpeta de las subidas en curso"""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], SESSION_DIRNAME)
+
+
+def part_path(upload_id):
+    """Archivo parcial de una subida"""
+    return os.path.join(session_folder(), f"{upload_id}.part")
+
+
+def _max_file_mb(purpose='attachment'):
+    """Límite en MB según el propósito (UPLOAD_MAX_FILE_MB o IMPORT_MAX_FILE_MB)"""
+    key = 'IMPORT_MAX_FILE_MB' if purpose == 'import' else 'UPLOAD_MAX_FILE_MB'
+    return current_app.config[key]
+
+
+def max_file_size(purpose='attachment'):
+    """Tamaño máximo por archivo en bytes"""
+    return _max_file_mb(purpose) * 1024 * 1024
+
+
+def _allowed(filename, purpose='attachment'):
+    """Extensión permitida según el propósito (ALLOWED_EXTENSIONS o IMPORT_EXTENSIONS)"""
+    if '.' not in filename:
+        return False
+    extension = filename.rsplit('.', 1)[1].lower()
+    if purpose == 'import':
+        return f'.{extension}' in IMPORT_EXTENSIONS
+    return extension in current_app.config['ALLOWED_EXTENSIONS']
+
+
+def start_upload(user_id, filename, size, purpose='attachment'):
+    """
+    Inicia una subida por partes (hace commit)
+
+    Args:
+        user_id (int): Usuario que sube el archivo
+        filename (str): Nombre original del archivo
+        size (int): Tamaño total en bytes
+        purpose (str): 'attachment' (adjunto) o 'import' (planilla de importación)
+
+    Returns:
+        UploadSession: Subida creada
+
+    Raises:
+        ValueError: Si el nombre o el tamaño no son válidos
+        RequestEntityTooLarge: Si el archivo supera el límite del propósito
+    """
+    if purpose not in UPLOAD_PURPOSES:
+        raise ValueError('Propósito de subida no válido')
+    filename = secure_filename(filename or '')
+    if not filename or not _allowed(filename, purpose):
+        raise ValueError('Tipo de archivo no permitido')
+    if size <= 0:
+        raise ValueError('El archivo está vacío')
+    if size > max_file_size(purpose):
+        raise RequestEntityTooLarge(f"El archivo supera {_max_file_mb(purpose)} MB")
+
+    cleanup_expired_uploads()
+
+    upload = UploadSession(id=secrets.token_hex(16), user_id=user_id, filename=filename, size=size, received=0)
+    os.makedirs(session_folder(), exist_ok=True)
+    open(part_path(upload.id), 'wb').close()
+
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+
+def get_upload(upload_id, user_id):
+    """Subida del usuario (None si no existe o es de otro usuario)"""
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != user_id:
+        return None
+    return upload
+
+
+def _hasher(upload):
+    """Hash de los bytes ya recibidos (desde memoria o recalculado desde el archivo parcial)"""
+    with _hashers_lock:
+        cached = _hashers.get(upload.id)
+    if cached is not None and cached[0] == upload.received:
+        return cached[1].copy()
+
+    digest = hashlib.sha256()
+    remaining = upload.received
+    with open(part_path(upload.id), 'rb') as part:
+        while remaining > 0:
+            chunk = part.read(min(READ_SIZE * 16, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+
+def append_chunk(upload, offset, stream):
+    """
+    Escribe una parte de la subida leyendo el request en streaming (hace commit)
+    La parte se descarta completa si excede el tamaño declarado, así la subida puede
+    reintentarse desde el mismo avance
+
+    Args:
+        upload (UploadSession): Subida en curso
+        offset (int): Posición de la parte (debe ser igual a upload.received)
+        stream: Cuerpo del request (request.stream)
+
+    Returns:
+        UploadSession: Subida con el avance actualizado
+
+    Raises:
+        ValueError: Si la subida ya terminó o la posición no coincide con el avance
+        RequestEntityTooLarge: Si la parte excede el tamaño declarado del archivo
+    """
+    if upload.complete:
+        raise ValueError('La subida ya está completa')
+    if offset != upload.received:
+        raise ValueError(f'La parte debe comenzar en el byte {upload.received}')
+
+    digest = _hasher(upload)
+    position = offset
+
+    with open(part_path(upload.id), 'r+b') as part:
+        # Descarta bytes de una parte anterior que no alcanzó a registrarse
+        part.truncate(offset)
+        part.seek(offset)
+        for chunk in iter(lambda: stream.read(READ_SIZE), b''):
+            if position + len(chunk) > upload.size:
+                part.truncate(offset)
+                raise RequestEntityTooLarge('La parte excede el tamaño declarado del archivo')
+            part.write(chunk)
+            digest.update(chunk)
+            position += len(chunk)
+
+    upload.received = position
+    if position == upload.size:
+        upload.sha256 = digest.hexdigest()
+        with _hashers_lock:
+            _hashers.pop(upload.id, None)
+    else:
+        with _hashers_lock:
+            _hashers[upload.id] = (position, digest)
+
+    db.session.commit()
+    return upload
+
+
+def _discard(upload):
+    """Elimina el archivo parcial y el registro de una subida (no hace commit)"""
+    path = part_path(upload.id)
+    if os.path.exists(path):
+        os.remove(path)
+    with _hashers_lock:
+        _hashers.pop(upload.id, None)
+    db.session.delete(upload)
+
+
+def cancel_upload(upload):
+    """Cancela una subida y borra lo recibido (hace commit)"""
+    _discard(upload)
+    db.session.commit()
+
+
+def cleanup_expired_uploads():
+    """
+    Descarta las subidas sin avance en UPLOAD_SESSION_TTL_HOURS (no hace commit)
+
+    Returns:
+        int: Cantidad de subidas descartadas
+    """
+    limit = datetime.utcnow() - timedelta(hours=current_app.config['UPLOAD_SESSION_TTL_HOURS'])
+    expired = UploadSession.query.filter(UploadSession.updated_at < limit).all()
+    for upload in expired:
+        _discard(upload)
+    return len(expired)
+
+
+def attach_uploads(upload_ids, user_id, debt_id, kind):
+    """
+    Asocia a una deuda las subidas completas indicadas (no hace commit)
+    El archivo parcial pasa al almacén por hash y la subida se elimina; los IDs
+    desconocidos, de otro usuario, incompletos o sin extensión de adjunto (planillas)
+    se ignoran
+
+    Args:
+        upload_ids (list): IDs de subidas (campo debt_uploads / payment_uploads)
+        user_id (int): Usuario dueño de las subidas
+        debt_id (int): ID de la deuda
+        kind (str): 'debt' o 'payment'
+
+    Returns:
+        list: Nombres de los adjuntos creados
+    """
+    saved_files = []
+    for upload_id in dict.fromkeys(upload_ids):
+        upload = get_upload(upload_id, user_id)
+        if upload is None or not upload.complete or not _allowed(upload.filename):
+            continue
+
+        filename = stored_filename(kind, upload.filename)
+        store_blob_file(part_path(upload.id), upload.sha256)
+        attach_blob(debt_id, kind, filename, upload.sha256, upload.size)
+        db.session.delete(upload)
+        saved_files.append(filename)
+
+    return saved_files
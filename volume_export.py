@@ -0,0 +1,139 @@
+"""
+CuentasClaras - Reporte General por Volúmenes
+Divide el reporte completo en volúmenes de tamaño fijo (por cantidad de deudores o por
+páginas estimadas) y los reúne en un archivo ZIP: primero el índice y luego cada volumen.
+Se genera como trabajo de exportación (export_jobs, kind='volumes'), fuera del request,
+y el ZIP se escribe a disco por partes a medida que cada volumen está listo
+Autor: Fernando Poblete
+"""
+
+import zipfile
+from collections import deque
+from flask import current_app
+from pdf_generator import generate_all_debtors_volume, generate_volume_index_pdf
+from summary import report_volumes
+
+# Criterios de división soportados
+VOLUME_SPLITS = ('debtors', 'pages')
+
+
+class _ZipStream:
+    """
+    Destino de escritura del ZIP que acumula los bytes hasta que se escriben al archivo
+    Sin seek/tell, zipfile escribe en modo secuencial (descriptores de datos por archivo)
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Retorna los bytes escritos desde la última llamada"""
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def plan_volumes(user, split, size=None):
+    """
+    Calcula los volúmenes de la exportación
+
+    Args:
+        user (User): Usuario dueño del reporte
+        split (str): 'debtors' (deudores por volumen) o 'pages' (páginas estimadas por volumen)
+        size (int): Tamaño de cada volumen (None: valor por defecto de la configuración)
+
+    Returns:
+        list: Volúmenes de summary.report_volumes
+    """
+    if split not in VOLUME_SPLITS:
+        raise ValueError(f"Criterio de división no soportado: {split}")
+
+    if split == 'debtors':
+        size = size or current_app.config['EXPORT_VOLUME_DEBTORS']
+    else:
+        size = size or current_app.config['EXPORT_VOLUME_PAGES']
+    size = min(max(size, 1), current_app.config['EXPORT_VOLUME_MAX_SIZE'])
+
+    if split == 'debtors':
+        return report_volumes(user.id, max_debtors=size)
+    return report_volumes(user.id, max_pages=size)
+
+
+def volume_file_name(volume, volume_count):
+    """Nombre del PDF de un volumen dentro del ZIP (ordenable alfabéticamente)"""
+    width = len(str(volume_count))
+    return f"volumen_{volume['number']:0{width}d}_de_{volume_count}.pdf"
+
+
+def render_volumes(user, volumes, now):
+    """
+    Genera los PDFs de los volúmenes en orden
+    Con REPORT_SHARD_WORKERS > 0 se generan en el pool de fragmentos, con a lo más
+    un volumen adelantado por proceso para que la memoria no crezca con el total
+
+    Args:
+        user (User): Usuario dueño del reporte
+        volumes (list): Volúmenes a generar
+        now (datetime): Momento de exportación compartido por todos los volúmenes
+
+    Yields:
+        bytes: PDF de cada volumen
+    """
+    from export_jobs import get_shard_executor, render_report_volume
+
+    executor = get_shard_executor()
+    if executor is None:
+        for volume in volumes:
+            yield generate_all_debtors_volume(user, now, volume, len(volumes)).getvalue()
+        return
+
+    workers = current_app.config['REPORT_SHARD_WORKERS']
+    config_name = current_app.config['CONFIG_NAME']
+    pending = deque()
+    for volume in volumes:
+        pending.append(executor.submit(
+            render_report_volume, config_name, user.id, volume, len(volumes), now
+        ))
+        if len(pending) > workers:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
+def stream_volumes_zip(user, volumes, now):
+    """
+    Genera el ZIP de la exportación por partes: índice, cada volumen y el directorio final
+    Cada parte se entrega apenas se escribe, sin esperar a los volúmenes siguientes
+    (export_jobs.render_export_chunks las escribe al archivo del trabajo)
+
+    Args:
+        user (User): Usuario dueño del reporte
+        volumes (list): Volúmenes de plan_volumes
+        now (datetime): Momento de exportación
+
+    Yields:
+        bytes: Partes consecutivas del archivo ZIP
+    """
+    stream = _ZipStream()
+    date_time = now.timetuple()[:6]
+
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        index = zipfile.ZipInfo('00_indice.pdf', date_time=date_time)
+        archive.writestr(index, generate_volume_index_pdf(user, volumes, now).getvalue(),
+                         compress_type=zipfile.ZIP_DEFLATED)
+        yield stream.drain()
+
+        for volume, pdf in zip(volumes, render_volumes(user, volumes, now)):
+            info = zipfile.ZipInfo(volume_file_name(volume, len(volumes)), date_time=date_time)
+            archive.writestr(info, pdf, compress_type=zipfile.ZIP_DEFLATED)
+            yield stream.drain()
+
+    yield stream.drain()